@@ -0,0 +1,121 @@
+import datetime
+import json
+import os
+import six
+import threading
+import time
+
+from six.moves import queue
+
+from . import log
+
+class AuditLog(object):
+    """
+        An audit trail of removals, written as JSON lines to a rotating file.
+        Entries are queued and written by batches from a background thread, so that recording
+        never blocks the caller: when the queue is full, entries are dropped and counted
+    """
+    Stop = object()
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backups=5, queue_size=10000, batch_size=100, flush_interval=1.):
+        self.logger = log.getLogger(self)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(queue_size)
+        self.dropped = 0
+        # dropped entries already logged
+        self.reported = 0
+        self.written = 0
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def close(self):
+        if self.thread is not None:
+            self.queue.put(self.Stop)
+            self.thread.join()
+            self.thread = None
+
+    def record(self, event, **entry):
+        entry['event'] = event
+        entry['time'] = datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        try:
+            self.queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            self.drop(1)
+            return False
+
+    def drop(self, count):
+        with self.lock:
+            self.dropped += count
+
+    def next_batch(self):
+        """
+            Returns the next entries to write, waiting at most flush_interval once an entry was received
+        """
+        batch = [self.queue.get()]
+        deadline = time.time() + self.flush_interval
+        while len(batch) < self.batch_size and batch[-1] is not self.Stop:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            stop = batch[-1] is self.Stop
+            if stop:
+                batch.pop()
+            try:
+                self.write(batch)
+            except (IOError, OSError) as e:
+                self.drop(len(batch))
+                self.logger.error("Failed to write %d audit entries to %s, error: %r", len(batch), self.path, e)
+            self.report_dropped()
+            if stop:
+                return
+
+    def report_dropped(self):
+        """
+            Logs the entries dropped since the last report, entries are dropped while the writer is busy
+            so that it reports them with its next batch
+        """
+        with self.lock:
+            dropped, self.reported = self.dropped - self.reported, self.dropped
+        if dropped:
+            self.logger.warning("dropped %d audit entries, %d in total", dropped, self.reported)
+
+    def write(self, entries):
+        if not entries:
+            return
+        lines = ''.join(json.dumps(entry, sort_keys=True) + '\n' for entry in entries)
+        with open(self.path, 'a') as f:
+            f.write(lines)
+            size = f.tell()
+        self.written += len(entries)
+        if size >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        for i in six.moves.range(self.backups - 1, 0, -1):
+            src = '%s.%d' % (self.path, i)
+            if os.path.exists(src):
+                os.rename(src, '%s.%d' % (self.path, i + 1))
+        if self.backups:
+            os.rename(self.path, self.path + '.1')
+        else:
+            os.remove(self.path)
@@ -0,0 +1,40 @@
+import collections
+import threading
+import time
+
+class TTLCache(object):
+    """
+        A bounded set of keys, each expiring `ttl` seconds after being added.
+        When full, the oldest keys are evicted first
+    """
+    def __init__(self, ttl, size=10000, clock=time.time):
+        self.ttl = ttl
+        self.size = size
+        self.clock = clock
+        # key -> expiry, ordered by expiry
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def add(self, key, ttl=None):
+        expiry = self.clock() + (self.ttl if ttl is None else ttl)
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = expiry
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def __contains__(self, key):
+        expiry = self.entries.get(key, None)
+        if expiry is None:
+            return False
+        if expiry < self.clock():
+            self.discard(key)
+            return False
+        return True
+
+    def __len__(self):
+        return len(self.entries)
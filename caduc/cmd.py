@@ -1,38 +1,254 @@
 #!/usr/bin/env python
 
-import docker
+import json
 import logging
 import os
+import pytimeparse.timeparse
+import socket
 import sys
+import threading
+import time
 
 if __name__=='__main__':
     sys.path.append(os.path.join(os.path.dirname(sys.argv[0]), '..'))
 
+from caduc import log
+from caduc.audit import AuditLog
 from caduc.config import Config
 from caduc.containers import Containers
+from caduc.control import DEFAULT_SOCKET
+from caduc.control import Control
+from caduc.control import ControlError
+from caduc.control import ControlServer
+from caduc.control import request
+from caduc.dryrun import Recorder
+from caduc.events import EventBuffer
+from caduc.image import Image
+from caduc.imagedb import ImageDB
 from caduc.images import Images
+from caduc.lazy import docker
+from caduc.loop import Loop
+from caduc.profiling import Instrumented
+from caduc.profiling import Profiler
+from caduc.profiling import Stats
+from caduc.ratelimit import RateLimiter
+from caduc.reload import ConfigReloader
+from caduc.report import report
+from caduc.sweep import Sweep
+from caduc.timer import SlackTimers
+from caduc.timer import Timer
+from caduc.timer import install_abort
 from caduc.watcher import Watcher
 
 DEFAULT_DELETE_TIMEOUT = "1d"
+DEFAULT_SWEEP_WORKERS = 4
 
-def create_watcher(options, args):
+def setup_logging(options):
     if options.debug:
         logging.basicConfig(level=logging.DEBUG)
     else:
         logging.basicConfig(level=logging.INFO)
 
+def configure_limiter(config):
+    Image.RmLimiter = RateLimiter.from_config(config)
+    Image.Pruner.configure(config)
+
+def create_client(options, stats=None):
     def client():
         return docker.Client(**docker.utils.kwargs_from_env(assert_hostname=False))
+    if stats is not None:
+        client = Instrumented(stats, client)
+    if options.dry_run:
+        client = Recorder(client)
+    return client
+
+def create_inventory(options, stats=None, client=None):
+    if client is None:
+        client = create_client(options, stats)
     config = Config(options.config, options.config_path)
-    images = Images(config, client, default_timeout=options.image_gracetime)
+    log.configure(config)
+    configure_limiter(config)
+    store = None
+    if options.docker_root:
+        try:
+            store = ImageDB(options.docker_root)
+        except (IOError, OSError) as e:
+            log.getLogger(ImageDB).warning("cannot read the image store, error: %r", e)
+    images = Images(config, client, default_timeout=options.image_gracetime, store=store)
     containers = Containers(config, client, images)
+    return client, images, containers
+
+def create_stats(options):
+    if not options.profile_dir:
+        return None
+    stats = Stats()
+    Timer.Stats = stats
+    Profiler(stats, options.profile_dir).install()
+    return stats
+
+def create_loop(options):
+    """
+        Routes timers and blocking removal calls through a single owner thread, when enabled
+    """
+    if not options.workers:
+        return None
+    loop = Loop(options.workers)
+    Image.Timer = loop.timer
+    Image.Executor = loop
+    Image.Retries.Timer = loop.timer
+    Image.Deferred.Timer = loop.timer
+    Image.Pruner.Timer = loop.timer
+    return loop
+
+def configure_slack(options):
+    """
+        Groups image expirations falling in the same slack window, when enabled
+    """
+    if options.timer_slack:
+        Image.Timer = SlackTimers(options.timer_slack, Image.Timer)
+
+def create_watcher(options, args):
+    setup_logging(options)
+    if options.audit_log:
+        Image.Audit = AuditLog(options.audit_log).start()
+    stats = create_stats(options)
+    client = create_client(options, stats)
+    started = time.time()
+    def on_ready():
+        ready = time.time() - started
+        log.getLogger(Watcher).info("inventory ready in %.1f s", ready)
+        if stats is not None:
+            stats.record('ready', ready)
+    # subscribe first, events received while building the inventory are applied on top of it
+    events = EventBuffer(client().events(decode=True, filters=Watcher.filters()),
+                         options.event_buffer, on_ready).start()
+    client, images, containers = create_inventory(options, stats, client)
     images.update_timers()
-    return Watcher(client, images, containers)
+    if stats is not None:
+        stats.record('bootstrap', time.time() - started)
+    return Watcher(client, images, containers, stats, events)
+
+def watch(watcher, loop=None):
+    if loop is None:
+        watcher.watch()
+        return
+    def read_events():
+        try:
+            watcher.watch(submit=loop.submit)
+        finally:
+            loop.stop()
+    reader = threading.Thread(target=read_events)
+    reader.daemon = True
+    reader.start()
+    loop.run()
+
+def create_reloader(options, images, loop=None):
+    listeners = [
+        lambda: configure_limiter(images.config),
+        images.reload_config,
+    ]
+    if loop is not None:
+        listeners = [lambda listener=listener: loop.call(listener) for listener in listeners]
+    reloader = ConfigReloader(images.config, listeners)
+    reloader.install()
+    if options.config_interval:
+        reloader.watch_file(options.config_interval)
+    return reloader
+
+def create_control(options, watcher, loop=None):
+    """
+        Serves admin requests on the control socket, when enabled
+    """
+    if not options.control_socket:
+        return None
+    control = Control(watcher.images, watcher.containers, loop.call if loop is not None else None, audit=Image.Audit)
+    try:
+        return ControlServer(options.control_socket, control).start()
+    except (socket.error, OSError) as e:
+        log.getLogger(ControlServer).error("cannot serve admin requests on %s, error: %r", options.control_socket, e)
+        return None
+
+def write_status(status, out=sys.stdout):
+    out.write("images: %d\n" % status['images'])
+    out.write("containers: %d\n" % status['containers'])
+    for state, count in sorted(status['states'].items()):
+        out.write("%s: %d\n" % (state, count))
+    if 'audit' in status:
+        out.write("audit entries: %(written)d written, %(dropped)d dropped\n" % status['audit'])
+
+def write_pending(pending, out=sys.stdout):
+    for entry in pending:
+        out.write("%s\t%ds\t%d\t%d\t%s\n" % (
+            entry['id'],
+            entry['in'],
+            entry['size'],
+            entry['reclaimable'],
+            ','.join(entry['tags']),
+        ))
+
+def control_command(options, command, args):
+    """
+        Sends a request to a running caduc, returns the exit status
+    """
+    try:
+        result = request(options.control_socket or DEFAULT_SOCKET, command, *args)
+    except ControlError as e:
+        sys.stderr.write("%s\n" % e)
+        return 1
+    if command == 'status':
+        write_status(result)
+    elif command == 'pending':
+        write_pending(result)
+    else:
+        sys.stdout.write(json.dumps(result, indent=2, sort_keys=True) + '\n')
+    return 0
+
+def create_report(options, args):
+    setup_logging(options)
+    # building the inventory plans removals, make sure none is performed
+    options.dry_run = True
+    _, images, _ = create_inventory(options)
+    Timer.CancelAll()
+    horizon = pytimeparse.timeparse.timeparse(options.horizon)
+    if horizon is None:
+        horizon = int(options.horizon)
+    report(images, horizon)
+
+def write_sweep(summary, dry_run=False, out=sys.stdout):
+    for image_id in summary['failed']:
+        out.write("failed to remove %s\n" % image_id)
+    out.write("%s %d images, %d bytes reclaimed in %.1fs, %d failed, %d deferred to their removal window, "
+              "%d kept, %d in use\n" % (
+        'would remove' if dry_run else 'removed',
+        len(summary['removed']),
+        summary['reclaimed'],
+        summary['seconds'],
+        len(summary['failed']),
+        len(summary['deferred']),
+        summary['kept'],
+        summary['used'],
+    ))
+
+def create_sweep(options, args):
+    """
+        Removes the overdue images once, returns the exit status
+    """
+    setup_logging(options)
+    if options.audit_log:
+        Image.Audit = AuditLog(options.audit_log).start()
+    state_path = options.sweep_state or os.path.join(os.path.expanduser("~"), ".caduc", "sweep.json")
+    sweep = Sweep(options.workers or DEFAULT_SWEEP_WORKERS, state_path=state_path).install(Image)
+    _, images, _ = create_inventory(options)
+    summary = sweep.run(images)
+    if Image.Audit is not None:
+        Image.Audit.close()
+    write_sweep(summary, options.dry_run)
+    return 1 if summary['failed'] else 0
 
 def main(argv=sys.argv[1:]):
 
     from optparse import OptionParser
-    parser = OptionParser()
+    parser = OptionParser(usage="%prog [options] [watch|report|sweep|status|pending [N]|explain IMAGE|expire IMAGE|pin IMAGE|unpin IMAGE|lease IMAGE TIME|release IMAGE]")
     parser.add_option("--image-gracetime", dest="image_gracetime", default=DEFAULT_DELETE_TIMEOUT,
                       help="Default grace TIME between last container removal (or last child image removal) and proper image removal", metavar="TIME")
     parser.add_option("-D", '--debug', dest="debug", action='store_true',
@@ -41,9 +257,60 @@ def main(argv=sys.argv[1:]):
                       help="Adds KEY:VALUE to the configuration", metavar="KEY:VALUE")
     parser.add_option("-C", '--config-file', dest="config_path",
                       help="Sets the location of caduc configuration FILE", metavar="FILE")
+    parser.add_option('--config-interval', dest="config_interval", type='float', default=0,
+                      help="Reload the configuration file when it changes, checking every SECONDS. "
+                           "The configuration is also reloaded on SIGHUP", metavar="SECONDS")
+    parser.add_option('--profile-dir', dest="profile_dir",
+                      help="Time docker API calls and event handlers, dumping statistics and a sampling profile "
+                           "to DIR on SIGUSR1", metavar="DIR")
+    parser.add_option('--audit-log', dest="audit_log",
+                      help="Record removed images as JSON lines in FILE", metavar="FILE")
+    parser.add_option('--workers', dest="workers", type='int', default=0,
+                      help="Update the inventory from a single thread, running blocking docker calls "
+                           "in N worker threads. sweep: remove up to N images concurrently (default: %d)" % DEFAULT_SWEEP_WORKERS,
+                      metavar="N")
+    parser.add_option('--event-buffer', dest="event_buffer", type='int', default=10000,
+                      help="Buffer up to N docker events received while building the inventory", metavar="N")
+    parser.add_option('--docker-root', dest="docker_root",
+                      help="Build the image inventory from the image store of the docker daemon in DIR "
+                           "(e.g. /var/lib/docker mounted read only) instead of inspecting every image", metavar="DIR")
+    parser.add_option('--timer-slack', dest="timer_slack", type='float', default=0,
+                      help="Delay image expirations up to SECONDS, so that expirations close in time "
+                           "are handled together. Requires --workers, removing the images of a batch "
+                           "in the worker threads", metavar="SECONDS")
+    parser.add_option('--control-socket', dest="control_socket",
+                      help="watch: serve admin requests on the unix socket PATH, disabled by default. "
+                           "Admin commands connect to PATH (default: %s)" % DEFAULT_SOCKET,
+                      metavar="PATH")
+    parser.add_option('--sweep-state', dest="sweep_state",
+                      help="sweep: remember in FILE when images were last seen in use (default: ~/.caduc/sweep.json)",
+                      metavar="FILE")
+    parser.add_option("-n", '--dry-run', dest="dry_run", action='store_true', default=False,
+                      help="Schedule removals as usual, but only log images that would be removed")
+    parser.add_option('--horizon', dest="horizon", default="0",
+                      help="report: list images that would be removed within TIME", metavar="TIME")
     (options, args) = parser.parse_args(argv)
-    create_watcher(options, args).watch()
+    if options.timer_slack and not options.workers:
+        # a batch would otherwise be removed one image after the other, from a single timer thread
+        parser.error("--timer-slack requires --workers")
+    install_abort()
+    command = args[0] if args else 'watch'
+    if command == 'watch':
+        # timers must be bound to the loop before the inventory plans removals
+        loop = create_loop(options)
+        configure_slack(options)
+        watcher = create_watcher(options, args)
+        create_reloader(options, watcher.images, loop)
+        create_control(options, watcher, loop)
+        watch(watcher, loop)
+    elif command == 'report':
+        create_report(options, args)
+    elif command == 'sweep':
+        sys.exit(create_sweep(options, args))
+    elif command in Control.Commands:
+        sys.exit(control_command(options, command, args[1:]))
+    else:
+        parser.error("unknown command %r" % command)
 
 if __name__=='__main__':
     main()
-
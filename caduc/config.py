@@ -1,6 +1,9 @@
 import os
 import six
-import yaml
+import threading
+
+from .lazy import yaml
+from .window import Window
 
 class Node(dict):
 
@@ -32,16 +35,30 @@ class Node(dict):
 class Config(Node):
 
     def __init__(self, options=[], config_path=None):
-        if config_path is None:
-            config_path = os.path.join(os.path.expanduser("~"), ".caduc", "config.yml")
+        self.options = list(options)
+        self.config_path = config_path
+        # held while swapping in a reloaded configuration and while walking it
+        self.lock = threading.Lock()
+        super(Config, self).__init__()
+        self.load()
+
+    @property
+    def path(self):
+        if self.config_path is None:
+            return os.path.join(os.path.expanduser("~"), ".caduc", "config.yml")
+        return self.config_path
+
+    def load(self):
+        config_path = self.path
+        if self.config_path is None:
             if os.path.exists(config_path):
                 config = yaml.load(open(config_path, 'r'))
             else:
                 config = {}
         else:
             config = yaml.load(open(config_path, 'r'))
-        super(Config, self).__init__(**config)
-        for opt in options:
+        self.update(config or {})
+        for opt in self.options:
             k, v = self.parse_kv(opt)
             node = {}
             child = node
@@ -51,6 +68,30 @@ class Config(Node):
                 child = child[key]
             child[keys[-1]] = v
             self.update(node)
+        self.validate()
+
+    def validate(self):
+        """
+            Raises ValueError on the values only read once a removal is due
+        """
+        policies = self.get('images') or {}
+        specs = [kv.get('window') for kv in six.itervalues(policies) if isinstance(kv, dict)]
+        specs.append(self.get('removals.window'))
+        for spec in specs:
+            if spec:
+                Window.parse(spec)
+
+    def reload(self):
+        """
+            Reads the configuration again, in place, so that all its users see the new values.
+            The current configuration is kept when the new one can't be loaded.
+            The new tree is built aside then swapped in at once, the nodes of the old one are left
+            untouched for the readers still walking them
+        """
+        config = self.__class__(self.options, self.config_path)
+        with self.lock:
+            dict.clear(self)
+            dict.update(self, config)
 
     def parse_key(self, key):
         r = key.split('.')
@@ -65,11 +106,13 @@ class Config(Node):
         return r
 
     def get(self, path, default=None):
-        node = self
-        try:
-            for key in self.parse_key(path):
-                node = node[key]
-            return node
-        except KeyError:
-            return default
+        keys = self.parse_key(path)
+        with self.lock:
+            node = self
+            try:
+                for key in keys:
+                    node = node[key]
+                return node
+            except KeyError:
+                return default
 
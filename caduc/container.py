@@ -1,19 +1,34 @@
-import logging
+
+from . import log
 
 class Container(set):
+    # keeps the image of the container for the given time once the container is removed
+    LeaseLabel = 'com.caduc.image.lease'
+
     @property
     def client(self):
         return self._client()
-    def __init__(self, config, client, id):
+    def __init__(self, config, client, id, inspect=None):
         self.config = config
-        self.logger = logging.getLogger(str(self.__class__))
+        self.logger = log.getLogger(self)
         self._client = client
-        inspect = self.client.inspect_container(id)
+        if inspect is None:
+            inspect = self.client.inspect_container(id)
         self.name = inspect.get('Name', None)
         self.id = inspect['Id']
         self.image_id = inspect['Image']
+        # labels are nested in inspection results, and top level in listings
+        labels = (inspect.get('Config', None) or {}).get('Labels', None) or inspect.get('Labels', None) or {}
+        self.lease = labels.get(self.LeaseLabel, None)
     def __hash__(self):
         return hash(self.id)
+    @property
+    def ref(self):
+        """
+            A cheap reference to the container, for log messages
+        """
+        return 'Container<%s %s>' % (self.id[:12], self.name)
+
     def __str__(self):
         return 'Container<id: %s, name:%s>' % (self.id, self.name)
 
@@ -9,14 +9,23 @@ class Containers(SyncDict):
         self.images = images
         super(Containers, self).__init__()
 
-    def instanciate(self, item):
-        container = Container(self.config, self._client, item)
+    def instanciate(self, item, inspect=None):
+        container = Container(self.config, self._client, item, inspect)
         try:
-            self.images[container.image_id].add(container)
+            # a container proves its image exists, even when it was removed recently and pulled again
+            self.images.add(container.image_id).add(container)
         except KeyError:
-            self.logger.error("%s is running on not found image %s. It looks like it has been deleted --force" % (container, container.image_id))
+            self.logger.error("%s is running on not found image %s. It looks like it has been deleted --force", container.ref, container.image_id)
         return container
 
+    def discarded(self, container):
+        image = dict.get(self.images, container.image_id, None)
+        if image is not None:
+            try:
+                image.remove(container)
+            except KeyError:
+                pass
+
     def inspect(self, *args, **kwds):
         return self.client.inspect_container(*args, **kwds)
 
@@ -25,11 +34,21 @@ class Containers(SyncDict):
 
     def pop(self, container):
         container = super(Containers, self).pop(container)
-        self.logger.info("container %s was removed", container)
         if container is not None:
+            self.logger.info("container %s was removed", container.ref)
             try:
-                self.images[container.image_id].remove(container)
+                image = self.images[container.image_id]
+                if container.lease:
+                    self.lease(image, container)
+                image.remove(container)
             except KeyError:
-                self.logger.error("%s is running on not found image %s. It looks like it has been deleted --force" % (container, container.image_id))
+                self.logger.error("%s is running on not found image %s. It looks like it has been deleted --force", container.ref, container.image_id)
         return container
 
+    def lease(self, image, container):
+        try:
+            seconds = image.parse_grace_time(container.lease)
+        except ValueError:
+            self.logger.warning("%s has an invalid lease %r", container.ref, container.lease)
+            return
+        image.lease(seconds)
@@ -0,0 +1,261 @@
+import errno
+import json
+import os
+import socket
+import stat
+import threading
+import time
+
+from six.moves import socketserver
+
+from . import log
+
+DEFAULT_SOCKET = '/var/run/caduc.sock'
+
+class ControlError(Exception):
+    pass
+
+class Control(object):
+    """
+        Answers admin requests about the inventory from its in-memory state, the docker daemon is never called.
+        Requests changing removals are run through dispatch, see loop.Loop.call.
+        The audit.AuditLog, when enabled, has its counters reported in the status
+    """
+    # methods answering requests
+    Commands = ('status', 'pending', 'explain', 'expire', 'pin', 'unpin', 'lease', 'release')
+
+    def __init__(self, images, containers, dispatch=None, clock=time.time, audit=None):
+        self.logger = log.getLogger(self)
+        self.images = images
+        self.containers = containers
+        self.dispatch = dispatch
+        self.audit = audit
+        self.clock = clock
+
+    def call(self, func, *args):
+        if self.dispatch is None:
+            func(*args)
+        else:
+            self.dispatch(func, *args)
+
+    def lookup(self, ref):
+        """
+            Returns the tracked image referenced by ref, without inspecting it
+        """
+        image_id = ref if dict.__contains__(self.images, ref) else self.images.resolve(ref)
+        image = dict.get(self.images, image_id, None) if image_id is not None else None
+        if image is None:
+            raise ControlError("no tracked image matching %r" % ref)
+        return image
+
+    def tracked(self):
+        with self.images.lock:
+            return list(self.images.values())
+
+    def state(self, image):
+        if image.pinned:
+            return 'pinned'
+        if image.in_use():
+            return 'in_use'
+        if image.id in image.Leases:
+            return 'leased'
+        if image.deadline() is not None:
+            return 'scheduled'
+        if image.id in image.Retries:
+            return 'retrying'
+        if image in image.Deferred:
+            return 'deferred'
+        if image in image.Pruner:
+            return 'pruning'
+        if image.event is not None:
+            return 'removing'
+        return 'kept'
+
+    def status(self):
+        states = {}
+        for image in self.tracked():
+            state = self.state(image)
+            states[state] = states.get(state, 0) + 1
+        status = {
+            'images': len(self.images),
+            'containers': len(self.containers),
+            'states': states,
+        }
+        if self.audit is not None:
+            status['audit'] = {'written': self.audit.written, 'dropped': self.audit.dropped}
+        return status
+
+    def pending(self, limit=10):
+        """
+            Returns the next scheduled removals, soonest first
+        """
+        scheduled = []
+        for image in self.tracked():
+            deadline = image.deadline()
+            if deadline is not None:
+                scheduled.append((deadline, image))
+        scheduled.sort(key=lambda item: item[0])
+        now = self.clock()
+        return [{
+            'id': image.id,
+            'tags': image.details.get('RepoTags', None) or [],
+            'deadline': deadline,
+            'in': max(0, deadline - now),
+            'size': image.details.get('Size', None) or 0,
+            'reclaimable': image.reclaimable_size(),
+        } for deadline, image in scheduled[:int(limit)]]
+
+    def explain(self, ref):
+        """
+            Returns why the image is kept or when it is removed
+        """
+        image = self.lookup(ref)
+        names = image.details.get('RepoTags', None) or []
+        seconds, grace_text = image.get_grace_time()
+        with image.lock:
+            containers = [container.name or container.id for container in image]
+            children = list(image.children)
+        return {
+            'id': image.id,
+            'tags': names,
+            'state': self.state(image),
+            'containers': sorted(containers),
+            'children': sorted(children),
+            'policies': image.get_policies(names),
+            'grace_time': str(grace_text),
+            'grace_seconds': seconds,
+            'deadline': image.deadline(),
+            'lease': image.Leases.remaining(image.id),
+            'size': image.details.get('Size', None) or 0,
+            'reclaimable': image.reclaimable_size(),
+        }
+
+    def expire(self, ref):
+        """
+            Removes the image as if its grace time elapsed
+        """
+        image = self.lookup(ref)
+        if image.pinned:
+            raise ControlError("%s is pinned" % ref)
+        if image.in_use():
+            raise ControlError("%s is in use" % ref)
+        if image.id in image.Leases:
+            raise ControlError("%s is leased" % ref)
+        self.logger.info("%s expired on request", image.ref)
+        self.call(image.rm)
+        return {'id': image.id}
+
+    def pin(self, ref):
+        image = self.lookup(ref)
+        self.call(image.pin)
+        return {'id': image.id}
+
+    def unpin(self, ref):
+        image = self.lookup(ref)
+        self.call(image.unpin)
+        return {'id': image.id}
+
+    def lease(self, ref, duration):
+        """
+            Keeps the image for duration (e.g. 2h, 3600) from now, even when unused
+        """
+        image = self.lookup(ref)
+        seconds = image.parse_grace_time(duration)
+        self.call(image.lease, seconds)
+        return {'id': image.id, 'seconds': seconds}
+
+    def release(self, ref):
+        image = self.lookup(ref)
+        self.call(image.release)
+        return {'id': image.id}
+
+    def handle(self, request):
+        """
+            Returns the response to a request {"command": ..., "args": [...]}
+        """
+        command = request.get('command', None) if isinstance(request, dict) else None
+        if command not in self.Commands:
+            return {'error': 'unknown command %r' % command}
+        try:
+            return {'result': getattr(self, command)(*request.get('args', None) or [])}
+        except (ControlError, TypeError, ValueError) as e:
+            return {'error': str(e)}
+
+class ControlHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode('utf-8'))
+            except ValueError as e:
+                response = {'error': 'invalid request: %s' % e}
+            else:
+                response = self.server.control.handle(request)
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+class ControlServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+        Serves a Control on a unix socket, one JSON request and response per line
+    """
+    daemon_threads = True
+
+    def __init__(self, path, control):
+        self.logger = log.getLogger(self)
+        self.control = control
+        self.remove_stale(path)
+        # only the owner may connect, from the creation of the socket
+        umask = os.umask(0o177)
+        try:
+            socketserver.UnixStreamServer.__init__(self, path, ControlHandler)
+        finally:
+            os.umask(umask)
+
+    def remove_stale(self, path):
+        """
+            Removes the socket left over at path by a previous run,
+            raises OSError when path is not a socket or is still served
+        """
+        try:
+            mode = os.stat(path).st_mode
+        except OSError:
+            return
+        if not stat.S_ISSOCK(mode):
+            raise OSError(errno.EEXIST, "%s exists and is not a socket" % path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(path)
+        except socket.error:
+            self.logger.info("removing stale socket %s", path)
+            os.unlink(path)
+            return
+        finally:
+            sock.close()
+        raise OSError(errno.EADDRINUSE, "%s is served by another process" % path)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.logger.info("serving admin requests on %s", self.server_address)
+        return self
+
+def request(path, command, *args):
+    """
+        Sends a request to the control socket at path, returns its result or raises ControlError
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.connect(path)
+        except socket.error as e:
+            raise ControlError("cannot connect to %s: %s" % (path, e))
+        sock.sendall(json.dumps({'command': command, 'args': list(args)}).encode('utf-8') + b'\n')
+        response = sock.makefile('rb').readline()
+    finally:
+        sock.close()
+    if not response:
+        raise ControlError("no response from %s" % path)
+    response = json.loads(response.decode('utf-8'))
+    if 'error' in response:
+        raise ControlError(response['error'])
+    return response['result']
@@ -1,5 +1,8 @@
-import docker
-import logging
+import threading
+
+from . import log
+from .cache import TTLCache
+from .lazy import docker
 
 class SyncDict(dict):
     """
@@ -9,17 +12,22 @@ class SyncDict(dict):
             - automatic initialization with client contents
     """
     AttributeName = None
+    # how long a failed lookup is remembered, sparing the client repeated inspections of missing items
+    MissingTTL = 2
+    # how long ids of removed items are remembered, they are most often referenced again by late events
+    GoneTTL = 300
 
     @property
     def client(self):
         return self._client()
 
-    def instanciate(self, Id):
+    def instanciate(self, Id, inspect=None):
         """
             implement this method to create the object to be created when a new item is found in the client
+            inspect is the result of inspect(Id) when already retrieved, None otherwise
             Must return the instance of the object corresponding to the 'Id'
         """
-        raise NotImplementedError("Please implement instanciate(Id)")
+        raise NotImplementedError("Please implement instanciate(Id, inspect=None)")
 
     def list_items(self):
         """
@@ -28,6 +36,13 @@ class SyncDict(dict):
         """
         raise NotImplementedError("Please implement list_items()")
 
+    def listed_inspect(self, item):
+        """
+            override this method when list_items returns complete inspection results
+            Must return the inspection result of a listed item, None when it must be inspected
+        """
+        return None
+
     def inspect(self, *args, **kwds):
         """
             implement this method, retrieving key->value concerning item attributes
@@ -37,49 +52,101 @@ class SyncDict(dict):
         """
         raise NotImplementedError("Please implement inspect(*args, **kwds)")
 
+    def resolve(self, item):
+        """
+            override this method to resolve names to ids without calling the client
+            Must return the Id matching item, None when unknown
+        """
+        return None
+
     def __init__(self):
-        self.logger = logging.getLogger(str(self.__class__))
+        self.logger = log.getLogger(self)
+        self.missing = TTLCache(self.MissingTTL)
+        # serializes insertions and removals, lookups of existing items are lock free
+        # and instanciations, which may call the client, are not serialized
+        self.lock = threading.RLock()
         super(SyncDict, self).__init__()
         for item in self.list_items():
             self.logger.debug("id: %s ", item['Id'])
-            self.add(item['Id'])
+            self.add(item['Id'], self.listed_inspect(item))
 
     def __inspect(self, item):
+        if item in self.missing:
+            raise KeyError("No %s matching '%r' (cached)" % (self.AttributeName, item))
         try:
             return self.inspect(item)
         except docker.errors.NotFound:
+            self.missing.add(item)
             raise KeyError("Failed to retrieve %s matching '%r'" % (self.AttributeName, item))
 
-    def __iterItemIds(self, item):
+    def __iterItemIds(self, item, inspected=None):
         """
             A method for key lookup.
-            First try the exact same key, and fallback calling the client when not found
+            First try the exact same key, and fallback calling the client when not found.
+            The client response is appended to inspected when given
         """
         yield item
-        yield self.__inspect(item)['Id']
+        resolved = self.resolve(item)
+        if resolved is not None:
+            yield resolved
+        inspect = self.__inspect(item)
+        if inspected is not None:
+            inspected.append(inspect)
+        yield inspect['Id']
 
     def __getitem__(self, item):
         """
             Gets a key and fall back instanciating one when not available
         """
-        for id in self.__iterItemIds(item):
+        inspected = []
+        for id in self.__iterItemIds(item, inspected):
             try:
                 self.logger.debug("getting item %s", id)
                 return super(SyncDict, self).__getitem__(id)
             except KeyError:
                 continue
         self.logger.debug("Failed to retrieve %s from cache, instanciate one", item)
-        instance = self.instanciate(id)
-        if instance is not None:
-            super(SyncDict, self).__setitem__(id, instance)
-        return super(SyncDict, self).__getitem__(id)
+        if id in self.missing:
+            raise KeyError("%s '%r' was removed" % (self.AttributeName, id))
+        # the lookup ends with an inspection, reuse it instead of inspecting again
+        return self.__store(id, inspected[-1], unless_removed=True)
+
+    def __store(self, id, inspect, unless_removed=False):
+        """
+            Instanciates and stores the item. Instanciation may call the client (e.g. for parent images),
+            the lock is only held to store the instance: it is dropped when another thread stored the item meanwhile,
+            or with unless_removed, when the item was removed meanwhile
+        """
+        instance = self.instanciate(id, inspect)
+        with self.lock:
+            existing = super(SyncDict, self).get(id, None)
+            removed = unless_removed and id in self.missing
+            if existing is None and not removed and instance is not None:
+                super(SyncDict, self).__setitem__(id, instance)
+                return instance
+        if existing is not None:
+            # instanciated alike, registering it again with related items changed nothing
+            return existing
+        if instance is None:
+            raise KeyError(id)
+        self.discarded(instance)
+        raise KeyError("%s '%r' was removed" % (self.AttributeName, id))
+
+    def discarded(self, instance):
+        """
+            override this method to undo what instanciate registered, when the item was removed while instanciating
+        """
+        pass
 
     def pop(self, item, default=None):
         try:
             for id in self.__iterItemIds(item):
                 try:
-                    self.logger.debug("popping item %s keys %s", id, self.keys())
-                    return super(SyncDict, self).pop(id)
+                    self.logger.debug("popping item %s", id)
+                    with self.lock:
+                        value = super(SyncDict, self).pop(id)
+                        self.gone(id)
+                    return value
                 except KeyError:
                     continue
         except KeyError:
@@ -90,23 +157,44 @@ class SyncDict(dict):
             Stores a new item, raises KeyError if the key already exists
         """
         inspect = self.__inspect(item)
-        if inspect['Id'] in self.keys():
-            raise KeyError("Cannot overwrite an %s" % self.AttributeName)
-        return super(SyncDict, self).__setitem__(inspect['Id'], value)
+        with self.lock:
+            if inspect['Id'] in self.keys():
+                raise KeyError("Cannot overwrite an %s" % self.AttributeName)
+            return super(SyncDict, self).__setitem__(inspect['Id'], value)
 
     def __delitem__(self, item):
         for id in self.__iterItemIds(item):
             try:
-                return super(SyncDict, self).__delitem__(id)
+                with self.lock:
+                    return super(SyncDict, self).__delitem__(id)
             except KeyError:
                 continue
         raise KeyError('%s: no such key' % item)
 
-    def add(self, item):
+    def gone(self, item):
+        """
+            Records that item was removed from the client, later lookups won't call the client
+        """
+        self.missing.add(item, self.GoneTTL)
+
+    def forget(self, item):
+        """
+            Pops an item known to be removed from the client, without calling the client
+        """
+        self.gone(item)
+        return self.pop(item)
+
+    def add(self, item, inspect=None):
         """
             Automatic value creation
             retrieves item Id and call instanciate(item)
+            inspect may be given when the item details are already known, sparing a client call
         """
+        # the item is known to exist, forget about past failed lookups
+        self.missing.discard(item)
+        if inspect is not None and not super(SyncDict, self).__contains__(item) \
+                and not super(SyncDict, self).__contains__(inspect['Id']):
+            return self.__store(inspect['Id'], inspect)
         # getitem already performs instanciation when needed
         return self[item]
 
@@ -0,0 +1,45 @@
+import threading
+import time
+
+from . import log
+from .lazy import docker
+
+class RecordingClient(object):
+    """
+        A docker client proxy recording image removals instead of performing them
+    """
+    def __init__(self, recorder, client):
+        self._recorder = recorder
+        self._client = client
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def remove_image(self, image, *args, **kwds):
+        self._recorder.record(image, kwds)
+        # make caduc believe the image is gone, forgetting about it
+        # and updating its parent, as it would after an actual removal
+        raise docker.errors.NotFound("dry-run: %s removal was recorded" % image)
+
+    def prune_images(self, filters=None):
+        self._recorder.logger.info("dry-run: would prune images matching %r", filters)
+        # let images be removed one by one, recording each of them
+        return {'ImagesDeleted': None, 'SpaceReclaimed': 0}
+
+class Recorder(object):
+    """
+        Wraps a docker client factory, recording image removals of all created clients
+    """
+    def __init__(self, client):
+        self.logger = log.getLogger(self)
+        self._client = client
+        self.removed = []
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        return RecordingClient(self, self._client())
+
+    def record(self, image, kwds):
+        self.logger.info("dry-run: would remove %s", image)
+        with self.lock:
+            self.removed.append((time.time(), image, kwds))
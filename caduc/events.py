@@ -0,0 +1,62 @@
+import threading
+
+from six.moves import queue
+
+from . import log
+
+class EventBuffer(object):
+    """
+        Reads docker events from a background thread into a bounded queue, so that the subscription
+        can be opened before the inventory is built and no event is missed meanwhile.
+        When the queue is full, reading pauses and events wait in the daemon connection.
+        Iterating over the buffer yields the events in order, on_ready() is called once the backlog
+        received before the first iteration was handled
+    """
+    End = object()
+
+    def __init__(self, events, size=10000, on_ready=None):
+        self.logger = log.getLogger(self)
+        self.events = events
+        self.queue = queue.Queue(size)
+        self.on_ready = on_ready
+        self.received = 0
+        self.backlog = None
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.read)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def read(self):
+        try:
+            for event in self.events:
+                if self.queue.full():
+                    self.logger.warning("event buffer is full, waiting for %d events to be handled", self.queue.qsize())
+                self.queue.put(event)
+                self.received += 1
+        except Exception as e:
+            self.logger.error("Failed to read docker events, error: %r", e)
+        finally:
+            self.queue.put(self.End)
+
+    def __iter__(self):
+        if self.backlog is None:
+            self.backlog = self.queue.qsize()
+            self.logger.info("applying %d events received while building the inventory", self.backlog)
+        pending = self.backlog
+        while True:
+            if pending == 0:
+                pending = None
+                if self.on_ready is not None:
+                    self.on_ready()
+            event = self.queue.get()
+            if event is self.End:
+                return
+            yield event
+            if pending:
+                pending -= 1
+
+    def __len__(self):
+        return self.queue.qsize()
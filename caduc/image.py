@@ -1,12 +1,23 @@
+import datetime
 import decimal
-import docker
 import fnmatch
-import logging
 import pytimeparse.timeparse
 import six
 import threading
+import time
 
+from . import log
+from .lazy import docker
+from .lazy import requests
+from .lease import Leases
+from .loop import Inline
+from .prune import Pruner
+from .ratelimit import RateLimiter
+from .retry import RetryQueue
 from .timer import Timer
+from .window import DeferredRemovals
+from .window import Window
+from .window import disk_usage
 
 DEFAULT_DELETE_TIMEOUT = "1d"
 
@@ -23,7 +34,28 @@ class Image(set):
     DefaultTimeout = DEFAULT_DELETE_TIMEOUT
     # allow max 5 concurrent deletes, preventing from requests.packages.urllib3.connectionpool:Connection pool is full, discarding connection errors
     RmSemaphore = ClientSemaphore(5)
+    # delay before checking again whether a requested deletion has been acknowledged
+    RetryDelay = 30
+    # backoff of failed deletions, shared by all images
+    Retries = RetryQueue()
+    # removal budget, spreading layer removals to avoid storage driver I/O storms
+    RmLimiter = RateLimiter()
+    # images expired out of their removal window
+    Deferred = DeferredRemovals()
+    # batches of expired dangling images, removed with a single prune call when enabled
+    Pruner = Pruner()
+    # images reserved for a time window, see lease()
+    Leases = Leases()
+    # optional audit.AuditLog recording removals
+    Audit = None
+    DiskPath = '/var/lib/docker'
     Timer = Timer
+    # runs the blocking docker calls of removals, see loop.Loop
+    Executor = Inline()
+    # error returned by rm_blocking() when the image became used again
+    InUse = object()
+    # error returned by rm_blocking() when removing our last tag deleted the image
+    Untagged = object()
 
     def timeparse(self, *args, **kwds):
         return pytimeparse.timeparse.timeparse(*args, **kwds)
@@ -32,14 +64,23 @@ class Image(set):
     def client(self):
         return self._client()
 
-    def __init__(self, config, images, client, Id, default_timeout=None):
+    def __init__(self, config, images, client, Id, default_timeout=None, details=None):
         self.config = config
-        self.logger = logging.getLogger(str(self.__class__))
+        self.logger = log.getLogger(self)
         self.event = None
+        # grace time of the scheduled removal, and when the image started to be unused
+        self.grace_seconds = None
+        self.scheduled_at = None
+        self.deadline_at = None
+        # pinned by an operator, never removed until unpinned
+        self.pinned = False
         self._client = client
         self.images = images
+        # guards the containers, children and the removal timer of the image
+        self.lock = threading.RLock()
         self.grace_time = self.DefaultTimeout if default_timeout is None else default_timeout
-        self.details = self.client.inspect_image(Id)
+        # details may be given when already inspected by the caller
+        self.details = self.client.inspect_image(Id) if details is None else details
         self.id = self.details['Id']
 
         self.children = set()
@@ -47,7 +88,8 @@ class Image(set):
         # drop empty strings, consider them as None
         self.parentId = parentId if parentId else None
         if self.parentId:
-            self.images[parentId].add_child(self.id)
+            # a child proves its parent exists, even when remembered as removed
+            self.images.add(parentId).add_child(self.id)
         super(Image, self).__init__()
     
     def __hash__(self):
@@ -62,7 +104,7 @@ class Image(set):
         if grace_config:
             for name in names:
                 for pattern, kv in six.iteritems(grace_config):
-                    if fnmatch.fnmatch(name, pattern):
+                    if fnmatch.fnmatch(name, pattern) and 'grace_time' in kv:
                         grace_time = kv['grace_time']
                         if grace_time is None or grace_time==-1:
                             grace_times.add(float('inf'))
@@ -72,6 +114,82 @@ class Image(set):
             return grace_times
         return set([self.grace_time])
 
+    def get_policies(self, names):
+        """
+            Returns the policies deciding of the image grace time
+        """
+        labels = self.details['Config']['Labels']
+        if labels and labels.get("com.caduc.image.grace_time"):
+            return ['label:com.caduc.image.grace_time']
+        grace_config = self.config.get("images") or {}
+        patterns = set()
+        for name in names:
+            for pattern in grace_config:
+                if fnmatch.fnmatch(name, pattern):
+                    patterns.add(pattern)
+        return sorted(patterns) or ['default']
+
+    def can_force_rm(self, names):
+        """
+            Returns True when every name of the image matches a policy with `force_rm` enabled,
+            allowing to untag and delete the image with a single forced removal by id
+        """
+        grace_config = self.config.get("images")
+        if not grace_config or not names:
+            return False
+        for name in names:
+            if not any(
+                    fnmatch.fnmatch(name, pattern) and kv.get('force_rm', False)
+                    for pattern, kv in six.iteritems(grace_config)
+                ):
+                return False
+        return True
+
+    def get_windows(self, names):
+        """
+            Returns the removal windows of the policies matching names,
+            falling back to the global removal window
+        """
+        grace_config = self.config.get("images")
+        windows = set()
+        if grace_config:
+            for name in names:
+                for pattern, kv in six.iteritems(grace_config):
+                    if fnmatch.fnmatch(name, pattern) and kv.get('window'):
+                        windows.add(Window.parse(kv['window']))
+        if not windows and self.config.get('removals.window'):
+            windows.add(Window.parse(self.config.get('removals.window')))
+        return windows
+
+    def above_watermark(self):
+        watermark = self.config.get('removals.watermark')
+        if watermark is None:
+            return False
+        try:
+            usage = disk_usage(self.config.get('removals.disk_path') or self.DiskPath)
+        except OSError as e:
+            self.logger.debug("failed to get disk usage: %s", e)
+            return False
+        return usage >= float(watermark)
+
+    def removal_delay(self, now=None):
+        """
+            Returns the number of seconds before the image may be removed
+            according to its removal windows. Removal is immediate when the disk is above the watermark
+        """
+        windows = self.get_windows(self.details.get('RepoTags', None) or [])
+        if not windows:
+            return 0
+        if now is None:
+            now = datetime.datetime.now()
+        delay = min(window.delay(now) for window in windows)
+        if delay and self.above_watermark():
+            return 0
+        return delay
+
+    def reclaimable_size(self):
+        return self.images.layers.unique_size(self.id)
+
     def parse_grace_time(self, timeout):
         if isinstance(timeout, six.string_types):
             seconds = self.timeparse(timeout)
@@ -84,30 +202,78 @@ class Image(set):
                 seconds = float('inf')
         return seconds
 
-    def refresh(self):
-        self.details = self.client.inspect_image(self.id)
+    def update_details(self, details):
+        self.details = details
+        self.images.reindex(self)
+
+    def add_tag(self, name):
+        """
+            Adds a name to the image details, as notified by a tag event
+        """
+        tags = [tag for tag in self.details.get('RepoTags', None) or [] if tag != '<none>:<none>']
+        if name not in tags:
+            details = dict(self.details)
+            details['RepoTags'] = tags + [name]
+            self.update_details(details)
         self.update_timer()
 
+    def remove_tag(self, name):
+        """
+            Removes a name from the image details, when it was moved to another image
+        """
+        tags = self.details.get('RepoTags', None) or []
+        if name in tags:
+            details = dict(self.details)
+            details['RepoTags'] = [tag for tag in tags if tag != name]
+            self.update_details(details)
+
+    def refresh(self, details=None):
+        self.update_details(self.client.inspect_image(self.id) if details is None else details)
+        self.update_timer()
+
+    @property
+    def ref(self):
+        """
+            A cheap reference to the image, for log messages
+        """
+        tags = self.details.get('RepoTags', None)
+        return 'Image<%s %s>' % (self.id[7:19] if self.id.startswith('sha256:') else self.id[:12], tags[0] if tags else '<none>')
+
     def __str__(self):
         return 'Image<Id: %s, names: %r parent: %s, children: %r>' % (self.details['Id'], self.details.get('RepoTags', None), self.parentId, self.children)
 
     def deleted(self):
         self.cancel_rm()
+        self.Retries.reset(self.id)
         if self.parentId:
-            self.images[self.parentId].delete_child(self.id)
+            try:
+                parent = self.images[self.parentId]
+            except KeyError:
+                self.logger.debug("%s parent %s is already deleted", self.ref, self.parentId)
+            else:
+                parent.delete_child(self.id)
 
     def add_child(self, child):
         self.logger.debug("%s inherits %s", child, self)
-        self.children.add(child)
-        self.update_timer()
+        with self.lock:
+            self.children.add(child)
+            self.update_timer()
 
     def delete_child(self, child):
         self.logger.debug("%s sub image was deleted %s", self, child)
-        self.children.remove(child)
-        self.update_timer()
+        with self.lock:
+            self.children.discard(child)
+            self.update_timer()
+
+    def in_use(self):
+        with self.lock:
+            return bool(self or self.children)
  
-    def schedule_rm(self):
-        grace_texts = self.get_grace_times(self.details['RepoTags'])
+    def get_grace_time(self):
+        """
+            Returns the longest grace time applying to the image, in seconds, and its textual definition
+        """
+        grace_texts = self.get_grace_times(self.details['RepoTags'] or [])
         seconds = -1
         grace_text = None
         for txt in grace_texts:
@@ -115,62 +281,287 @@ class Image(set):
             if t > seconds:
                 seconds = t
                 grace_text = txt
+        return seconds, grace_text
+
+    def schedule_rm(self, elapsed=0):
+        seconds, grace_text = self.get_grace_time()
         if seconds<0 or seconds==float('inf'):
             self.logger.debug("not scheduling %s removal, delete delay %r is negative or infinite", self, seconds)
             return
-        if not self.event:
-            self.logger.info("scheduling %s removal in %s (%r s)", self, grace_text, seconds)
-            self.event = self.Timer(seconds, self.rm)
+        with self.lock:
+            if self.event or self.in_use() or self.pinned:
+                return
+            delay = max(0, seconds - elapsed)
+            leased = self.Leases.remaining(self.id)
+            if leased > delay:
+                if leased == float('inf'):
+                    self.logger.debug("not scheduling %s removal, it is leased forever", self)
+                    return
+                self.logger.info("scheduling %s removal at the end of its lease, in %r s", self.ref, leased)
+                delay = leased
+            else:
+                self.logger.info("scheduling %s removal in %s (%r s)", self.ref, grace_text, seconds)
+            now = time.time()
+            self.grace_seconds = seconds
+            self.scheduled_at = now - elapsed
+            self.deadline_at = now + delay
+            self.event = self.Timer(delay, self.rm)
             self.event.start()
 
+    def deadline(self):
+        """
+            Returns the timestamp of the scheduled removal, None when no removal is scheduled
+        """
+        with self.lock:
+            if self.event is None or self.grace_seconds is None:
+                return None
+            return self.deadline_at
+
+    def reschedule(self):
+        """
+            Plans the scheduled removal again, keeping the time elapsed since the image is unused
+        """
+        with self.lock:
+            if self.deadline() is None:
+                return
+            elapsed = time.time() - self.scheduled_at
+            self.cancel_rm()
+            self.schedule_rm(elapsed)
+
+    def lease(self, seconds):
+        """
+            Keeps the image at least seconds from now, even when unused
+        """
+        self.logger.info("leasing %s for %r s", self.ref, seconds)
+        expiry = self.Leases.grant(self.id, seconds)
+        deadline = self.deadline()
+        if deadline is not None and deadline < expiry:
+            self.reschedule()
+
+    def release(self):
+        """
+            Ends the lease of the image, its removal is planned according to its grace time only
+        """
+        self.logger.info("releasing %s lease", self.ref)
+        self.Leases.release(self.id)
+        self.reschedule()
+
+    def pin(self):
+        with self.lock:
+            self.logger.info("pinning %s", self.ref)
+            self.pinned = True
+            self.cancel_rm()
+
+    def unpin(self):
+        with self.lock:
+            self.logger.info("unpinning %s", self.ref)
+            self.pinned = False
+            self.update_timer()
+
+    def update_grace_time(self):
+        """
+            Re-evaluates the removal schedule after a configuration change,
+            keeping the time elapsed since the image is unused
+        """
+        with self.lock:
+            if self.in_use():
+                return
+            if self.event is None:
+                if self.id not in self.Retries and self not in self.Deferred and self not in self.Pruner:
+                    # the grace time may have become finite
+                    self.schedule_rm()
+                return
+            if self.grace_seconds is None:
+                # a removal is already in progress
+                return
+            seconds, _ = self.get_grace_time()
+            if seconds == self.grace_seconds:
+                return
+            self.reschedule()
+
     def cancel_rm(self):
-        if self.event is not None:
-            self.logger.info("cancelling %s removal", self)
-            self.event.cancel()
-        self.event = None
+        with self.lock:
+            if self.event is not None:
+                self.logger.info("cancelling %s removal", self.ref)
+                self.event.cancel()
+            self.event = None
+            self.grace_seconds = None
+            self.Retries.cancel(self.id)
+            self.Deferred.discard(self)
+            self.Pruner.discard(self)
 
     def update_timer(self):
-        if not self and not self.children:
-            self.schedule_rm()
-        else:
-            self.cancel_rm()
+        with self.lock:
+            if not self.in_use():
+                self.schedule_rm()
+            else:
+                self.cancel_rm()
+                self.Retries.reset(self.id)
 
     def add(self, container):
         self.logger.debug("%s is required to run %s", self, container)
-        super(Image, self).add(container)
-        self.update_timer()
+        with self.lock:
+            super(Image, self).add(container)
+            self.update_timer()
 
     def remove(self, container):
-        super(Image, self).remove(container)
-        self.update_timer()
+        with self.lock:
+            super(Image, self).remove(container)
+            self.update_timer()
 
-    def rm(self):
-        with self.RmSemaphore:
-            ## we are about to request an image deletion
-            ## cancel the original timer and schedule another one in case the deletion fails
-            self.cancel_rm()
-            self.logger.info("deleting image %s", self)
-            try:
-                # ensure we have the latest tags in memory
-                self.details = self.client.inspect_image(self.id)
-            except docker.errors.NotFound:
-                self.images.pop(self.id)
+    def schedule_retry(self):
+        with self.lock:
+            if self.event or self.in_use():
                 return
-                # TODO: refresh images list, it seems that we are out of sync
-            for name in self.details.get('RepoTags', []):
-                try:
-                    self.client.remove_image(name)
-                except docker.errors.NotFound:
-                    self.logger.debug('%s: %s removal failed, looks like it has been deleted elsewhere' % (self, name, ))
-                    pass
+            self.logger.debug("checking %s removal again in %r s", self, self.RetryDelay)
+            self.event = self.Timer(self.RetryDelay, self.rm)
+            self.event.start()
+
+    def untag(self, name, errors, untagged=None):
+        with self.RmSemaphore:
             try:
-                self.client.remove_image(self.details['Id'])
+                self.client.remove_image(name)
             except docker.errors.NotFound:
-                self.images.pop(self.id)
-                # TODO: refresh images list, it seems that we are out of sync
+                self.logger.debug('%s: %s removal failed, looks like it has been deleted elsewhere', self, name)
+            except requests.exceptions.RequestException as e:
+                errors.append(e)
             else:
-                self.logger.debug("%s was deleted, plan another deletion in case we don't receive the deletion event", self)
-                self.schedule_rm()
-            # while we don't have the acknoledgement through
-            # the event callback, keep the image reference in memory
+                if untagged is not None:
+                    untagged.append(name)
 
+    def untag_all(self, names, untagged=None):
+        """
+            Removes all names, returns the list of errors that occurred.
+            Names actually removed are appended to untagged when given
+        """
+        errors = []
+        # untag concurrently, each removal holding its own slot of the global limit
+        threads = [threading.Thread(target=self.untag, args=(name, errors, untagged)) for name in names[1:]]
+        for thread in threads:
+            thread.start()
+        if names:
+            self.untag(names[0], errors, untagged)
+        for thread in threads:
+            thread.join()
+        return errors
+
+    def retry_rm(self, error):
+        self.logger.debug("%s removal failed: %s", self, error)
+        self.Retries.retry(self.id, self.rm, error)
+
+    def audit_rm(self, names, forced):
+        if self.Audit is None:
+            return
+        seconds, grace_text = self.get_grace_time()
+        self.Audit.record('removed',
+            id=self.id,
+            tags=names,
+            size=self.details.get('Size', None) or 0,
+            reclaimed=self.reclaimable_size(),
+            grace_time=str(grace_text),
+            grace_seconds=seconds,
+            policies=self.get_policies(names),
+            unused_seconds=time.time() - self.scheduled_at if self.scheduled_at else None,
+            forced=forced,
+        )
+
+    def rm(self, prune=True):
+        ## we are about to request an image deletion
+        ## cancel the original timer and schedule a retry in case the deletion fails
+        self.cancel_rm()
+        if self.pinned:
+            self.logger.info("%s is pinned, not deleting it", self.ref)
+            return
+        if self.id in self.Leases:
+            # leased after the removal was planned
+            self.schedule_rm(time.time() - self.scheduled_at if self.scheduled_at else 0)
+            return
+        delay = self.removal_delay()
+        if delay:
+            self.Deferred.defer(self, delay)
+            return
+        if prune and self.Pruner.accepts(self):
+            self.Pruner.add(self)
+            return
+        self.logger.info("deleting image %s", self.ref)
+        self.Executor.submit(self.fetch_details, (), self.rm_details)
+
+    def fetch_details(self):
+        """
+            Blocking part of rm, retrieves the latest details of the image.
+            Returns (details, error)
+        """
+        try:
+            with self.RmSemaphore:
+                # ensure we have the latest tags in memory
+                return self.client.inspect_image(self.id), None
+        except docker.errors.NotFound as e:
+            return None, e
+        except requests.exceptions.RequestException as e:
+            return None, e
+
+    def rm_details(self, result):
+        details, error = result
+        if isinstance(error, docker.errors.NotFound):
+            self.images.pop(self.id)
+            return
+            # TODO: refresh images list, it seems that we are out of sync
+        if error is not None:
+            self.retry_rm(error)
+            return
+        self.update_details(details)
+        # a container or a sub image may have been created since the removal was planned
+        if self.in_use():
+            self.logger.info("%s is in use again, not deleting it", self.ref)
+            return
+        names = self.details.get('RepoTags', None) or []
+        kwds = {}
+        if self.can_force_rm(names):
+            kwds['force'] = True
+        self.Executor.submit(self.rm_blocking, (names, kwds), lambda error: self.rm_done(names, kwds, error))
+
+    def rm_blocking(self, names, kwds):
+        """
+            Blocking part of rm, untags and removes the image.
+            Returns the error that occurred, None on success
+        """
+        # removing the last tag deletes the layers: wait for our turn before the first untag
+        self.RmLimiter.acquire(self.details.get('Size', None) or 0)
+        if self.in_use():
+            return self.InUse
+        untagged = []
+        if not kwds:
+            errors = self.untag_all(names, untagged)
+            if errors:
+                return errors[0]
+        try:
+            with self.RmSemaphore:
+                self.client.remove_image(self.details['Id'], **kwds)
+        except docker.errors.NotFound as e:
+            if untagged:
+                return self.Untagged
+            return e
+        except requests.exceptions.RequestException as e:
+            return e
+        return None
+
+    def rm_done(self, names, kwds, error):
+        if error is self.InUse:
+            self.logger.info("%s is in use again, not deleting it", self.ref)
+        elif error is self.Untagged:
+            self.logger.debug("%s was deleted with its last tag", self)
+            self.audit_rm(names, False)
+            self.images.pop(self.id)
+        elif isinstance(error, docker.errors.NotFound):
+            self.images.pop(self.id)
+            # TODO: refresh images list, it seems that we are out of sync
+        elif error is not None:
+            self.retry_rm(error)
+        else:
+            # spare inspections of the removed image to late events and lookups
+            self.images.gone(self.id)
+            self.audit_rm(names, bool(kwds))
+            self.logger.debug("%s was deleted, check again later in case we don't receive the deletion event", self)
+            self.schedule_retry()
+        # while we don't have the acknoledgement through
+        # the event callback, keep the image reference in memory
@@ -0,0 +1,107 @@
+import json
+import os
+
+from . import log
+from .layers import chain_ids
+
+class ImageDB(object):
+    """
+        Reads image details from the on-disk store of the docker daemon (/var/lib/docker/image/<driver>),
+        a lot faster than inspecting images one by one through the API.
+        Returned details mimic the fields of the inspect API used by caduc:
+        Id, Parent, RepoTags, RepoDigests, Config, Created, Size, RootFS
+    """
+    def __init__(self, root='/var/lib/docker', driver=None):
+        self.logger = log.getLogger(self)
+        if driver is None:
+            drivers = os.listdir(os.path.join(root, 'image'))
+            if len(drivers) != 1:
+                raise OSError("cannot guess the storage driver among %r, in %s" % (drivers, root))
+            driver = drivers[0]
+        self.path = os.path.join(root, 'image', driver)
+        self.references = None
+        self.layer_sizes = {}
+
+    def hex_id(self, image_id):
+        return image_id.split(':', 1)[-1]
+
+    def read(self, *path):
+        with open(os.path.join(self.path, *path), 'rb') as f:
+            return f.read().decode('utf-8')
+
+    def load_references(self):
+        """
+            Returns tags and digests per image id, from repositories.json
+        """
+        try:
+            repositories = json.loads(self.read('repositories.json')).get('Repositories', None) or {}
+        except (IOError, OSError):
+            repositories = {}
+        references = {}
+        for refs in repositories.values():
+            for name, image_id in refs.items():
+                tags, digests = references.setdefault(image_id, ([], []))
+                (digests if '@' in name else tags).append(name)
+        return references
+
+    def ids(self):
+        return ['sha256:' + name for name in os.listdir(os.path.join(self.path, 'imagedb', 'content', 'sha256'))]
+
+    def layer_size(self, chain_id):
+        try:
+            return self.layer_sizes[chain_id]
+        except KeyError:
+            pass
+        try:
+            size = int(self.read('layerdb', 'sha256', self.hex_id(chain_id), 'size'))
+        except (IOError, OSError, ValueError):
+            size = 0
+        self.layer_sizes[chain_id] = size
+        return size
+
+    def parent(self, image_id):
+        try:
+            return self.read('imagedb', 'metadata', 'sha256', self.hex_id(image_id), 'parent').strip()
+        except (IOError, OSError):
+            return ''
+
+    def inspect(self, item):
+        """
+            Returns the details of the image with id item, raises KeyError when unknown
+        """
+        if self.references is None:
+            self.references = self.load_references()
+        image_id = item if item.startswith('sha256:') else 'sha256:' + item
+        try:
+            config = json.loads(self.read('imagedb', 'content', 'sha256', self.hex_id(image_id)))
+        except (IOError, OSError):
+            raise KeyError(item)
+        tags, digests = self.references.get(image_id, ([], []))
+        container_config = dict(config.get('config', None) or {})
+        container_config.setdefault('Labels', None)
+        diff_ids = (config.get('rootfs', None) or {}).get('diff_ids', None) or []
+        size = sum(self.layer_size(chain_id) for chain_id in chain_ids(diff_ids))
+        return {
+            'Id': image_id,
+            'Parent': self.parent(image_id),
+            'RepoTags': list(tags),
+            'RepoDigests': list(digests),
+            'Config': container_config,
+            'Created': config.get('created', None),
+            'Size': size,
+            'VirtualSize': size,
+            'RootFS': {'Type': 'layers', 'Layers': diff_ids},
+        }
+
+    def images(self):
+        """
+            Returns the details of all images in the store
+        """
+        self.references = self.load_references()
+        images = []
+        for image_id in self.ids():
+            try:
+                images.append(self.inspect(image_id))
+            except (KeyError, ValueError) as e:
+                self.logger.warning("failed to read %s from the image store, error: %r", image_id, e)
+        return images
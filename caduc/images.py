@@ -1,34 +1,90 @@
-import six
 
 from .image import Image
+from .index import ImageIndex
+from .layers import LayerIndex
 from .dicts import SyncDict
 
 class Images(SyncDict):
     AttributeName = 'image'
 
-    def __init__(self, config, client, default_timeout=None):
+    def __init__(self, config, client, default_timeout=None, store=None):
         self._client = client
         self.config = config
         self.default_timeout = default_timeout
+        self.layers = LayerIndex()
+        self.index = ImageIndex()
+        # optional imagedb.ImageDB, only read while building the inventory
+        self.store = store
         super(Images, self).__init__()
+        self.store = None
 
-    def instanciate(self, item):
-        return Image(self.config, self, self._client, item, self.default_timeout)
+    def instanciate(self, item, inspect=None):
+        image = Image(self.config, self, self._client, item, self.default_timeout, details=inspect)
+        self.layers.add(image.id, image.details)
+        self.index.add(image.id, image.details)
+        return image
+
+    def discarded(self, image):
+        self.layers.remove(image.id)
+        self.index.remove(image.id)
+        image.deleted()
+
+    def reindex(self, image):
+        """
+            Updates the indexes after image details changed
+        """
+        self.index.add(image.id, image.details)
+
+    def resolve(self, item):
+        return self.index.resolve(item)
+
+    def with_repository(self, repository):
+        return [dict.get(self, image_id) for image_id in self.index.by_repository(repository) if image_id in self]
+
+    def with_label(self, key, value=None):
+        return [dict.get(self, image_id) for image_id in self.index.by_label(key, value) if image_id in self]
 
     def inspect(self, *args, **kwds):
+        if self.store is not None:
+            try:
+                return self.store.inspect(*args)
+            except (KeyError, ValueError):
+                pass
         return self.client.inspect_image(*args, **kwds)
 
     def list_items(self):
+        if self.store is not None:
+            try:
+                return self.store.images()
+            except (IOError, OSError) as e:
+                self.logger.warning("failed to read the image store, falling back to the docker API, error: %r", e)
+                self.store = None
         return self.client.images(all=True)
 
+    def listed_inspect(self, item):
+        return item if self.store is not None else None
+
     def pop(self, image):
         image = super(Images, self).pop(image)
         if image is not None:
-            self.logger.info("image %s was removed", image)
+            self.logger.info("image %s was removed", image.ref)
+            self.layers.remove(image.id)
+            self.index.remove(image.id)
             image.deleted()
         return image
 
     def update_timers(self):
-        for image in six.itervalues(self):
+        with self.lock:
+            images = list(self.values())
+        for image in images:
             image.update_timer()
 
+    def reload_config(self):
+        """
+            Re-evaluates the pending removals after a configuration change
+        """
+        with self.lock:
+            images = list(self.values())
+        for image in images:
+            image.update_grace_time()
+
@@ -0,0 +1,132 @@
+import bisect
+import six
+import threading
+
+def normalize(name):
+    """
+        Returns the fully qualified name of an image reference, adding the implicit latest tag
+    """
+    if '@' in name:
+        return name
+    if ':' not in name.rsplit('/', 1)[-1]:
+        return name + ':latest'
+    return name
+
+def repository(name):
+    """
+        Returns the repository part of a tag or digest reference
+    """
+    if '@' in name:
+        return name.split('@', 1)[0]
+    head, _, tail = name.rpartition(':')
+    if head and '/' not in tail:
+        return head
+    return name
+
+def full_id(reference):
+    """
+        Returns the image id when reference is a full image id, with or without its sha256: prefix, None otherwise
+    """
+    hex_id = reference[len('sha256:'):] if reference.startswith('sha256:') else reference
+    if len(hex_id) != 64 or any(c not in '0123456789abcdef' for c in hex_id):
+        return None
+    return 'sha256:' + hex_id
+
+class ImageIndex(object):
+    """
+        Secondary indexes of images by name (tag or digest), repository, label and id prefix
+    """
+    def __init__(self):
+        # name -> image id
+        self.names = {}
+        # repository -> image ids
+        self.repositories = {}
+        # label key -> image ids, (label key, label value) -> image ids
+        self.labels = {}
+        # sorted hexadecimal ids, for prefix lookups
+        self.hex_ids = []
+        # image id -> indexed names, repositories and labels
+        self.entries = {}
+        self.lock = threading.RLock()
+
+    def __contains__(self, image_id):
+        return image_id in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def hex_id(self, image_id):
+        return image_id.split(':', 1)[-1]
+
+    def add(self, image_id, details):
+        names = [name for name in (details.get('RepoTags', None) or []) + (details.get('RepoDigests', None) or [])
+                 if not name.startswith('<none>')]
+        labels = (details.get('Config', None) or {}).get('Labels', None) or {}
+        with self.lock:
+            self.remove(image_id)
+            repositories = set(repository(name) for name in names)
+            label_keys = list(labels) + list(six.iteritems(labels))
+            self.entries[image_id] = (names, repositories, label_keys)
+            for name in names:
+                self.names[name] = image_id
+            for repo in repositories:
+                self.repositories.setdefault(repo, set()).add(image_id)
+            for key in label_keys:
+                self.labels.setdefault(key, set()).add(image_id)
+            bisect.insort(self.hex_ids, self.hex_id(image_id))
+
+    def discard(self, index, key, image_id):
+        ids = index.get(key, None)
+        if ids is not None:
+            ids.discard(image_id)
+            if not ids:
+                del index[key]
+
+    def remove(self, image_id):
+        with self.lock:
+            entry = self.entries.pop(image_id, None)
+            if entry is None:
+                return
+            names, repositories, label_keys = entry
+            for name in names:
+                # the name may have moved to another image
+                if self.names.get(name, None) == image_id:
+                    del self.names[name]
+            for repo in repositories:
+                self.discard(self.repositories, repo, image_id)
+            for key in label_keys:
+                self.discard(self.labels, key, image_id)
+            hex_id = self.hex_id(image_id)
+            i = bisect.bisect_left(self.hex_ids, hex_id)
+            if i < len(self.hex_ids) and self.hex_ids[i] == hex_id:
+                del self.hex_ids[i]
+
+    def resolve(self, name):
+        """
+            Returns the id of the image referenced by name (tag, digest, id or unambiguous id prefix),
+            None when unknown or ambiguous
+        """
+        with self.lock:
+            image_id = self.names.get(normalize(name), None)
+            if image_id is not None:
+                return image_id
+            prefix = self.hex_id(name)
+            if not prefix or any(c not in '0123456789abcdef' for c in prefix):
+                return None
+            i = bisect.bisect_left(self.hex_ids, prefix)
+            if i >= len(self.hex_ids) or not self.hex_ids[i].startswith(prefix):
+                return None
+            if i + 1 < len(self.hex_ids) and self.hex_ids[i + 1].startswith(prefix):
+                return None
+            for image_id in (self.hex_ids[i], 'sha256:' + self.hex_ids[i]):
+                if image_id in self.entries:
+                    return image_id
+            return None
+
+    def by_repository(self, repo):
+        with self.lock:
+            return set(self.repositories.get(repo, ()))
+
+    def by_label(self, key, value=None):
+        with self.lock:
+            return set(self.labels.get(key if value is None else (key, value), ()))
@@ -0,0 +1,154 @@
+import hashlib
+import threading
+
+def chain_ids(diff_ids):
+    """
+        Computes the docker chain ids of a stack of layer diff ids, bottom to top
+    """
+    chain = None
+    for diff_id in diff_ids:
+        if chain is None:
+            chain = diff_id
+        else:
+            chain = 'sha256:' + hashlib.sha256((chain + ' ' + diff_id).encode('ascii')).hexdigest()
+        yield chain
+
+class LayerIndex(object):
+    """
+        Tracks which images reference every layer, identified by its chain id,
+        to account the bytes actually freed by image removals.
+
+        Docker only reports the total size of images, the size of a layer stack is estimated as the size of
+        the smallest image using it. The estimation is exact when an image is built on top of the stack,
+        and a lower bound of the reclaimable size otherwise.
+
+        Unique sizes are cached per image, updates only invalidate the images whose layers are affected.
+    """
+    def __init__(self):
+        # chain id -> ids of images using the layer
+        self.refs = {}
+        # chain id -> chain id of the layer below
+        self.parents = {}
+        # image id -> chain ids, bottom to top
+        self.chains = {}
+        # image id -> image size
+        self.sizes = {}
+        # chain id -> estimated size of the layer stack
+        self.stack_sizes = {}
+        # image id -> size of the layers only used by this image
+        self.unique = {}
+        # chain id -> ids of images whose unique layers lay on top of it, and reverse mapping
+        self.splits = {}
+        self.split_of = {}
+        self.lock = threading.RLock()
+
+    def __contains__(self, image_id):
+        return image_id in self.chains
+
+    def __len__(self):
+        return len(self.refs)
+
+    def forget(self, image_id):
+        self.unique.pop(image_id, None)
+        split = self.split_of.pop(image_id, None)
+        if split is not None:
+            self.splits.get(split, set()).discard(image_id)
+
+    def invalidate(self, chain, refs):
+        self.stack_sizes.pop(chain, None)
+        # layer shared or unshared by 2 images
+        if len(refs) <= 2:
+            for image_id in refs:
+                self.forget(image_id)
+        # images accounting this layer stack as shared
+        for image_id in list(self.splits.pop(chain, ())):
+            self.forget(image_id)
+
+    def add(self, image_id, details):
+        layers = (details.get('RootFS', None) or {}).get('Layers', None) or []
+        with self.lock:
+            if image_id in self.chains:
+                self.remove(image_id)
+            chains = list(chain_ids(layers))
+            self.chains[image_id] = chains
+            self.sizes[image_id] = details.get('Size', None) or 0
+            parent = None
+            for chain in chains:
+                refs = self.refs.setdefault(chain, set())
+                refs.add(image_id)
+                self.parents[chain] = parent
+                parent = chain
+                self.invalidate(chain, refs)
+
+    def remove(self, image_id):
+        with self.lock:
+            chains = self.chains.pop(image_id, None)
+            if chains is None:
+                return
+            self.sizes.pop(image_id)
+            self.forget(image_id)
+            for chain in chains:
+                refs = self.refs[chain]
+                refs.discard(image_id)
+                self.invalidate(chain, refs)
+                if not refs:
+                    del self.refs[chain]
+                    del self.parents[chain]
+
+    def stack_size(self, chain):
+        if chain is None:
+            return 0
+        try:
+            return self.stack_sizes[chain]
+        except KeyError:
+            size = self.stack_sizes[chain] = min(self.sizes[image_id] for image_id in self.refs[chain])
+            return size
+
+    def unique_size(self, image_id):
+        """
+            Returns the number of bytes freed by the removal of image_id
+        """
+        try:
+            return self.unique[image_id]
+        except KeyError:
+            pass
+        with self.lock:
+            chains = self.chains.get(image_id, None)
+            if chains is None:
+                return 0
+            if not chains:
+                size = self.sizes[image_id]
+            else:
+                split = None
+                for chain in reversed(chains):
+                    if len(self.refs[chain]) > 1:
+                        split = chain
+                        break
+                size = max(0, self.stack_size(chains[-1]) - self.stack_size(split))
+                if split is not None:
+                    self.splits.setdefault(split, set()).add(image_id)
+                    self.split_of[image_id] = split
+            self.unique[image_id] = size
+            return size
+
+    def reclaimable_size(self, image_ids):
+        """
+            Returns the number of bytes freed by the removal of all image_ids together
+        """
+        ids = set(image_ids)
+        with self.lock:
+            owned = set()
+            total = 0
+            for image_id in ids:
+                chains = self.chains.get(image_id, None)
+                if chains is None:
+                    continue
+                if not chains:
+                    total += self.sizes[image_id]
+                for chain in reversed(chains):
+                    if chain in owned or not self.refs[chain] <= ids:
+                        break
+                    owned.add(chain)
+            for chain in owned:
+                total += self.stack_size(chain) - self.stack_size(self.parents[chain])
+            return total
@@ -0,0 +1,28 @@
+import importlib
+
+class LazyModule(object):
+    """
+        A module imported on first attribute access.
+        docker, and requests along with it, take most of caduc start up time, while commands
+        like --help or status never use them
+    """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, name):
+        module = self._load()
+        try:
+            return getattr(module, name)
+        except AttributeError:
+            # a submodule the package does not import by itself
+            return importlib.import_module('%s.%s' % (self._name, name))
+
+docker = LazyModule('docker')
+requests = LazyModule('requests')
+yaml = LazyModule('yaml')
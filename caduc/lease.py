@@ -0,0 +1,49 @@
+import threading
+import time
+
+class Leases(object):
+    """
+        Reservations keeping images for a time window, even when no container uses them.
+        Leases are only looked up when a removal is planned, they cost nothing when not used
+    """
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        # key -> lease expiry
+        self.expiries = {}
+        self.lock = threading.Lock()
+
+    def grant(self, key, seconds):
+        """
+            Reserves key for seconds from now, never shortening a longer lease.
+            Returns the lease expiry
+        """
+        expiry = self.clock() + seconds
+        with self.lock:
+            expiry = max(expiry, self.expiries.get(key, expiry))
+            self.expiries[key] = expiry
+        return expiry
+
+    def release(self, key):
+        with self.lock:
+            self.expiries.pop(key, None)
+
+    def remaining(self, key):
+        """
+            Returns the number of seconds before the lease of key expires, 0 when not leased
+        """
+        expiry = self.expiries.get(key, None)
+        if expiry is None:
+            return 0
+        remaining = expiry - self.clock()
+        if remaining <= 0:
+            with self.lock:
+                if self.expiries.get(key, None) == expiry:
+                    del self.expiries[key]
+            return 0
+        return remaining
+
+    def __contains__(self, key):
+        return self.remaining(key) > 0
+
+    def __len__(self):
+        return len(self.expiries)
@@ -0,0 +1,51 @@
+import itertools
+import logging
+import six
+
+def getLogger(obj):
+    """
+        Returns the logger of the subsystem obj belongs to, named after its module and class (caduc.image.Image),
+        so that levels and sampling can be set per subsystem
+    """
+    cls = obj if isinstance(obj, type) else type(obj)
+    return logging.getLogger('%s.%s' % (cls.__module__, cls.__name__))
+
+class SamplingFilter(logging.Filter):
+    """
+        Keeps one record out of `rate` for records of a subsystem below `level`.
+        Records are sampled before being formatted, so dropped records cost no formatting
+    """
+    def __init__(self, rates, level=logging.INFO):
+        super(SamplingFilter, self).__init__()
+        # longest prefixes first
+        self.rates = sorted(((name, int(rate)) for name, rate in six.iteritems(rates)), key=lambda item: -len(item[0]))
+        self.level = level
+        self.counters = dict((name, itertools.count()) for name, _ in self.rates)
+
+    def rate(self, name):
+        for prefix, rate in self.rates:
+            if name == prefix or name.startswith(prefix + '.'):
+                return prefix, rate
+        return None, 1
+
+    def filter(self, record):
+        if record.levelno >= self.level:
+            return True
+        prefix, rate = self.rate(record.name)
+        if rate <= 1:
+            return True
+        return next(self.counters[prefix]) % rate == 0
+
+def configure(config, logger=None):
+    """
+        Installs sampling of the subsystems listed in the logging.sampling configuration
+    """
+    rates = config.get('logging.sampling')
+    if not rates:
+        return None
+    sampler = SamplingFilter(rates)
+    if logger is None:
+        logger = logging.getLogger()
+    for handler in logger.handlers:
+        handler.addFilter(sampler)
+    return sampler
@@ -0,0 +1,92 @@
+import threading
+
+from six.moves import queue
+
+from . import log
+from .timer import Timer
+
+class Inline(object):
+    """
+        Runs blocking calls in the calling thread
+    """
+    def submit(self, func, args, callback):
+        callback(func(*args))
+
+class Loop(object):
+    """
+        Runs all inventory mutations on a single owner thread consuming a command queue:
+        docker events, timer expirations and results of blocking calls.
+        Blocking docker calls are run by a pool of worker threads, which post their results back
+        to the command queue, so that the inventory is never mutated concurrently
+    """
+    Stop = object()
+
+    def __init__(self, workers=4):
+        self.logger = log.getLogger(self)
+        self.commands = queue.Queue()
+        self.work = queue.Queue()
+        self.workers = workers
+        self.threads = []
+        self.owner = None
+
+    def call(self, func, *args):
+        """
+            Posts func(*args) to the owner thread
+        """
+        self.commands.put((func, args))
+
+    def submit(self, func, args, callback):
+        """
+            Runs func(*args) in a worker thread, then callback(result) in the owner thread
+        """
+        self.work.put((func, args, callback))
+
+    def timer(self, interval, function, args=(), kwargs=None):
+        """
+            A Timer posting function(*args) to the owner thread when expired
+        """
+        return Timer(interval, self.call, (function,) + tuple(args))
+
+    def work_loop(self):
+        while True:
+            item = self.work.get()
+            if item is self.Stop:
+                return
+            func, args, callback = item
+            try:
+                result = func(*args)
+            except Exception as e:
+                self.logger.error("blocking call %r failed, error: %r", func, e)
+                continue
+            self.call(callback, result)
+
+    def start_workers(self):
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self.work_loop)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def run(self):
+        """
+            Consumes commands in the calling thread, until stop() is called
+        """
+        self.owner = threading.current_thread()
+        self.start_workers()
+        while True:
+            item = self.commands.get()
+            if item is self.Stop:
+                break
+            func, args = item
+            try:
+                func(*args)
+            except Exception as e:
+                self.logger.error("command %r failed, error: %r", func, e)
+        for _ in self.threads:
+            self.work.put(self.Stop)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def stop(self):
+        self.commands.put(self.Stop)
@@ -0,0 +1,144 @@
+import collections
+import os
+import signal
+import sys
+import threading
+import time
+
+from . import log
+
+class Stats(object):
+    """
+        Thread safe counters and timings
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = collections.defaultdict(int)
+        # name -> [count, total, max]
+        self.timings = {}
+
+    def incr(self, name, count=1):
+        with self.lock:
+            self.counters[name] += count
+
+    def record(self, name, duration):
+        with self.lock:
+            try:
+                timing = self.timings[name]
+            except KeyError:
+                timing = self.timings[name] = [0, 0., 0.]
+            timing[0] += 1
+            timing[1] += duration
+            timing[2] = max(timing[2], duration)
+
+    def dump(self, out):
+        with self.lock:
+            counters = sorted(self.counters.items())
+            timings = sorted(self.timings.items(), key=lambda item: item[1][1], reverse=True)
+        out.write("# name\tcount\ttotal_ms\tavg_ms\tmax_ms\n")
+        for name, (count, total, longest) in timings:
+            out.write("%s\t%d\t%.1f\t%.3f\t%.1f\n" % (name, count, total * 1000, total * 1000 / count, longest * 1000))
+        for name, count in counters:
+            out.write("%s\t%d\n" % (name, count))
+
+class InstrumentedClient(object):
+    """
+        A docker client proxy timing every API call
+    """
+    def __init__(self, stats, client):
+        self._stats = stats
+        self._client = client
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+        stats = self._stats
+        key = 'api.%s' % name
+        def timed(*args, **kwds):
+            start = time.time()
+            try:
+                return attr(*args, **kwds)
+            finally:
+                stats.record(key, time.time() - start)
+        return timed
+
+class Instrumented(object):
+    """
+        Wraps a docker client factory, timing API calls of all created clients
+    """
+    def __init__(self, stats, client):
+        self._stats = stats
+        self._client = client
+
+    def __call__(self):
+        return InstrumentedClient(self._stats, self._client())
+
+class Sampler(object):
+    """
+        A sampling profiler, periodically recording the stacks of all threads.
+        Stacks are written in the collapsed format, suitable for flame graphs
+    """
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = collections.defaultdict(int)
+
+    def stack(self, frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append('%s:%s' % (os.path.basename(code.co_filename), code.co_name))
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def sample(self, duration):
+        me = threading.current_thread().ident
+        deadline = time.time() + duration
+        while time.time() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    self.stacks[self.stack(frame)] += 1
+            time.sleep(self.interval)
+
+    def write(self, out):
+        for stack, count in sorted(self.stacks.items(), key=lambda item: item[1], reverse=True):
+            out.write("%s %d\n" % (stack, count))
+
+class Profiler(object):
+    """
+        Dumps stats and a sampling profile of the process to a directory when receiving a signal
+    """
+    Sampler = Sampler
+
+    def __init__(self, stats, directory, duration=10):
+        self.logger = log.getLogger(self)
+        self.stats = stats
+        self.directory = directory
+        self.duration = duration
+        self.lock = threading.Lock()
+
+    def dump(self):
+        if not self.lock.acquire(False):
+            self.logger.info("a profile is already being recorded")
+            return None
+        try:
+            prefix = os.path.join(self.directory, 'caduc-%d-%d' % (os.getpid(), time.time()))
+            with open(prefix + '.stats', 'w') as f:
+                self.stats.dump(f)
+            sampler = self.Sampler()
+            self.logger.info("sampling stacks for %s s", self.duration)
+            sampler.sample(self.duration)
+            with open(prefix + '.stacks', 'w') as f:
+                sampler.write(f)
+            self.logger.info("profile written to %s.*", prefix)
+            return prefix
+        finally:
+            self.lock.release()
+
+    def on_signal(self, sig, frame):
+        thread = threading.Thread(target=self.dump)
+        thread.daemon = True
+        thread.start()
+
+    def install(self, sig=signal.SIGUSR1):
+        signal.signal(sig, self.on_signal)
@@ -0,0 +1,158 @@
+import calendar
+import datetime
+import threading
+
+from . import log
+from .lazy import requests
+from .timer import Timer
+
+def created_timestamp(created):
+    """
+        Returns the unix timestamp of an image creation date as reported by docker, None when it can't be parsed
+    """
+    try:
+        return calendar.timegm(datetime.datetime.strptime(created[:19], '%Y-%m-%dT%H:%M:%S').timetuple())
+    except (TypeError, ValueError):
+        return None
+
+def dangling(image):
+    return not [tag for tag in image.details.get('RepoTags', None) or [] if tag != '<none>:<none>']
+
+class Pruner(object):
+    """
+        Removes batches of expired dangling images with a single prune call to the daemon.
+
+        A prune removes every unused dangling image created before a date, it is only requested when
+        all the images it may remove are expired according to the inventory.
+        Images the prune did not remove go through the usual removal.
+    """
+    Timer = Timer
+
+    def __init__(self, delay=5, min_batch=10, label=None):
+        self.logger = log.getLogger(self)
+        self.enabled = False
+        self.delay = delay
+        self.min_batch = min_batch
+        self.label = label
+        self.pending = {}
+        self.timer = None
+        self.lock = threading.Lock()
+
+    def configure(self, config):
+        prune = config.get('removals.prune')
+        self.enabled = bool(prune)
+        if not isinstance(prune, dict):
+            prune = {}
+        self.delay = float(prune.get('delay', 5))
+        self.min_batch = int(prune.get('min_batch', 10))
+        self.label = prune.get('label', None)
+        if not self.enabled:
+            self.flush()
+
+    def matches_label(self, image):
+        if not self.label:
+            return True
+        labels = (image.details.get('Config', None) or {}).get('Labels', None) or {}
+        key, sep, value = self.label.partition('=')
+        return key in labels and (not sep or labels[key] == value)
+
+    def accepts(self, image):
+        return self.enabled and dangling(image) and self.matches_label(image) and not image.in_use() and image.id not in image.Leases
+
+    def add(self, image):
+        with self.lock:
+            self.pending[image.id] = image
+            if self.timer is not None:
+                return
+            self.timer = timer = self.Timer(self.delay, self.flush)
+        self.logger.debug("%s waits for a prune batch", image.ref)
+        timer.start()
+
+    def discard(self, image):
+        with self.lock:
+            self.pending.pop(image.id, None)
+
+    def __contains__(self, image):
+        return image.id in self.pending
+
+    def __len__(self):
+        return len(self.pending)
+
+    def filters(self, batch):
+        """
+            Returns the prune filters removing the batch, None when the prune could remove other images
+        """
+        created = [created_timestamp(image.details.get('Created', None)) for image in batch]
+        if None in created:
+            return None
+        until = max(created) + 1
+        ids = set(image.id for image in batch)
+        images = batch[0].images
+        with images.lock:
+            candidates = list(images.values())
+        for image in candidates:
+            if image.id in ids or image.children or image.in_use() or not dangling(image) or not self.matches_label(image):
+                continue
+            timestamp = created_timestamp(image.details.get('Created', None))
+            if timestamp is None or timestamp < until:
+                self.logger.debug("not pruning, %s would be removed before its time", image.ref)
+                return None
+        filters = {'dangling': True, 'until': str(until)}
+        if self.label:
+            filters['label'] = self.label
+        return filters
+
+    def flush(self):
+        with self.lock:
+            batch = list(self.pending.values())
+            self.pending = {}
+            self.timer = None
+        batch = [image for image in batch if not image.in_use()]
+        # images leased meanwhile are planned again by their own removal
+        leased = [image for image in batch if image.id in image.Leases]
+        if leased:
+            batch = [image for image in batch if image.id not in image.Leases]
+            self.fallback(leased)
+        if not batch:
+            return
+        filters = self.filters(batch) if self.enabled and len(batch) >= self.min_batch else None
+        if filters is None:
+            self.fallback(batch)
+            return
+        self.logger.info("pruning %d expired dangling images", len(batch))
+        batch[0].Executor.submit(self.prune, (batch, filters), lambda result: self.pruned(batch, result))
+
+    def prune(self, batch, filters):
+        """
+            Blocking part of flush, returns (response, error)
+        """
+        first = batch[0]
+        first.RmLimiter.acquire(sum(image.details.get('Size', None) or 0 for image in batch))
+        try:
+            with first.RmSemaphore:
+                return first.client.prune_images(filters=filters), None
+        except (AttributeError, requests.exceptions.RequestException) as e:
+            return None, e
+
+    def pruned(self, batch, result):
+        response, error = result
+        if error is not None:
+            self.logger.warning("failed to prune images, removing them one by one, error: %r", error)
+            self.fallback(batch)
+            return
+        deleted = set(entry['Deleted'] for entry in (response or {}).get('ImagesDeleted', None) or [] if entry.get('Deleted', None))
+        self.logger.info("pruned %d images, reclaiming %s bytes", len(deleted), (response or {}).get('SpaceReclaimed', None))
+        images = batch[0].images
+        remaining = []
+        for image in batch:
+            if image.id in deleted:
+                image.audit_rm([], False)
+            else:
+                remaining.append(image)
+        for image_id in deleted:
+            images.forget(image_id)
+        self.fallback(remaining)
+
+    def fallback(self, batch):
+        for image in batch:
+            image.rm(prune=False)
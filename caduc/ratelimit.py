@@ -0,0 +1,68 @@
+import threading
+import time
+
+from . import log
+
+class TokenBucket(object):
+    """
+        A blocking token bucket refilled at `rate` tokens per second, holding at most `burst` tokens.
+        Consumers going over the budget wait, one after the other, for the bucket to refill,
+        so that bursts of requests are spread over time instead of being issued at once.
+    """
+    def __init__(self, rate, burst=None, clock=time.time, sleep=time.sleep):
+        self.rate = float(rate)
+        self.burst = float(burst if burst else max(1, rate))
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = self.burst
+        self.last = self.clock()
+        # waiters are serialized so that the bucket is drained in turn
+        self.lock = threading.Lock()
+
+    def refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def consume(self, tokens=1):
+        """
+            Takes tokens from the bucket, waiting for the debt to be paid back when needed.
+            Returns the time waited
+        """
+        with self.lock:
+            self.refill()
+            self.tokens -= tokens
+            wait = 0
+            if self.tokens < 0:
+                wait = -self.tokens / self.rate
+                self.sleep(wait)
+            return wait
+
+class RateLimiter(object):
+    """
+        Limits the number of operations per second and, optionally, the number of bytes per second
+        they reclaim. A limiter without any rate never waits.
+    """
+    def __init__(self, rate=None, bytes_rate=None, clock=time.time, sleep=time.sleep):
+        self.logger = log.getLogger(self)
+        self.buckets = []
+        if rate:
+            self.buckets.append((TokenBucket(float(rate), clock=clock, sleep=sleep), False))
+        if bytes_rate:
+            self.buckets.append((TokenBucket(float(bytes_rate), clock=clock, sleep=sleep), True))
+
+    def __bool__(self):
+        return bool(self.buckets)
+    __nonzero__ = __bool__
+
+    def acquire(self, size=0):
+        waited = 0
+        for bucket, weighted in self.buckets:
+            waited += bucket.consume(size if weighted else 1)
+        if waited:
+            self.logger.debug("waited %.2f s for removal budget", waited)
+        return waited
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get('removals.rate'), config.get('removals.bytes_rate'))
@@ -0,0 +1,64 @@
+import os
+import signal
+import threading
+import time
+
+from . import log
+
+class ConfigReloader(object):
+    """
+        Reloads the configuration on SIGHUP or when its file changes,
+        and notifies listeners so that they take the new configuration into account
+    """
+    def __init__(self, config, listeners=()):
+        self.logger = log.getLogger(self)
+        self.config = config
+        self.listeners = list(listeners)
+        self.lock = threading.Lock()
+        self.mtime = self.get_mtime()
+
+    def get_mtime(self):
+        try:
+            return os.stat(self.config.path).st_mtime
+        except OSError:
+            return None
+
+    def reload(self):
+        with self.lock:
+            self.logger.info("reloading configuration from %s", self.config.path)
+            try:
+                self.config.reload()
+            except Exception as e:
+                self.logger.error("Failed to reload configuration, keeping the current one, error: %r", e)
+                return False
+            for listener in self.listeners:
+                listener()
+            return True
+
+    def check(self):
+        """
+            Reloads the configuration when its file was modified since the last check
+        """
+        mtime = self.get_mtime()
+        if mtime == self.mtime:
+            return False
+        self.mtime = mtime
+        return self.reload()
+
+    def poll(self, interval):
+        while True:
+            time.sleep(interval)
+            self.check()
+
+    def watch_file(self, interval):
+        thread = threading.Thread(target=self.poll, args=(interval, ))
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def on_signal(self, sig, frame):
+        # don't reload from the signal handler, it interrupts the main thread in the middle of anything
+        threading.Thread(target=self.reload).start()
+
+    def install(self, sig=signal.SIGHUP):
+        signal.signal(sig, self.on_signal)
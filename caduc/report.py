@@ -0,0 +1,59 @@
+import logging
+import six
+import sys
+
+logger = logging.getLogger(__name__)
+
+def removal_delays(images):
+    """
+        Computes, for every tracked image, the delay in seconds before its removal, assuming timers start now.
+        An image is removed once its grace time elapsed after its last child removal,
+        images running containers are never removed.
+    """
+    delays = {}
+    def delay(image):
+        try:
+            return delays[image.id]
+        except KeyError:
+            pass
+        if image:
+            result = float('inf')
+        else:
+            result = 0
+            for child_id in image.children:
+                child = dict.get(images, child_id, None)
+                if child is None:
+                    logger.debug("%s child %s is not tracked", image, child_id)
+                    continue
+                result = max(result, delay(child))
+            seconds, _ = image.get_grace_time()
+            if seconds < 0:
+                seconds = float('inf')
+            result += seconds
+        delays[image.id] = result
+        return result
+    for image in six.itervalues(images):
+        delay(image)
+    return delays
+
+def report(images, horizon, out=sys.stdout):
+    """
+        Writes the images eligible for removal within horizon seconds, and the space their removal frees.
+        Returns the ids of eligible images
+    """
+    delays = removal_delays(images)
+    eligible = sorted((delay, image_id) for image_id, delay in six.iteritems(delays) if delay <= horizon)
+    for delay, image_id in eligible:
+        image = dict.get(images, image_id)
+        out.write("%s\t%ds\t%d\t%d\t%s\n" % (
+            image_id,
+            delay,
+            image.details.get('Size', None) or 0,
+            images.layers.unique_size(image_id),
+            ','.join(image.details.get('RepoTags', None) or []),
+        ))
+    ids = [image_id for _, image_id in eligible]
+    out.write("%d images eligible for removal within %ds, %d bytes reclaimable\n" % (
+        len(ids), horizon, images.layers.reclaimable_size(ids),
+    ))
+    return ids
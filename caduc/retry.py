@@ -0,0 +1,103 @@
+import random
+import threading
+
+from . import log
+from .lazy import docker
+from .timer import Timer
+
+class RetryQueue(object):
+    """
+        Schedules retries of failed docker operations with a per-key exponential backoff.
+        Errors are classified so that:
+            - missing objects are never retried
+            - transient daemon errors (5xx, connection errors) are quickly retried
+            - conflicts (object still in use) are retried slowly, a few times, and then given up
+    """
+    Timer = Timer
+
+    NotFound = 'not_found'
+    Conflict = 'conflict'
+    Transient = 'transient'
+
+    def __init__(self, base_delay=1, max_delay=300, max_attempts=8,
+            conflict_base_delay=60, conflict_max_attempts=3, jitter=0.1):
+        self.logger = log.getLogger(self)
+        self.policies = {
+            self.Transient: (base_delay, max_attempts),
+            self.Conflict: (conflict_base_delay, conflict_max_attempts),
+        }
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.attempts = {}
+        self.timers = {}
+        self.lock = threading.Lock()
+
+    def classify(self, error):
+        if isinstance(error, docker.errors.NotFound):
+            return self.NotFound
+        status = getattr(error, 'status_code', None)
+        if status == 404:
+            return self.NotFound
+        if status == 409:
+            return self.Conflict
+        return self.Transient
+
+    def delay(self, kind, attempt):
+        base_delay, _ = self.policies[kind]
+        delay = min(self.max_delay, base_delay * 2 ** (attempt - 1))
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def retry(self, key, callback, error):
+        """
+            Plans callback to be called again after a failure with error.
+            Returns the planned delay, None when the operation must not be retried
+        """
+        kind = self.classify(error)
+        if kind == self.NotFound:
+            self.reset(key)
+            return None
+        _, max_attempts = self.policies[kind]
+        with self.lock:
+            attempt = self.attempts.get(key, 0) + 1
+            if attempt > max_attempts:
+                self.logger.warning("giving up %s after %d attempts, last error (%s): %s", key, attempt - 1, kind, error)
+                self.attempts.pop(key, None)
+                return None
+            self.attempts[key] = attempt
+            delay = self.delay(kind, attempt)
+            timer = self.Timer(delay, self.fire, (key, callback))
+            previous = self.timers.get(key, None)
+            self.timers[key] = timer
+        if previous is not None:
+            previous.cancel()
+        self.logger.info("retrying %s in %.1f s (attempt %d/%d) after %s error: %s", key, delay, attempt, max_attempts, kind, error)
+        timer.start()
+        return delay
+
+    def fire(self, key, callback):
+        with self.lock:
+            self.timers.pop(key, None)
+        callback()
+
+    def cancel(self, key):
+        """
+            Cancels the pending retry of key, keeping track of previous attempts
+        """
+        with self.lock:
+            timer = self.timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+    def reset(self, key):
+        """
+            Cancels the pending retry of key and forgets about previous attempts
+        """
+        self.cancel(key)
+        with self.lock:
+            self.attempts.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self.timers
+
+    def __len__(self):
+        return len(self.timers)
@@ -0,0 +1,208 @@
+import json
+import os
+import six
+import time
+
+from . import log
+from .loop import Loop
+from .prune import created_timestamp
+
+class Unscheduled(object):
+    """
+        A timer never firing, a sweep plans removals by itself and does not retry them
+    """
+    def __init__(self, *args, **kwds):
+        pass
+
+    def start(self):
+        pass
+
+    def cancel(self):
+        pass
+
+class Sweep(object):
+    """
+        Removes, in a single pass, the unused images whose grace time elapsed since they were last used.
+        An image is last used when it was created or tagged, when a previous sweep saw it in use,
+        or when one of its child images was last used.
+        Removals go through Image.rm, children first, their blocking docker calls running in a bounded
+        number of worker threads
+    """
+    def __init__(self, workers=4, clock=time.time, state_path=None):
+        self.logger = log.getLogger(self)
+        self.loop = Loop(workers)
+        self.clock = clock
+        # removals started and not completed yet, only updated from the loop thread
+        self.outstanding = 0
+        # file recording when sweeps last saw images in use, image id -> timestamp
+        self.state_path = state_path
+        self.seen_in_use = {}
+
+    def install(self, image_class):
+        """
+            Routes the removals of images through the sweep, disabling their timers
+        """
+        image_class.Executor = self
+        image_class.Timer = Unscheduled
+        image_class.Retries.Timer = Unscheduled
+        image_class.Deferred.Timer = Unscheduled
+        return self
+
+    def load_state(self):
+        """
+            Returns when previous sweeps last saw images in use, nothing is known before the first sweep
+        """
+        if self.state_path is None or not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+            return dict((image_id, float(timestamp)) for image_id, timestamp in six.iteritems(state['in_use']))
+        except (IOError, OSError, ValueError, TypeError, KeyError, AttributeError) as e:
+            self.logger.warning("failed to read the sweep state from %s, error: %r", self.state_path, e)
+            return {}
+
+    def save_state(self, images):
+        """
+            Records when images still present were last seen in use
+        """
+        if self.state_path is None:
+            return
+        in_use = dict((image_id, timestamp) for image_id, timestamp in six.iteritems(self.seen_in_use)
+                      if dict.__contains__(images, image_id) and image_id not in images.missing)
+        tmp = self.state_path + '.tmp'
+        try:
+            directory = os.path.dirname(self.state_path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            with open(tmp, 'w') as f:
+                json.dump({'time': self.clock(), 'in_use': in_use}, f)
+            os.rename(tmp, self.state_path)
+        except (IOError, OSError) as e:
+            self.logger.warning("failed to write the sweep state to %s, error: %r", self.state_path, e)
+
+    def last_used(self, image):
+        details = image.details
+        timestamps = [created_timestamp(details.get('Created', None)),
+                      created_timestamp((details.get('Metadata', None) or {}).get('LastTagTime', None)),
+                      self.seen_in_use.get(image.id, None)]
+        timestamps = [timestamp for timestamp in timestamps if timestamp is not None]
+        return max(timestamps) if timestamps else None
+
+    def evaluate(self, images):
+        """
+            Returns the overdue images and the number of images in use
+        """
+        now = self.clock()
+        last_used = {}
+        def subtree_last_used(image):
+            try:
+                return last_used[image.id]
+            except KeyError:
+                pass
+            if image:
+                result = float('inf')
+            else:
+                result = self.last_used(image)
+                if result is None:
+                    result = now
+                for child_id in image.children:
+                    child = dict.get(images, child_id, None)
+                    if child is not None:
+                        result = max(result, subtree_last_used(child))
+            last_used[image.id] = result
+            return result
+        with images.lock:
+            tracked = list(images.values())
+        overdue = []
+        used = 0
+        for image in tracked:
+            last = subtree_last_used(image)
+            if last == float('inf'):
+                self.seen_in_use[image.id] = now
+                used += 1
+                continue
+            seconds, _ = image.get_grace_time()
+            if seconds < 0 or seconds == float('inf'):
+                continue
+            if now - last >= seconds:
+                overdue.append(image)
+        return overdue, used
+
+    def removed(self, images, image):
+        return not dict.__contains__(images, image.id) or image.id in images.missing
+
+    def start(self, image):
+        try:
+            image.rm(prune=False)
+        except Exception as e:
+            self.logger.error("failed to remove %s, error: %r", image.ref, e)
+        finally:
+            self.finish()
+
+    def submit(self, func, args, callback):
+        def call():
+            try:
+                return func(*args), None
+            except Exception as e:
+                return None, e
+        self.outstanding += 1
+        self.loop.submit(call, (), lambda result: self.complete(callback, result))
+
+    def complete(self, callback, result):
+        result, error = result
+        try:
+            if error is not None:
+                self.logger.error("blocking call failed, error: %r", error)
+            else:
+                callback(result)
+        finally:
+            self.finish()
+
+    def finish(self):
+        self.outstanding -= 1
+        if not self.outstanding:
+            self.loop.stop()
+
+    def remove(self, batch):
+        """
+            Removes batch, returns once all removals are completed
+        """
+        self.outstanding = len(batch)
+        for image in batch:
+            self.loop.call(self.start, image)
+        self.loop.run()
+
+    def run(self, images):
+        """
+            Removes the overdue images, returns a summary of the sweep
+        """
+        started = self.clock()
+        self.seen_in_use = self.load_state()
+        overdue, used = self.evaluate(images)
+        summary = dict(removed=[], failed=[], deferred=[], reclaimed=0, kept=len(images) - used - len(overdue), used=used)
+        candidates = dict((image.id, image) for image in overdue)
+        while True:
+            # parents are removed once all their children are
+            batch = [image for image in candidates.values() if not image.children]
+            if not batch:
+                break
+            sizes = dict((image.id, image.reclaimable_size()) for image in batch)
+            self.logger.info("removing %d overdue images", len(batch))
+            self.remove(batch)
+            for image in batch:
+                del candidates[image.id]
+                if self.removed(images, image):
+                    summary['removed'].append(image.id)
+                    summary['reclaimed'] += sizes[image.id]
+                    # spare waiting for the deletion event, updating the parent of the image
+                    images.forget(image.id)
+                elif image in image.Deferred:
+                    summary['deferred'].append(image.id)
+                else:
+                    summary['failed'].append(image.id)
+        # images kept by a child that is not overdue or could not be removed
+        summary['kept'] += len(candidates)
+        self.save_state(images)
+        summary['seconds'] = self.clock() - started
+        return summary
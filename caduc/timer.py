@@ -1,14 +1,21 @@
-import logging
+import math
 import signal
 import threading
+import time
+
+from . import log
 
 class Timer(object):
     Timers = []
+    # optional profiling.Stats counting timer operations
+    Stats = None
 
     def __init__(self, *args, **kwds):
-        self.logger = logging.getLogger(str(self.__class__.__name__))
+        self.logger = log.getLogger(self)
         self.__class__.Timers.append(self)
         self.timer = threading.Timer(*args, **kwds)
+        if self.Stats is not None:
+            self.Stats.incr('timer.scheduled')
 
     def __getattr__(self, name):
         try:
@@ -22,6 +29,8 @@ class Timer(object):
     def cancel(self):
         if self.timer:
             self.timer.cancel()
+            if self.Stats is not None:
+                self.Stats.incr('timer.cancelled')
         self.timer = None
 
     @classmethod
@@ -29,8 +38,92 @@ class Timer(object):
         for timer in cls.Timers:
             timer.cancel()
 
+class SlackTimer(object):
+    """
+        A timer firing together with the other timers of its slack window
+    """
+    def __init__(self, timers, interval, function, args=(), kwargs=None):
+        self.timers = timers
+        self.interval = interval
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.deadline = None
+
+    def start(self):
+        self.timers.schedule(self)
+
+    def cancel(self):
+        self.timers.unschedule(self)
+
+class SlackTimers(object):
+    """
+        Creates timers whose expiration is delayed up to the end of their slack window,
+        so that the timers expiring in the same window fire in a single batch, from a single thread.
+        Callbacks run one after the other and must not block, e.g. posting to a loop.Loop
+    """
+    def __init__(self, slack, timer=Timer, clock=time.time):
+        self.logger = log.getLogger(self)
+        self.slack = slack
+        self.Timer = timer
+        self.clock = clock
+        # deadline -> [timer, slack timers]
+        self.batches = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, interval, function, args=(), kwargs=None):
+        return SlackTimer(self, interval, function, args, kwargs)
+
+    def schedule(self, handle):
+        now = self.clock()
+        expiry = now + handle.interval
+        deadline = math.ceil(expiry / self.slack) * self.slack
+        timer = None
+        with self.lock:
+            batch = self.batches.get(deadline, None)
+            if batch is None:
+                timer = self.Timer(deadline - now, self.fire, (deadline,))
+                batch = self.batches[deadline] = [timer, []]
+            handle.deadline = deadline
+            batch[1].append((expiry, handle))
+        if timer is not None:
+            timer.start()
+
+    def unschedule(self, handle):
+        timer = None
+        with self.lock:
+            batch = self.batches.get(handle.deadline, None)
+            if batch is None:
+                return
+            batch[1] = [(expiry, other) for expiry, other in batch[1] if other is not handle]
+            if not batch[1]:
+                del self.batches[handle.deadline]
+                timer = batch[0]
+        if timer is not None:
+            timer.cancel()
+
+    def fire(self, deadline):
+        with self.lock:
+            batch = self.batches.pop(deadline, None)
+        if batch is None:
+            return
+        handles = [handle for _, handle in sorted(batch[1], key=lambda item: item[0])]
+        self.logger.debug("%d timers expired", len(handles))
+        for handle in handles:
+            try:
+                handle.function(*handle.args, **handle.kwargs)
+            except Exception as e:
+                self.logger.error("timer callback %r failed, error: %r", handle.function, e)
+
 def abort(sig, bt):
     Timer.CancelAll()
     orig(sig, bt)
-orig = signal.signal(signal.SIGINT, abort)
+orig = None
+
+def install_abort(sig=signal.SIGINT):
+    """
+        Cancels all timers on SIGINT before running the previous handler, so that their threads don't keep caduc alive
+    """
+    global orig
+    orig = signal.signal(sig, abort)
 
@@ -1,24 +1,74 @@
-import docker
-import logging
+import itertools
+import time
+
+from . import log
+from .container import Container
+from .index import full_id
+from .lazy import docker
 
 class Watcher(object):
+    # docker event actions per object type, subscribed to when the watcher has a handler of the same name
+    Actions = {
+        'image': ['delete', 'import', 'load', 'pull', 'push', 'save', 'tag', 'untag'],
+        'container': ['attach', 'commit', 'copy', 'create', 'destroy', 'detach', 'die', 'export',
+                      'health_status', 'kill', 'oom', 'pause', 'rename', 'resize', 'restart',
+                      'start', 'stop', 'top', 'unpause', 'update'],
+    }
+
+    # inspection result of an item removed before its event is handled
+    Gone = object()
 
     @property
     def client(self):
         return self._client()
 
-    def __init__(self, client, images, containers):
-        self.logger = logging.getLogger(str(self.__class__))
+    def __init__(self, client, images, containers, stats=None, events=None):
+        self.logger = log.getLogger(self)
         self._client = client
         self.images = images
         self.containers = containers
+        self.stats = stats
+        # events subscribed to before building the inventory, see events.EventBuffer
+        self.events = events
+        # sequence numbers of the events received and handled, and the events inspected ahead of their turn
+        self.received = itertools.count()
+        self.handled = 0
+        self.ready = {}
+
+    def attributes(self, event):
+        return (event.get('Actor', None) or {}).get('Attributes', None) or {}
 
-    def tag(self, event):
-        self.images[event['id']].refresh()
+    def avoided(self, call):
+        if self.stats is not None:
+            self.stats.incr('avoided.%s' % call)
+
+    def tag(self, event, inspect=None):
+        if inspect is self.Gone:
+            self.logger.debug("%s was deleted before handling event", event['id'])
+            return
+        name = self.attributes(event).get('name', None)
+        known = event['id'] in self.images
+        previous = self.images.resolve(name) if name else None
+        # an image may be pulled again after being removed, add() forgets about its removal
+        image = self.images.add(event['id'], None if known else inspect)
+        if not known:
+            # freshly inspected, the new tag is already known
+            self.avoided('inspect_image')
+        elif name:
+            image.add_tag(name)
+            self.avoided('inspect_image')
+        else:
+            image.refresh(inspect)
+        if previous is not None and previous != image.id and previous in self.images:
+            # the name moved from another image
+            self.images[previous].remove_tag(name)
     
-    def untag(self, event):
+    def untag(self, event, inspect=None):
+        if inspect is self.Gone:
+            self.images.pop(event['id'])
+            return
         try:
-            self.images[event['id']].refresh()
+            self.images[event['id']].refresh(inspect)
         except KeyError:
             self.logger.debug("%s was deleted before handling event", event['id'])
         except docker.errors.NotFound:
@@ -31,34 +81,125 @@ class Watcher(object):
         self.logger.debug("would re-load image list for event %r", event)
 
     def delete(self, event):
-        try:
-            self.images.pop(event['id'])
-        except KeyError:
+        if self.images.forget(event['id']) is None:
             # we are not responsible of receiving an event twice, just to be resilient to it
             self.logger.debug("Failed to destroy image %s, it was expected to be already deleted", event['id'])
 
-    def create(self, event):
+    def container_details(self, event):
+        """
+            Returns the container details carried by a container event, None when they are incomplete
+        """
+        attributes = self.attributes(event)
+        image = attributes.get('image', None) or event.get('from', None)
+        # a name may have moved to another image since it was indexed, e.g. by a pull
+        image_id = full_id(image) if image else None
+        if image_id is None:
+            return None
+        name = attributes.get('name', None)
+        details = dict(Id=event['id'], Name='/' + name if name else None, Image=image_id)
+        # container labels are part of the event attributes
+        lease = attributes.get(Container.LeaseLabel, None)
+        if lease:
+            details['Config'] = {'Labels': {Container.LeaseLabel: lease}}
+        return details
+
+    def create(self, event, inspect=None):
         if event['Type']=='container':
-            self.containers.add(event['id'])
+            if inspect is self.Gone:
+                self.logger.debug("%s was destroyed before handling event", event['id'])
+                return
+            details = self.container_details(event)
+            if details is not None:
+                self.avoided('inspect_container')
+            self.containers.add(event['id'], details or inspect)
 
     def destroy(self, event):
-        try:
-            self.containers.pop(event['id'])
-        except KeyError:
-            self.logger.error("Failed to destroy container %s, it was expected to be already deleted", event['id'])
+        if self.containers.forget(event['id']) is None:
+            # events received while building the inventory may refer to containers already gone
+            self.logger.debug("Failed to destroy container %s, it was expected to be already deleted", event['id'])
+
+    @classmethod
+    def filters(cls):
+        """
+            Returns the docker events filters matching the handled events only
+        """
+        types = set()
+        actions = set()
+        for type, names in cls.Actions.items():
+            handled = [name for name in names if callable(getattr(cls, name, None))]
+            if handled:
+                types.add(type)
+                actions.update(handled)
+        return {'type': sorted(types), 'event': sorted(actions)}
+
+    def subscribe(self):
+        filters = self.filters()
+        self.logger.debug("subscribing to %r events", filters)
+        return self.client.events(decode=True, filters=filters)
 
     def __noop(self, event):
         self.logger.debug("no op %r", event)
  
-    def handle(self, event):
+    def inspect(self, event):
+        """
+            Returns the docker inspection the handling of event needs, None when it needs none or can't be made ahead.
+            Called from a worker thread, never raises
+        """
+        action = event.get('Action', None)
+        try:
+            if action == 'tag':
+                if event['id'] in self.images and self.attributes(event).get('name', None):
+                    return None
+                return self.client.inspect_image(event['id'])
+            if action == 'untag':
+                return self.client.inspect_image(event['id']) if event['id'] in self.images else None
+            if action == 'create' and event.get('Type', None) == 'container' and self.container_details(event) is None:
+                return self.client.inspect_container(event['id'])
+        except docker.errors.NotFound:
+            return self.Gone
+        except Exception as e:
+            # the handler inspects again
+            self.logger.debug("failed to inspect ahead for event %r, error: %r", event, e)
+        return None
+
+    def handle_in_order(self, seq, event, inspect):
+        """
+            Handles the events inspected ahead in the order they were received
+        """
+        self.ready[seq] = (event, inspect)
+        while self.handled in self.ready:
+            event, inspect = self.ready.pop(self.handled)
+            self.handled += 1
+            self.handle(event, inspect)
+
+    def handle(self, event, inspect=None):
         self.logger.debug("received docker event %r", event)
+        if self.stats is not None:
+            start = time.time()
         try:
-            getattr(self, event['Action'], self.__noop)(event)
+            handler = getattr(self, event['Action'], self.__noop)
+            if inspect is None:
+                handler(event)
+            else:
+                handler(event, inspect)
         except Exception as e:
-            self.logger.error("Failed to handle event %r, error: %r" % (event, e))
+            self.logger.error("Failed to handle event %r, error: %r", event, e)
+        if self.stats is not None:
+            self.stats.record('handle.%s' % event['Action'], time.time() - start)
 
-    def watch(self):
+    def watch(self, dispatch=None, submit=None):
+        """
+            Handles docker events, or hands them to dispatch(handle, event) when given.
+            With submit(func, args, callback), see loop.Loop.submit, the inspections events need are made
+            by submit and events are handled by its callbacks, in the order they were received
+        """
         self.logger.debug("start watching docker events")
-        for event in self.client.events(decode=True):
-            self.handle(event)
+        for event in self.subscribe() if self.events is None else self.events:
+            if submit is not None:
+                seq = next(self.received)
+                submit(self.inspect, (event, ), lambda inspect, seq=seq, event=event: self.handle_in_order(seq, event, inspect))
+            elif dispatch is None:
+                self.handle(event)
+            else:
+                dispatch(self.handle, event)
 
@@ -0,0 +1,161 @@
+import datetime
+import os
+import threading
+import time
+
+from . import log
+from .timer import Timer
+
+class Window(object):
+    """
+        A daily time window, from HH:MM to HH:MM local time, possibly spanning midnight
+    """
+    Cache = {}
+
+    def __init__(self, spec):
+        try:
+            start, end = spec.split('-')
+            self.start = self.parse_time(start)
+            self.end = self.parse_time(end)
+        except (AttributeError, ValueError):
+            raise ValueError("Failed to decode <HH:MM>-<HH:MM> window in %r" % spec)
+        self.spec = spec
+
+    @classmethod
+    def parse(cls, spec):
+        try:
+            return cls.Cache[spec]
+        except KeyError:
+            window = cls.Cache[spec] = cls(spec)
+            return window
+
+    def parse_time(self, txt):
+        hours, minutes = txt.strip().split(':')
+        delta = datetime.timedelta(hours=int(hours), minutes=int(minutes))
+        if not 0 <= int(minutes) < 60 or not datetime.timedelta(0) <= delta <= datetime.timedelta(days=1):
+            raise ValueError(txt)
+        return delta
+
+    def time_of_day(self, now):
+        return now - now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def __contains__(self, now):
+        t = self.time_of_day(now)
+        if self.start <= self.end:
+            return self.start <= t < self.end
+        return t >= self.start or t < self.end
+
+    def delay(self, now):
+        """
+            Returns the number of seconds before the window opens, 0 when already open
+        """
+        if now in self:
+            return 0
+        delay = self.start - self.time_of_day(now)
+        if delay < datetime.timedelta(0):
+            delay += datetime.timedelta(days=1)
+        return delay.total_seconds()
+
+    def __str__(self):
+        return 'Window<%s>' % self.spec
+
+def disk_usage(path):
+    """
+        Returns the used fraction of the filesystem holding path, in percent
+    """
+    st = os.statvfs(path)
+    if not st.f_blocks:
+        return 0
+    return 100. * (st.f_blocks - st.f_bavail) / st.f_blocks
+
+class DeferredRemovals(object):
+    """
+        Holds images expired outside of their removal window.
+        At the opening of the earliest window, images are removed by decreasing reclaimable size,
+        to maximize the space freed per minute of I/O.
+        While images are held, the disk usage is checked every CheckInterval seconds,
+        images are removed at once when the disk goes above the watermark
+    """
+    Timer = Timer
+    CheckInterval = 60
+
+    def __init__(self, clock=time.time):
+        self.logger = log.getLogger(self)
+        self.clock = clock
+        self.pending = {}
+        self.timer = None
+        self.deadline = None
+        # periodic watermark check, running while images are held
+        self.checker = None
+        self.lock = threading.Lock()
+
+    def defer(self, image, delay):
+        self.logger.info("deferring %s removal by %d s, out of its removal window", image.ref, delay)
+        deadline = self.clock() + delay
+        previous = timer = checker = None
+        with self.lock:
+            self.pending[image.id] = image
+            if self.checker is None:
+                checker = self.checker = self.Timer(self.CheckInterval, self.check)
+            if self.deadline is None or deadline < self.deadline:
+                previous = self.timer
+                self.deadline = deadline
+                timer = self.timer = self.Timer(delay, self.drain)
+        if previous is not None:
+            previous.cancel()
+        if timer is not None:
+            timer.start()
+        if checker is not None:
+            checker.start()
+
+    def discard(self, image):
+        with self.lock:
+            self.pending.pop(image.id, None)
+
+    def __contains__(self, image):
+        return image.id in self.pending
+
+    def __len__(self):
+        return len(self.pending)
+
+    def check(self):
+        """
+            Removes the held images when the disk is above the watermark, checks again later otherwise
+        """
+        with self.lock:
+            current = self.checker
+            image = next(iter(self.pending.values()), None)
+            if image is None:
+                self.checker = None
+                return
+        # images share the configuration, any of them tells about the watermark
+        if image.above_watermark():
+            self.drain("disk above watermark")
+            return
+        with self.lock:
+            if self.checker is not current:
+                # drained meanwhile
+                return
+            if not self.pending:
+                self.checker = None
+                return
+            checker = self.checker = self.Timer(self.CheckInterval, self.check)
+        checker.start()
+
+    def drain(self, reason="removal window opened"):
+        with self.lock:
+            batch = sorted(self.pending.values(), key=lambda image: image.reclaimable_size(), reverse=True)
+            self.pending = {}
+            timers = [timer for timer in (self.timer, self.checker) if timer is not None]
+            self.timer = None
+            self.checker = None
+            self.deadline = None
+        for timer in timers:
+            timer.cancel()
+        self.logger.info("%s, removing %d deferred images", reason, len(batch))
+        for image in batch:
+            # images out of their window are deferred again by rm
+            try:
+                image.rm()
+            except Exception as e:
+                self.logger.error("Failed to remove deferred image %s, error: %r", image.ref, e)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+    Measures the event handling throughput of caduc against an in-memory docker client,
+    with logging at INFO and DEBUG levels.
+
+    usage: python scripts/bench_events.py [IMAGES] [EVENTS]
+"""
+
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import docker.errors
+
+from caduc.containers import Containers
+from caduc.image import Image
+from caduc.images import Images
+from caduc.watcher import Watcher
+
+class NoTimer(object):
+    def __init__(self, *args, **kwds):
+        pass
+    def start(self):
+        pass
+    def cancel(self):
+        pass
+
+class FakeClient(object):
+    def __init__(self, image_count):
+        self.images_ = {}
+        self.containers_ = {}
+        parent = ''
+        for i in range(image_count):
+            image_id = 'sha256:%064x' % i
+            self.images_[image_id] = {
+                'Id': image_id,
+                'Parent': parent,
+                'RepoTags': ['bench/image%d:latest' % i],
+                'Size': i,
+                'Config': {'Labels': None},
+                'RootFS': {'Layers': ['sha256:%064x' % j for j in range(i % 10 + 1)]},
+            }
+            # chains of 10 layers
+            parent = image_id if i % 10 else ''
+
+    def images(self, all=False):
+        return list(self.images_.values())
+
+    def containers(self, all=False):
+        return list(self.containers_.values())
+
+    def inspect_image(self, image_id):
+        try:
+            return self.images_[image_id]
+        except KeyError:
+            raise docker.errors.NotFound(image_id)
+
+    def inspect_container(self, container_id):
+        try:
+            return self.containers_[container_id]
+        except KeyError:
+            raise docker.errors.NotFound(container_id)
+
+def events(client, count):
+    image_ids = sorted(client.images_)
+    for i in range(count // 2):
+        container_id = '%064x' % i
+        client.containers_[container_id] = {
+            'Id': container_id,
+            'Name': '/container%d' % i,
+            'Image': image_ids[i % len(image_ids)],
+        }
+        yield {'Type': 'container', 'Action': 'create', 'id': container_id,
+               'Actor': {'ID': container_id, 'Attributes': {'image': image_ids[i % len(image_ids)], 'name': 'container%d' % i}}}
+        yield {'Type': 'container', 'Action': 'destroy', 'id': container_id}
+        del client.containers_[container_id]
+
+def bench(level, image_count, event_count):
+    logging.getLogger().setLevel(level)
+    client = FakeClient(image_count)
+    get_client = lambda: client
+    images = Images({}, get_client)
+    containers = Containers({}, get_client, images)
+    watcher = Watcher(get_client, images, containers)
+    start = time.time()
+    for event in events(client, event_count):
+        watcher.handle(event)
+    return event_count / (time.time() - start)
+
+def main(argv):
+    image_count = int(argv[0]) if argv else 1000
+    event_count = int(argv[1]) if len(argv) > 1 else 20000
+    Image.Timer = NoTimer
+    handler = logging.StreamHandler(open(os.devnull, 'w'))
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s %(message)s'))
+    logging.getLogger().addHandler(handler)
+    for name, level in [('INFO', logging.INFO), ('DEBUG', logging.DEBUG)]:
+        sys.stdout.write("%s: %.0f events/s\n" % (name, bench(level, image_count, event_count)))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+    Measures the start up time of short lived caduc invocations, in separate processes,
+    and lists the slowest modules imported by caduc.cmd.
+
+    usage: python scripts/bench_startup.py [RUNS]
+"""
+
+import os
+import re
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+COMMANDS = [
+    ('import caduc.cmd', ['-c', 'import caduc.cmd']),
+    ('caduc --help', ['-m', 'caduc.cmd', '--help']),
+    ('caduc status (no daemon)', ['-m', 'caduc.cmd', '--control-socket', os.devnull, 'status']),
+]
+
+def run(args):
+    start = time.time()
+    with open(os.devnull, 'w') as devnull:
+        subprocess.call([sys.executable] + args, cwd=ROOT, stdout=devnull, stderr=devnull)
+    return time.time() - start
+
+def import_times(code):
+    """
+        Returns {module: cumulative microseconds} of the top level imports of code, needs python >= 3.7
+    """
+    process = subprocess.Popen([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, stderr=subprocess.PIPE)
+    _, stderr = process.communicate()
+    imports = {}
+    for line in stderr.decode('utf-8').splitlines():
+        match = re.match(r'import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)', line)
+        # modules imported by caduc.cmd itself, or by the interpreter start up
+        if match and len(match.group(2)) <= 3:
+            imports[match.group(3)] = int(match.group(1))
+    return imports
+
+def slowest_imports(count=10):
+    """
+        Returns the (cumulative microseconds, module) imported by caduc.cmd taking the longest
+    """
+    baseline = import_times('pass')
+    imports = import_times('import caduc.cmd')
+    return sorted(((microseconds, module) for module, microseconds in imports.items() if module not in baseline),
+                  reverse=True)[:count]
+
+def main(argv):
+    runs = int(argv[0]) if argv else 10
+    # baseline of the interpreter itself
+    commands = [('python', ['-c', 'pass'])] + COMMANDS
+    for name, args in commands:
+        times = sorted(run(args) for _ in range(runs))
+        sys.stdout.write("%s: %.0f ms (median of %d)\n" % (name, times[len(times) // 2] * 1000, runs))
+    if sys.version_info >= (3, 7):
+        sys.stdout.write("slowest imports:\n")
+        for microseconds, module in slowest_imports():
+            sys.stdout.write("  %s: %.1f ms\n" % (module, microseconds / 1000.))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -49,6 +49,11 @@ class IntegrationTest(unittest.TestCase):
         self.client = docker.Client(**docker.utils.kwargs_from_env(assert_hostname=False))
         options = mock.Mock()
         options.debug = False
+        options.dry_run = False
+        options.profile_dir = None
+        options.audit_log = None
+        options.event_buffer = 10000
+        options.docker_root = None
         options.config = ['images.test-*.grace_time=1s']
         options.config_path = None
         options.image_gracetime = '1d'
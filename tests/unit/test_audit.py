@@ -0,0 +1,83 @@
+import json
+import os
+import shutil
+import sure
+import tempfile
+import unittest
+
+from caduc.audit import AuditLog
+
+from .. import mock
+
+class TestAuditLog(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'audit.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read(self, path=None):
+        with open(path or self.path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_entries_are_written_as_json_lines(self):
+        audit = AuditLog(self.path, flush_interval=0.01).start()
+        audit.record('removed', id='id1', tags=['tag1']).should.be.true
+        audit.record('removed', id='id2', tags=[]).should.be.true
+        audit.close()
+        entries = self.read()
+        [(e['event'], e['id'], e['tags']) for e in entries].should.be.eql([
+            ('removed', 'id1', ['tag1']),
+            ('removed', 'id2', []),
+        ])
+        entries[0]['time'].should.match(r'\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d+Z')
+        audit.written.should.be.eql(2)
+        audit.dropped.should.be.eql(0)
+
+    def test_entries_are_dropped_when_queue_is_full(self):
+        audit = AuditLog(self.path, queue_size=2)
+        audit.record('removed', id='id1').should.be.true
+        audit.record('removed', id='id2').should.be.true
+        audit.record('removed', id='id3').should.be.false
+        audit.dropped.should.be.eql(1)
+        audit.start().close()
+        [e['id'] for e in self.read()].should.be.eql(['id1', 'id2'])
+
+    def test_dropped_entries_are_logged_once(self):
+        audit = AuditLog(self.path, queue_size=1)
+        audit.record('removed', id='id1')
+        audit.record('removed', id='id2')
+        audit.record('removed', id='id3')
+        with mock.patch.object(audit.logger, 'warning') as warning:
+            audit.report_dropped()
+            audit.report_dropped()
+        warning.assert_called_once_with(mock.ANY, 2, 2)
+        audit.reported.should.be.eql(2)
+
+    def test_batches(self):
+        audit = AuditLog(self.path, batch_size=2, flush_interval=10)
+        for i in range(3):
+            audit.record('removed', id=i)
+        [e['id'] for e in audit.next_batch()].should.be.eql([0, 1])
+        audit.queue.put(audit.Stop)
+        batch = audit.next_batch()
+        batch[0]['id'].should.be.eql(2)
+        batch[1].should.be(audit.Stop)
+
+    def test_rotation(self):
+        audit = AuditLog(self.path, max_bytes=1, backups=2)
+        audit.write([{'id': 1}])
+        audit.write([{'id': 2}])
+        audit.write([{'id': 3}])
+        os.path.exists(self.path).should.be.false
+        self.read(self.path + '.1').should.be.eql([{'id': 3}])
+        self.read(self.path + '.2').should.be.eql([{'id': 2}])
+        os.path.exists(self.path + '.3').should.be.false
+
+    def test_write_errors_are_counted(self):
+        audit = AuditLog(os.path.join(self.tmpdir, 'missing', 'audit.jsonl'), flush_interval=0.01).start()
+        audit.record('removed', id='id1')
+        audit.close()
+        audit.dropped.should.be.eql(1)
@@ -0,0 +1,46 @@
+import caduc.cache
+import unittest
+import sure
+
+class TestTTLCache(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.
+
+    def clock(self):
+        return self.now
+
+    def test_expiry(self):
+        cache = caduc.cache.TTLCache(10, clock=self.clock)
+        cache.add('key')
+        ('key' in cache).should.be.true
+        ('other' in cache).should.be.false
+        self.now += 10
+        ('key' in cache).should.be.true
+        self.now += 1
+        ('key' in cache).should.be.false
+        len(cache).should.be.eql(0)
+
+    def test_custom_ttl(self):
+        cache = caduc.cache.TTLCache(10, clock=self.clock)
+        cache.add('key', ttl=100)
+        self.now += 50
+        ('key' in cache).should.be.true
+
+    def test_discard(self):
+        cache = caduc.cache.TTLCache(10, clock=self.clock)
+        cache.add('key')
+        cache.discard('key')
+        cache.discard('unknown')
+        ('key' in cache).should.be.false
+
+    def test_bounded(self):
+        cache = caduc.cache.TTLCache(10, size=2, clock=self.clock)
+        cache.add('a')
+        cache.add('b')
+        cache.add('a')
+        cache.add('c')
+        len(cache).should.be.eql(2)
+        ('b' in cache).should.be.false
+        ('a' in cache).should.be.true
+        ('c' in cache).should.be.true
@@ -240,3 +240,8 @@ class TestConfig(unittest.TestCase):
         cfg.get.when.called_with('some.other.key', 'some.default').should.return_value('some.default')
         
 
+
+    def test_invalid_windows_are_rejected(self):
+        caduc.config.Config(['images.app:*.window=22:00-06:00', 'removals.window=01:00-05:00'], os.devnull)
+        caduc.config.Config.when.called_with(['images.app:*.window=22h-6h'], os.devnull).should.throw(ValueError, '22h-6h')
+        caduc.config.Config.when.called_with(['removals.window=night'], os.devnull).should.throw(ValueError, 'night')
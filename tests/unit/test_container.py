@@ -17,3 +17,10 @@ def test_container():
     s = str(container)
     s.should.contain('container.id')
     s.should.contain('container.name')
+    container.ref.should.be.eql('Container<container.id container.name>')
+
+def test_container_reuses_inspection():
+    client = mock.Mock()
+    container = caduc.container.Container(None, lambda: client, 'container.id', dict(Id='container.id', Name='container.name', Image='container.image'))
+    client.inspect_container.assert_not_called()
+    container.image_id.should.be.eql('container.image')
@@ -1,11 +1,18 @@
 import caduc.containers
 import caduc.dicts
+import docker.errors
 import faker
 import sure
 import unittest
 
 from .. import mock
 
+from caduc.images import Images
+
+class ImageDict(dict):
+    def add(self, item):
+        return self[item]
+
 class TestContainers(unittest.TestCase):
 
     def setUp(self):
@@ -18,7 +25,7 @@ class TestContainers(unittest.TestCase):
         self.client = mock.Mock()
         self.config = mock.Mock()
         self.client.containers = mock.Mock(return_value = [])
-        self.images = {}
+        self.images = ImageDict()
         return caduc.containers.Containers(self.config, self.getClient, self.images)
 
     def test_instanciate(self):
@@ -92,3 +99,49 @@ class TestContainers(unittest.TestCase):
         finally:
             caduc.dicts.SyncDict.pop = pop
 
+    def test_pop_leases_image_of_labelled_containers(self):
+        containers = self.getContainers()
+        image = mock.Mock()
+        image.parse_grace_time = mock.Mock(return_value=3600)
+        self.images['image.id'] = image
+        client = mock.Mock()
+        client.inspect_container = mock.Mock(return_value=dict(
+            Id = 'container.id',
+            Name = 'Name',
+            Image = 'image.id',
+            Config = {'Labels': {'com.caduc.image.lease': '1h'}},
+        ))
+        container = caduc.container.Container(None, lambda: client, 'container.id')
+        container.lease.should.be.eql('1h')
+        pop = caduc.dicts.SyncDict.pop
+        try:
+            caduc.dicts.SyncDict.pop = mock.Mock(return_value = container)
+            containers.pop('container.id')
+        finally:
+            caduc.dicts.SyncDict.pop = pop
+        image.parse_grace_time.assert_called_once_with('1h')
+        image.mock_calls.index(mock.call.lease(3600)).should.be.lower_than(image.mock_calls.index(mock.call.remove(container)))
+
+    def test_image_pulled_again_after_its_removal_is_tracked(self):
+        client = mock.Mock()
+        details = {'Id': 'sha256:image', 'Parent': '', 'RepoTags': ['ci:1'], 'Config': {'Labels': None}, 'Size': 1}
+        store = {'sha256:image': details}
+        def inspect_image(image_id):
+            try:
+                return store[image_id]
+            except KeyError:
+                raise docker.errors.NotFound(image_id)
+        client.images.return_value = [details]
+        client.inspect_image.side_effect = inspect_image
+        client.containers.return_value = []
+        client.inspect_container.return_value = dict(Id='container.id', Name='/job', Image='sha256:image')
+        images = Images(mock.Mock(), lambda: client)
+        containers = caduc.containers.Containers(mock.Mock(), lambda: client, images)
+        # delete event, the id is remembered as gone
+        del store['sha256:image']
+        images.forget('sha256:image')
+        # pulled again, with the same content addressed id, then used by a container
+        store['sha256:image'] = details
+        containers.add('container.id')
+        images.keys().should.contain('sha256:image')
+        dict.get(images, 'sha256:image').should.contain(containers['container.id'])
@@ -0,0 +1,176 @@
+import os
+import shutil
+import socket
+import stat
+import sure
+import tempfile
+import unittest
+
+from .. import mock
+
+from caduc.config import Config
+from caduc.containers import Containers
+from caduc.control import Control
+from caduc.control import ControlError
+from caduc.control import ControlServer
+from caduc.control import request
+from caduc.image import Image
+from caduc.images import Images
+from caduc.lease import Leases
+
+class RecordingTimer(object):
+    def __init__(self, interval, function, args=(), kwargs=None):
+        self.interval = interval
+        self.function = function
+        self.started = False
+
+    def start(self):
+        self.started = True
+
+    def cancel(self):
+        self.started = False
+
+class TestControl(unittest.TestCase):
+
+    def setUp(self):
+        self.client = mock.Mock()
+        self.client.images.return_value = [
+            {'Id': 'sha256:aaaa', 'Parent': '', 'RepoTags': ['app:latest'], 'Config': {'Labels': None}, 'Size': 100},
+            {'Id': 'sha256:bbbb', 'Parent': '', 'RepoTags': ['tool:1'], 'Config': {'Labels': None}, 'Size': 200},
+            {'Id': 'sha256:cccc', 'Parent': '', 'RepoTags': ['db:2'], 'Config': {'Labels': None}, 'Size': 300},
+        ]
+        details = dict((image['Id'], image) for image in self.client.images.return_value)
+        self.client.inspect_image.side_effect = lambda image_id: details[image_id]
+        self.client.containers.return_value = [{'Id': 'c1', 'Name': '/database', 'Image': 'sha256:cccc'}]
+        self.client.inspect_container.return_value = {'Id': 'c1', 'Name': '/database', 'Image': 'sha256:cccc'}
+        self.patch = mock.patch.object(Image, 'Timer', RecordingTimer)
+        self.patch.start()
+        self.leases = mock.patch.object(Image, 'Leases', Leases())
+        self.leases.start()
+        self.clock = mock.Mock(return_value=1000.)
+        config = Config(['images.app:*.grace_time=10s', 'images.tool:*.grace_time=50s'], os.devnull)
+        self.images = Images(config, lambda: self.client)
+        self.containers = Containers(config, lambda: self.client, self.images)
+        self.images.update_timers()
+        self.control = Control(self.images, self.containers, clock=self.clock)
+
+    def tearDown(self):
+        self.patch.stop()
+        self.leases.stop()
+
+    def test_status(self):
+        self.control.status().should.be.eql({
+            'images': 3,
+            'containers': 1,
+            'states': {'scheduled': 2, 'in_use': 1},
+        })
+        audit = mock.Mock(written=5, dropped=2)
+        Control(self.images, self.containers, audit=audit).status()['audit'].should.be.eql({'written': 5, 'dropped': 2})
+
+    def test_pending_lists_the_next_removals_first(self):
+        self.clock.return_value = self.images['sha256:aaaa'].scheduled_at
+        pending = self.control.pending()
+        [entry['id'] for entry in pending].should.be.eql(['sha256:aaaa', 'sha256:bbbb'])
+        pending[0]['in'].should.be.eql(10)
+        pending[0]['size'].should.be.eql(100)
+        pending[0]['tags'].should.be.eql(['app:latest'])
+        [entry['id'] for entry in self.control.pending(1)].should.be.eql(['sha256:aaaa'])
+
+    def test_explain(self):
+        explained = self.control.explain('db:2')
+        explained['id'].should.be.eql('sha256:cccc')
+        explained['state'].should.be.eql('in_use')
+        explained['containers'].should.be.eql(['/database'])
+        explained['deadline'].should.be.none
+        self.control.explain('app').should.have.key('policies').being.eql(['app:*'])
+        self.control.explain.when.called_with('missing:latest').should.throw(ControlError)
+        self.client.inspect_image.reset_mock()
+        self.control.explain.when.called_with('other').should.throw(ControlError)
+        self.client.inspect_image.assert_not_called()
+
+    def test_expire_removes_through_dispatch(self):
+        dispatch = mock.Mock()
+        control = Control(self.images, self.containers, dispatch)
+        image = self.images['sha256:aaaa']
+        control.expire('app:latest').should.be.eql({'id': 'sha256:aaaa'})
+        dispatch.assert_called_once_with(image.rm)
+        control.expire.when.called_with('db:2').should.throw(ControlError, 'in use')
+
+    def test_pin_cancels_the_removal_until_unpinned(self):
+        image = self.images['sha256:aaaa']
+        timer = image.event
+        self.control.pin('app')
+        timer.started.should.be.false
+        image.deadline().should.be.none
+        self.control.status()['states'].should.have.key('pinned').being.eql(1)
+        self.control.expire.when.called_with('app').should.throw(ControlError, 'pinned')
+        image.rm()
+        self.client.remove_image.assert_not_called()
+        self.control.unpin('app')
+        image.event.started.should.be.true
+
+    def test_lease_postpones_the_removal(self):
+        image = self.images['sha256:aaaa']
+        deadline = image.deadline()
+        self.control.lease('app', '1h')['seconds'].should.be.eql(3600)
+        image.event.interval.should.be.greater_than(3590)
+        image.deadline().should.be.greater_than(deadline + 3500)
+        self.control.explain('app')['state'].should.be.eql('leased')
+        self.control.expire.when.called_with('app').should.throw(ControlError, 'leased')
+        # a lease expiring before the grace time does not change it
+        self.control.lease('tool:1', 1)
+        self.images['sha256:bbbb'].event.interval.should.be.eql(50)
+        self.control.release('app')
+        image.event.interval.should.be.lower_than(11)
+        self.control.lease.when.called_with('app', 'soon').should.throw(ValueError)
+
+    def test_leased_image_is_kept_when_expired(self):
+        image = self.images['sha256:aaaa']
+        Image.Leases.grant(image.id, 60)
+        image.rm()
+        image.event.interval.should.be.greater_than(50)
+        self.client.remove_image.assert_not_called()
+
+    def test_handle(self):
+        self.control.handle({'command': 'status'})['result']['images'].should.be.eql(3)
+        self.control.handle({'command': 'explain', 'args': ['missing']}).should.have.key('error')
+        self.control.handle({'command': 'explain'}).should.have.key('error')
+        self.control.handle({'command': 'rm'}).should.be.eql({'error': "unknown command 'rm'"})
+        self.control.handle(['status']).should.have.key('error')
+
+    def test_socket(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'caduc.sock')
+        server = ControlServer(path, self.control).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        request(path, 'status')['images'].should.be.eql(3)
+        request(path, 'explain', 'tool:1')['id'].should.be.eql('sha256:bbbb')
+        request.when.called_with(path, 'explain', 'missing').should.throw(ControlError, 'no tracked image')
+        request.when.called_with(os.path.join(directory, 'other.sock'), 'status').should.throw(ControlError, 'cannot connect')
+        stat.S_IMODE(os.stat(path).st_mode).should.be.eql(0o600)
+
+    def test_socket_left_over_is_replaced(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'caduc.sock')
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(path)
+        stale.close()
+        server = ControlServer(path, self.control).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        request(path, 'status')['images'].should.be.eql(3)
+        # a running server is never stolen
+        ControlServer.when.called_with(path, self.control).should.throw(OSError, 'served by another process')
+        request(path, 'status')['images'].should.be.eql(3)
+
+    def test_other_files_are_not_removed(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'config.yml')
+        with open(path, 'w') as f:
+            f.write('images: {}\n')
+        ControlServer.when.called_with(path, self.control).should.throw(OSError, 'not a socket')
+        os.path.isfile(path).should.be.true
@@ -19,6 +19,7 @@ class TestDicts(unittest.TestCase):
         caduc.dicts.SyncDict.list_items = self.list_items
         caduc.dicts.SyncDict.inspect = self.inspect
         caduc.dicts.SyncDict.__getitem__ = self.getitem
+        docker.errors.NotFound = self.dockerErrorsNotFound
         self.unmockInstanciate()
         self.unmockList()
         self.unmockInspect()
@@ -63,7 +64,7 @@ class TestDicts(unittest.TestCase):
         self.mockInspect(inspect=dict(Id='some.id'))
         dct = caduc.dicts.SyncDict()
         dct['some.id'].should.be.eql(instance)
-        caduc.dicts.SyncDict.instanciate.assert_called_once_with('some.id')
+        caduc.dicts.SyncDict.instanciate.assert_called_once_with('some.id', dict(Id='some.id'))
         caduc.dicts.SyncDict.list_items.assert_called_once_with()
         caduc.dicts.SyncDict.inspect.assert_called_with('some.id')
 
@@ -91,6 +92,99 @@ class TestDicts(unittest.TestCase):
         dct['new.id'].should.be(instance)
         caduc.dicts.SyncDict.inspect.assert_called_once_with('new.id')
 
+    def test_getitem_inspects_once_on_miss(self):
+        dct = self.create_with_items()
+        caduc.dicts.SyncDict.inspect = mock.Mock(return_value=dict(Id='new.id'))
+        caduc.dicts.SyncDict.instanciate.reset_mock()
+
+        dct['new.name']
+        caduc.dicts.SyncDict.inspect.assert_called_once_with('new.name')
+        caduc.dicts.SyncDict.instanciate.assert_called_once_with('new.id', dict(Id='new.id'))
+
+    def test_getitem_caches_missing_items(self):
+        dct = self.create_with_items()
+        caduc.dicts.SyncDict.inspect = mock.Mock(side_effect=docker.errors.NotFound('missing'))
+
+        dct.__getitem__.when.called_with('missing.id').should.throw(KeyError)
+        dct.__getitem__.when.called_with('missing.id').should.throw(KeyError)
+        caduc.dicts.SyncDict.inspect.assert_called_once_with('missing.id')
+
+        dct.missing.discard('missing.id')
+        dct.__getitem__.when.called_with('missing.id').should.throw(KeyError)
+        caduc.dicts.SyncDict.inspect.call_count.should.be.eql(2)
+
+    def test_instanciation_does_not_hold_the_lock(self):
+        dct = self.create_with_items()
+        caduc.dicts.SyncDict.inspect = mock.Mock(return_value=dict(Id='new.id'))
+        def instanciate(this, id, inspect):
+            # another thread may store or remove items meanwhile
+            dct.lock.acquire(False).should.be.true
+            dct.lock.release()
+            return instance
+        instance = mock.Mock()
+        caduc.dicts.SyncDict.instanciate = instanciate
+        dct['new.id'].should.be(instance)
+
+    def test_instance_stored_meanwhile_wins(self):
+        dct = self.create_with_items()
+        caduc.dicts.SyncDict.inspect = mock.Mock(return_value=dict(Id='new.id'))
+        winner = mock.Mock()
+        def instanciate(this, id, inspect):
+            dict.__setitem__(dct, id, winner)
+            return mock.Mock()
+        caduc.dicts.SyncDict.instanciate = instanciate
+        dct.discarded = mock.Mock()
+        dct['new.id'].should.be(winner)
+        dct.discarded.assert_not_called()
+
+    def test_instance_removed_meanwhile_is_discarded(self):
+        dct = self.create_with_items()
+        caduc.dicts.SyncDict.inspect = mock.Mock(return_value=dict(Id='new.id'))
+        instance = mock.Mock()
+        def instanciate(this, id, inspect):
+            dct.gone(id)
+            return instance
+        caduc.dicts.SyncDict.instanciate = instanciate
+        dct.discarded = mock.Mock()
+        dct.__getitem__.when.called_with('new.id').should.throw(KeyError, 'was removed')
+        dct.should_not.contain('new.id')
+        dct.discarded.assert_called_once_with(instance)
+
+    def test_add_with_known_details(self):
+        dct = self.create_with_items()
+        caduc.dicts.SyncDict.inspect.reset_mock()
+        caduc.dicts.SyncDict.instanciate.reset_mock()
+        dct.add('new.id', dict(Id='new.id'))
+        caduc.dicts.SyncDict.instanciate.assert_called_once_with('new.id', dict(Id='new.id'))
+        caduc.dicts.SyncDict.inspect.assert_not_called()
+        dct.add('my.id', dict(Id='my.id'))
+        caduc.dicts.SyncDict.instanciate.call_count.should.be.eql(1)
+
+    def test_add_forgets_missing_items(self):
+        dct = self.create_with_items()
+        dct.missing.add('new.id')
+        caduc.dicts.SyncDict.inspect = mock.Mock(return_value=dict(Id='new.id'))
+        dct.add('new.id')
+        caduc.dicts.SyncDict.inspect.assert_called_once_with('new.id')
+        ('new.id' in dct.missing).should.be.false
+
+    def test_pop_remembers_removed_ids(self):
+        dct = self.create_with_items()
+        dct.pop('my.id')
+        caduc.dicts.SyncDict.inspect.reset_mock()
+        dct.__getitem__.when.called_with('my.id').should.throw(KeyError)
+        dct.pop('my.id').should.be(None)
+        caduc.dicts.SyncDict.inspect.assert_not_called()
+
+    def test_forget_does_not_call_client(self):
+        dct = self.create_with_items()
+        caduc.dicts.SyncDict.inspect.reset_mock()
+        dct.forget('unknown.id').should.be(None)
+        dct.forget('my.id').should_not.be(None)
+        dct.should.be.empty
+        caduc.dicts.SyncDict.inspect.assert_not_called()
+        ('unknown.id' in dct.missing).should.be.true
+
     def test_getitem_raises_KeyError_when_not_exists(self):
         dct = self.create_with_items()
         docker.errors.NotFound = Exception
@@ -188,3 +282,15 @@ class TestDicts(unittest.TestCase):
         dct.list_items.when.called_with().should.throw(NotImplementedError)
         dct.inspect.when.called_with().should.throw(NotImplementedError)
 
+
+    def test_getitem_resolves_names_locally(self):
+        dct = self.create_with_items()
+        dct.resolve = mock.Mock(return_value='my.id')
+        caduc.dicts.SyncDict.inspect.reset_mock()
+        dct['my.name'].should.be(dct['my.id'])
+        dct.resolve.assert_called_once_with('my.name')
+        caduc.dicts.SyncDict.inspect.assert_not_called()
+
+        dct.pop('my.name')
+        dct.should.be.empty
+        caduc.dicts.SyncDict.inspect.assert_not_called()
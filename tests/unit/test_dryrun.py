@@ -0,0 +1,31 @@
+import docker.errors
+import sure
+import unittest
+
+from .. import mock
+
+from caduc.dryrun import Recorder
+
+class TestRecorder(unittest.TestCase):
+
+    def setUp(self):
+        self.client = mock.Mock()
+        self.recorder = Recorder(lambda: self.client)
+
+    def test_client_calls_are_proxied(self):
+        self.client.inspect_image = mock.Mock(return_value=dict(Id='some.id'))
+        self.recorder().inspect_image('some.name').should.be.eql(dict(Id='some.id'))
+        self.client.inspect_image.assert_called_once_with('some.name')
+
+    def test_prunes_remove_nothing(self):
+        self.recorder().prune_images(filters={'dangling': True}).should.be.eql({'ImagesDeleted': None, 'SpaceReclaimed': 0})
+        self.client.prune_images.assert_not_called()
+
+    def test_removals_are_recorded(self):
+        self.recorder().remove_image.when.called_with('some.id').should.throw(docker.errors.NotFound)
+        self.recorder().remove_image.when.called_with('other.id', force=True).should.throw(docker.errors.NotFound)
+        self.client.remove_image.assert_not_called()
+        [(name, kwds) for _, name, kwds in self.recorder.removed].should.be.eql([
+            ('some.id', {}),
+            ('other.id', {'force': True}),
+        ])
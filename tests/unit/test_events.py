@@ -0,0 +1,52 @@
+import caduc.events
+import threading
+import unittest
+import sure
+
+from .. import mock
+
+class TestEventBuffer(unittest.TestCase):
+
+    def test_events_are_buffered_in_order(self):
+        buffer = caduc.events.EventBuffer(iter(range(5))).start()
+        buffer.thread.join(5)
+        buffer.received.should.be.eql(5)
+        list(buffer).should.be.eql(list(range(5)))
+        buffer.backlog.should.be.eql(6)
+
+    def test_reading_pauses_when_full(self):
+        release = threading.Event()
+        def events():
+            for i in range(3):
+                yield i
+            release.wait(5)
+        buffer = caduc.events.EventBuffer(events(), size=2).start()
+        buffer.thread.join(0.2)
+        buffer.received.should.be.eql(2)
+        len(buffer).should.be.eql(2)
+        release.set()
+        list(buffer).should.be.eql([0, 1, 2])
+
+    def test_on_ready_once_backlog_is_handled(self):
+        release = threading.Event()
+        handled = []
+        def events():
+            yield 'before'
+            release.wait(5)
+            yield 'after'
+        on_ready = mock.Mock(side_effect=lambda: handled.append('ready'))
+        buffer = caduc.events.EventBuffer(events(), on_ready=on_ready).start()
+        while not len(buffer):
+            buffer.thread.join(0.01)
+        for event in buffer:
+            handled.append(event)
+            release.set()
+        handled.should.be.eql(['before', 'ready', 'after'])
+        on_ready.assert_called_once_with()
+
+    def test_read_errors_end_iteration(self):
+        def events():
+            yield 'event'
+            raise IOError()
+        buffer = caduc.events.EventBuffer(events()).start()
+        list(buffer).should.be.eql(['event'])
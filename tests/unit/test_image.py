@@ -12,6 +12,9 @@ from caduc.image import ClientSemaphore
 from caduc.image import Image
 
 
+class ImageDict(dict):
+    def add(self, item):
+        return self[item]
 
 class TestSemaphore(unittest.TestCase):
 
@@ -132,9 +135,9 @@ class TestImage(unittest.TestCase):
         )
         parent_mock = mock.Mock()
         parent_mock.add_child = mock.Mock()
-        images = {
+        images = ImageDict({
             inspect['Parent']: parent_mock,
-        }
+        })
         img = Image(self.Config, images, lambda: self.client, self.faker.text())
         parent_mock.add_child.assert_called_once_with(inspect['Id'])
 
@@ -333,6 +336,20 @@ class TestImage(unittest.TestCase):
         self.client.inspect_image.call_count.should.be.eql(1)
         img.update_timer.call_count.should.be.eql(1)
 
+    def test_add_and_remove_tag(self):
+        img = self.getImage(inspect=dict(Id='image.id', RepoTags=['<none>:<none>']))
+        img.update_timer = mock.Mock()
+        self.client.inspect_image.reset_mock()
+        img.add_tag('app:1')
+        img.add_tag('app:1')
+        img.details['RepoTags'].should.be.eql(['app:1'])
+        img.update_timer.call_count.should.be.eql(2)
+        self.images.reindex.assert_called_once_with(img)
+        img.remove_tag('app:1')
+        img.remove_tag('app:2')
+        img.details['RepoTags'].should.be.eql([])
+        self.client.inspect_image.assert_not_called()
+
     def test_on_deletion_removal_schedules_are_cancelled(self):
         img = self.getImage()
         img.cancel_rm = mock.Mock()
@@ -342,9 +359,9 @@ class TestImage(unittest.TestCase):
     def test_on_deletion_image_is_removed_from_parent(self):
         parent_mock = mock.Mock()
         parent_mock.delete_child = mock.Mock()
-        images = {
+        images = ImageDict({
             'parent': parent_mock,
-        }
+        })
         img = self.getImage(images=images, inspect={'Parent': 'parent'})
         img.cancel_rm = mock.Mock()
         img.deleted()
@@ -478,6 +495,28 @@ class TestImage(unittest.TestCase):
         img.cancel_rm.assert_not_called()
         img.schedule_rm.assert_called_once_with()
 
+    def test_rm_runs_blocking_calls_in_executor(self):
+        img = self.getImage(inspect=dict(Id='image Id', RepoTags=['repoTag1']))
+        img.Timer = mock.Mock()
+        submitted = []
+        img.Executor = mock.Mock()
+        img.Executor.submit = mock.Mock(side_effect=lambda func, args, callback: submitted.append((func, args, callback)))
+        self.client.remove_image = mock.Mock()
+
+        img.rm()
+        len(submitted).should.be.eql(1)
+        func, args, callback = submitted.pop()
+        callback(func(*args))
+        self.client.remove_image.assert_not_called()
+
+        len(submitted).should.be.eql(1)
+        func, args, callback = submitted.pop()
+        # the image was used meanwhile
+        img.add(mock.Mock())
+        callback(func(*args))
+        self.client.remove_image.assert_not_called()
+        self.images.gone.assert_not_called()
+
     def test_rm_pops_image_from_list(self):
         img = self.getImage(inspect=dict(Id='image Id'))
         timer = mock.Mock()
@@ -488,6 +527,7 @@ class TestImage(unittest.TestCase):
         img.rm()
         self.client.remove_image.assert_called_once_with('image Id')
         timer.start.assert_called_once_with()
+        self.images.gone.assert_called_once_with('image Id')
 
 
     def test_rm_deletes_all_tags(self):
@@ -550,3 +590,314 @@ class TestImage(unittest.TestCase):
         self.client.remove_image.call_args_list.should.contain(mock.call('tag1'))
         self.client.remove_image.call_args_list.should.contain(mock.call('tag2'))
 
+
+    def test_rm_schedules_short_retry(self):
+        img = self.getImage(inspect=dict(Id='image Id'))
+        img.get_grace_times = mock.Mock(return_value=['1d'])
+        timer = mock.Mock()
+        img.Timer = mock.Mock(return_value = timer)
+        self.client.remove_image = mock.Mock()
+        img.rm()
+        img.Timer.assert_called_once_with(img.RetryDelay, img.rm)
+        timer.start.assert_called_once_with()
+
+    def test_rm_untags_within_global_limit(self):
+        tags = ['tag%d' % i for i in range(10)]
+        img = self.getImage(inspect=dict(Id='someId', RepoTags=tags))
+        img.Timer = mock.Mock()
+        lock = threading.Lock()
+        state = dict(current=0, max=0)
+        class Semaphore(object):
+            def __enter__(self):
+                with lock:
+                    state['current'] += 1
+                    state['max'] = max(state['max'], state['current'])
+            def __exit__(self, *args):
+                with lock:
+                    state['current'] -= 1
+        img.RmSemaphore = Semaphore()
+        self.client.remove_image = mock.Mock()
+        img.rm()
+        self.client.remove_image.call_count.should.be.eql(11)
+        for tag in tags:
+            self.client.remove_image.call_args_list.should.contain(mock.call(tag))
+        self.client.remove_image.call_args_list[-1].should.be.eql(mock.call('someId'))
+        state['current'].should.be.eql(0)
+
+    def test_rm_forces_removal_by_id_when_policy_allows(self):
+        config = {
+            'images': {
+                'ci/*': {
+                    'grace_time': '1h',
+                    'force_rm': True,
+                },
+            },
+        }
+        img = self.getImage(config=config, inspect=dict(Id='someId', RepoTags=['ci/a:1', 'ci/b:2']))
+        img.Timer = mock.Mock()
+        self.client.remove_image = mock.Mock()
+        img.rm()
+        self.client.remove_image.assert_called_once_with('someId', force=True)
+
+    def test_can_force_rm_requires_all_names_to_allow_it(self):
+        config = {
+            'images': {
+                'ci/*': {
+                    'force_rm': True,
+                },
+                'base/*': {
+                    'grace_time': '1d',
+                },
+            },
+        }
+        img = self.getImage(config=config)
+        img.can_force_rm.when.called_with(['ci/a']).should.return_value(True)
+        img.can_force_rm.when.called_with(['ci/a', 'base/b']).should.return_value(False)
+        img.can_force_rm.when.called_with([]).should.return_value(False)
+        self.getImage(config={}).can_force_rm.when.called_with(['ci/a']).should.return_value(False)
+
+    def test_rm_retries_failed_removal(self):
+        img = self.getImage(inspect=dict(Id='someId', RepoTags=['tag1']))
+        img.Timer = mock.Mock()
+        img.Retries = mock.Mock()
+        response = mock.Mock()
+        response.status_code = 409
+        error = docker.errors.APIError('conflict', response=response)
+
+        self.client.remove_image = mock.Mock(side_effect=error)
+        img.rm()
+        self.client.remove_image.assert_called_once_with('tag1')
+        img.Retries.retry.assert_called_once_with('someId', img.rm, error)
+        img.Timer.assert_not_called()
+
+        img.Retries.reset_mock()
+        self.client.remove_image = mock.Mock(side_effect=[None, error])
+        img.rm()
+        img.Retries.retry.assert_called_once_with('someId', img.rm, error)
+        img.Timer.assert_not_called()
+
+    def test_retries_are_reset_when_image_is_used_or_deleted(self):
+        img = self.getImage(inspect=dict(Id='someId'))
+        img.Retries = mock.Mock()
+        img.add('container')
+        img.Retries.reset.assert_called_with('someId')
+        img.Retries.reset_mock()
+        img.deleted()
+        img.Retries.reset.assert_called_once_with('someId')
+
+    def test_rm_waits_for_removal_budget(self):
+        img = self.getImage(inspect=dict(Id='someId', Size=1024))
+        img.Timer = mock.Mock()
+        img.RmLimiter = mock.Mock()
+        self.client.remove_image = mock.Mock()
+        img.rm()
+        img.RmLimiter.acquire.assert_called_once_with(1024)
+        self.client.remove_image.assert_called_once_with('someId')
+
+    def test_get_windows(self):
+        config = {
+            'images': {
+                'ci/*': {
+                    'grace_time': '1h',
+                    'window': '01:00-05:00',
+                },
+                'base/*': {
+                    'grace_time': '1d',
+                },
+            },
+        }
+        img = self.getImage(config=config)
+        [str(w) for w in img.get_windows(['ci/a'])].should.be.eql(['Window<01:00-05:00>'])
+        img.get_windows.when.called_with(['base/a']).should.return_value(set())
+
+        cfg = Config(['removals.window=02:00-03:00'], config_path='tests/fixtures/config.yml')
+        img = self.getImage(config=cfg)
+        [str(w) for w in img.get_windows(['base/a'])].should.be.eql(['Window<02:00-03:00>'])
+
+    def test_removal_delay(self):
+        import datetime
+        config = Config(['removals.window=01:00-05:00'], config_path='tests/fixtures/config.yml')
+        img = self.getImage(config=config)
+        img.removal_delay(datetime.datetime(2017, 1, 1, 2)).should.be.eql(0)
+        img.removal_delay(datetime.datetime(2017, 1, 1, 0)).should.be.eql(3600)
+        img.above_watermark = mock.Mock(return_value=True)
+        img.removal_delay(datetime.datetime(2017, 1, 1, 0)).should.be.eql(0)
+
+        self.getImage().removal_delay().should.be.eql(0)
+
+    def test_above_watermark(self):
+        self.getImage().above_watermark().should.be.false
+        img = self.getImage(config=Config(['removals.watermark=0', 'removals.disk_path=.'], config_path='tests/fixtures/config.yml'))
+        img.above_watermark().should.be.true
+        img = self.getImage(config=Config(['removals.watermark=101', 'removals.disk_path=.'], config_path='tests/fixtures/config.yml'))
+        img.above_watermark().should.be.false
+        img = self.getImage(config=Config(['removals.watermark=0', 'removals.disk_path=/non/existing'], config_path='tests/fixtures/config.yml'))
+        img.above_watermark().should.be.false
+
+    def test_rm_out_of_window_is_deferred(self):
+        img = self.getImage(inspect=dict(Id='someId'))
+        img.Deferred = mock.Mock()
+        img.removal_delay = mock.Mock(return_value=60)
+        self.client.remove_image = mock.Mock()
+        self.client.inspect_image.reset_mock()
+        img.rm()
+        img.Deferred.defer.assert_called_once_with(img, 60)
+        self.client.inspect_image.assert_not_called()
+        self.client.remove_image.assert_not_called()
+
+    def test_rm_hands_prunable_images_to_pruner(self):
+        img = self.getImage(inspect=dict(Id='someId'))
+        img.Pruner = mock.Mock()
+        img.Pruner.accepts = mock.Mock(return_value=True)
+        self.client.remove_image = mock.Mock()
+        self.client.inspect_image.reset_mock()
+        img.rm()
+        img.Pruner.add.assert_called_once_with(img)
+        self.client.inspect_image.assert_not_called()
+
+        img.rm(prune=False)
+        img.Pruner.add.call_count.should.be.eql(1)
+        self.client.remove_image.assert_called_once_with('someId')
+
+    def test_schedule_rm_accounts_elapsed_time(self):
+        img = self.getImage()
+        img.get_grace_times = mock.Mock(return_value=[10])
+        img.Timer = mock.Mock()
+        img.schedule_rm(4)
+        img.Timer.assert_called_once_with(6, img.rm)
+        img.grace_seconds.should.be.eql(10)
+
+        img.cancel_rm()
+        img.grace_seconds.should.be(None)
+        img.Timer.reset_mock()
+        img.schedule_rm(15)
+        img.Timer.assert_called_once_with(0, img.rm)
+
+    def test_update_grace_time_reschedules_changed_grace_times(self):
+        img = self.getImage()
+        img.get_grace_times = mock.Mock(return_value=[10])
+        img.Timer = mock.Mock()
+        img.schedule_rm()
+        img.Timer.reset_mock()
+
+        img.update_grace_time()
+        img.Timer.assert_not_called()
+
+        img.get_grace_times.return_value = [100]
+        img.update_grace_time()
+        img.Timer.call_count.should.be.eql(1)
+        img.Timer.call_args[0][0].should.be.within(99, 100)
+        img.grace_seconds.should.be.eql(100)
+
+    def test_update_grace_time_schedules_finite_grace_times(self):
+        img = self.getImage()
+        img.get_grace_times = mock.Mock(return_value=[-1])
+        img.Timer = mock.Mock()
+        img.schedule_rm()
+        img.Timer.assert_not_called()
+        img.get_grace_times.return_value = [10]
+        img.update_grace_time()
+        img.Timer.assert_called_once_with(10, img.rm)
+
+    def test_update_grace_time_ignores_used_images(self):
+        img = self.getImage()
+        img.add('container')
+        img.Timer = mock.Mock()
+        img.update_grace_time()
+        img.Timer.assert_not_called()
+
+    def test_ref(self):
+        img = self.getImage(inspect=dict(Id='sha256:0123456789abcdef', RepoTags=['repo:tag', 'other:tag']))
+        img.ref.should.be.eql('Image<0123456789ab repo:tag>')
+        img = self.getImage(inspect=dict(Id='0123456789abcdef'))
+        img.ref.should.be.eql('Image<0123456789ab <none>>')
+
+    def test_get_policies(self):
+        config = {
+            'images': {
+                'ci/*': {'grace_time': '1h'},
+                'ci/app*': {'grace_time': '2h'},
+            },
+        }
+        img = self.getImage(config=config)
+        img.get_policies.when.called_with(['ci/app:1']).should.return_value(['ci/*', 'ci/app*'])
+        img.get_policies.when.called_with(['other']).should.return_value(['default'])
+        img = self.getImage(config=config, inspect={'Config': {'Labels': {'com.caduc.image.grace_time': '1s'}}})
+        img.get_policies.when.called_with(['ci/app:1']).should.return_value(['label:com.caduc.image.grace_time'])
+
+    def test_rm_records_audit_entry(self):
+        img = self.getImage(inspect=dict(Id='someId', RepoTags=['tag1'], Size=100))
+        img.Timer = mock.Mock()
+        img.Audit = mock.Mock()
+        img.reclaimable_size = mock.Mock(return_value=50)
+        img.get_grace_times = mock.Mock(return_value=['1h'])
+        img.schedule_rm()
+        self.client.remove_image = mock.Mock()
+        img.rm()
+        img.Audit.record.assert_called_once_with('removed',
+            id='someId',
+            tags=['tag1'],
+            size=100,
+            reclaimed=50,
+            grace_time='1h',
+            grace_seconds=3600,
+            policies=['default'],
+            unused_seconds=mock.ANY,
+            forced=False,
+        )
+
+        img.Audit.reset_mock()
+        self.client.remove_image = mock.Mock(side_effect=docker.errors.NotFound('gone'))
+        img.rm()
+        img.Audit.record.assert_not_called()
+
+    def test_rm_records_image_deleted_with_its_last_tag(self):
+        images = mock.Mock()
+        img = self.getImage(images=images, inspect=dict(Id='someId', RepoTags=['ci:1', 'ci:latest'], Size=100))
+        img.Timer = mock.Mock()
+        img.Audit = mock.Mock()
+        img.reclaimable_size = mock.Mock(return_value=100)
+        # docker rmi semantics: removing the last tag deletes the image
+        store = dict(someId=set(['ci:1', 'ci:latest']))
+        lock = threading.Lock()
+        def remove_image(name, **kwds):
+            with lock:
+                if name in store:
+                    del store[name]
+                    return
+                for image_id, tags in list(store.items()):
+                    if name in tags:
+                        tags.discard(name)
+                        if not tags:
+                            del store[image_id]
+                        return
+            raise docker.errors.NotFound(name)
+        self.client.remove_image = mock.Mock(side_effect=remove_image)
+        img.rm()
+        store.should.be.eql({})
+        img.Audit.record.assert_called_once_with('removed',
+            id='someId', tags=['ci:1', 'ci:latest'], size=100, reclaimed=100, grace_time=mock.ANY,
+            grace_seconds=mock.ANY, policies=['default'], unused_seconds=mock.ANY, forced=False)
+        images.pop.assert_called_once_with('someId')
+
+    def test_rm_waits_for_removal_budget_before_untagging(self):
+        img = self.getImage(inspect=dict(Id='someId', RepoTags=['tag1'], Size=1024))
+        img.Timer = mock.Mock()
+        calls = mock.Mock()
+        img.RmLimiter = calls.limiter
+        self.client.remove_image = calls.remove_image
+        img.rm()
+        calls.mock_calls.should.be.eql([
+            mock.call.limiter.acquire(1024),
+            mock.call.remove_image('tag1'),
+            mock.call.remove_image('someId'),
+        ])
+
+    def test_rm_does_not_untag_image_used_again(self):
+        img = self.getImage(inspect=dict(Id='someId', RepoTags=['tag1']))
+        img.Timer = mock.Mock()
+        img.RmLimiter = mock.Mock()
+        img.RmLimiter.acquire.side_effect = lambda size: super(Image, img).add('container')
+        self.client.remove_image = mock.Mock()
+        img.rm()
+        self.client.remove_image.assert_not_called()
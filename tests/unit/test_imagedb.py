@@ -0,0 +1,72 @@
+import caduc.imagedb
+import caduc.layers
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import sure
+
+class TestImageDB(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'image', 'overlay2')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, content, *path):
+        path = os.path.join(self.path, *path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def add_image(self, hex_id, diff_ids, parent=None, labels=None, sizes=()):
+        self.write(json.dumps({
+            'config': {'Labels': labels} if labels is not None else {},
+            'created': '2018-01-01T00:00:00Z',
+            'rootfs': {'type': 'layers', 'diff_ids': diff_ids},
+            'history': [],
+        }), 'imagedb', 'content', 'sha256', hex_id)
+        if parent:
+            self.write(parent, 'imagedb', 'metadata', 'sha256', hex_id, 'parent')
+        for chain_id, size in zip(caduc.layers.chain_ids(diff_ids), sizes):
+            self.write(str(size), 'layerdb', 'sha256', chain_id.split(':')[1], 'size')
+
+    def test_inspect(self):
+        self.add_image('aaa', ['sha256:l1'], sizes=[10])
+        self.add_image('bbb', ['sha256:l1', 'sha256:l2'], parent='sha256:aaa', labels={'team': 'ci'}, sizes=[10, 5])
+        self.write(json.dumps({'Repositories': {'app': {
+            'app:1': 'sha256:bbb',
+            'app@sha256:digest': 'sha256:bbb',
+        }}}), 'repositories.json')
+        db = caduc.imagedb.ImageDB(self.root)
+        details = db.inspect('sha256:bbb')
+        details['Id'].should.be.eql('sha256:bbb')
+        details['Parent'].should.be.eql('sha256:aaa')
+        details['RepoTags'].should.be.eql(['app:1'])
+        details['RepoDigests'].should.be.eql(['app@sha256:digest'])
+        details['Config']['Labels'].should.be.eql({'team': 'ci'})
+        details['Size'].should.be.eql(15)
+        details['RootFS']['Layers'].should.be.eql(['sha256:l1', 'sha256:l2'])
+
+        details = db.inspect('aaa')
+        details['Parent'].should.be.eql('')
+        details['RepoTags'].should.be.eql([])
+        details['Config']['Labels'].should.be(None)
+        details['Size'].should.be.eql(10)
+
+        db.inspect.when.called_with('sha256:unknown').should.throw(KeyError)
+
+    def test_images(self):
+        self.add_image('aaa', ['sha256:l1'])
+        self.add_image('bbb', ['sha256:l2'])
+        db = caduc.imagedb.ImageDB(self.root, 'overlay2')
+        sorted(image['Id'] for image in db.images()).should.be.eql(['sha256:aaa', 'sha256:bbb'])
+
+    def test_driver_must_be_unique(self):
+        os.makedirs(os.path.join(self.root, 'image', 'aufs'))
+        os.makedirs(self.path)
+        caduc.imagedb.ImageDB.when.called_with(self.root).should.throw(OSError)
@@ -1,8 +1,13 @@
+import caduc.containers
+import caduc.image
 import caduc.images
 import caduc.dicts
+import docker.errors
 import faker
+import random
 import six
 import sure
+import threading
 import unittest
 
 from .. import mock
@@ -25,9 +30,62 @@ class TestImages(unittest.TestCase):
     def test_instanciate(self):
         images = self.getImages()
         image = mock.Mock()
+        image.id = 'some.item'
+        image.details = {}
         caduc.images.Image = mock.Mock(return_value=image)
         images.instanciate('some.item')
-        caduc.images.Image.assert_called_once_with(self.config, images, self.getClient, 'some.item', self.timeout)
+        caduc.images.Image.assert_called_once_with(self.config, images, self.getClient, 'some.item', self.timeout, details=None)
+
+        caduc.images.Image.reset_mock()
+        images.instanciate('some.item', dict(Id='some.item'))
+        caduc.images.Image.assert_called_once_with(self.config, images, self.getClient, 'some.item', self.timeout, details=dict(Id='some.item'))
+
+    @mock.patch('caduc.image.Image.Timer', new=mock.Mock())
+    def test_bootstrap_from_store(self):
+        self.client = mock.Mock()
+        self.client.images = mock.Mock(return_value=[])
+        store = mock.Mock()
+        base = dict(Id='base', Parent='', RepoTags=['base:1'], Config={'Labels': None})
+        child = dict(Id='child', Parent='base', RepoTags=None, Config={'Labels': None})
+        store.images = mock.Mock(return_value=[child, base])
+        store.inspect = mock.Mock(side_effect=lambda item: dict(base=base, child=child)[item])
+        images = caduc.images.Images({}, self.getClient, store=store)
+        sorted(images.keys()).should.be.eql(['base', 'child'])
+        images['base'].children.should.be.eql(set(['child']))
+        self.client.images.assert_not_called()
+        self.client.inspect_image.assert_not_called()
+        images.store.should.be(None)
+
+    @mock.patch('caduc.images.Image', new=caduc.image.Image)
+    @mock.patch('caduc.image.Image.Timer', new=mock.Mock())
+    def test_parent_loaded_again_after_its_removal_is_tracked(self):
+        base = dict(Id='base', Parent='', RepoTags=['base:1'], Config={'Labels': None})
+        child = dict(Id='child', Parent='base', RepoTags=['app:1'], Config={'Labels': None})
+        details = dict(base=base)
+        def inspect_image(item):
+            try:
+                return details[item]
+            except KeyError:
+                raise docker.errors.NotFound(item)
+        self.client = mock.Mock()
+        self.client.images = mock.Mock(side_effect=lambda all=False: list(details.values()))
+        self.client.inspect_image = mock.Mock(side_effect=inspect_image)
+        images = caduc.images.Images({}, self.getClient)
+        images.forget('base')
+        # docker load brings the image back with the same id, then a child is built on it
+        details['child'] = child
+        images.add('child')
+        sorted(images.keys()).should.be.eql(['base', 'child'])
+        images['base'].children.should.be.eql(set(['child']))
+
+    @mock.patch('caduc.image.Image.Timer', new=mock.Mock())
+    def test_bootstrap_falls_back_to_api(self):
+        self.client = mock.Mock()
+        self.client.images = mock.Mock(return_value=[])
+        store = mock.Mock()
+        store.images = mock.Mock(side_effect=OSError())
+        images = caduc.images.Images({}, self.getClient, store=store)
+        self.client.images.assert_called_once_with(all=True)
 
     def test_list_items(self):
         images = self.getImages()
@@ -75,3 +133,215 @@ class TestImages(unittest.TestCase):
         images.update_timers()
         for img in six.itervalues(img_mocks):
             img.update_timer.assert_called_once_with()
+
+    def test_layers_are_indexed(self):
+        images = self.getImages()
+        image = mock.Mock()
+        image.id = 'some.id'
+        image.details = {'Size': 10, 'RootFS': {'Layers': ['l1']}}
+        orig = caduc.images.Image
+        try:
+            caduc.images.Image = mock.Mock(return_value=image)
+            images.instanciate('some.id')
+        finally:
+            caduc.images.Image = orig
+        images.layers.unique_size('some.id').should.be.eql(10)
+
+        pop = caduc.dicts.SyncDict.pop
+        try:
+            caduc.dicts.SyncDict.pop = mock.Mock(return_value = image)
+            images.pop('some.id')
+        finally:
+            caduc.dicts.SyncDict.pop = pop
+        ('some.id' in images.layers).should.be.false
+
+    def test_reload_config(self):
+        images = self.getImages()
+        img_mocks = {}
+        for key in ['a', 'b']:
+            img_mocks[key] = mock.Mock()
+        images.update(img_mocks)
+        images.reload_config()
+        for img in six.itervalues(img_mocks):
+            img.update_grace_time.assert_called_once_with()
+
+    def test_index_queries(self):
+        images = self.getImages()
+        image = mock.Mock()
+        image.id = 'sha256:abc'
+        image.details = {'RepoTags': ['app:1'], 'Config': {'Labels': {'team': 'ci'}}}
+        dict.__setitem__(images, image.id, image)
+        images.reindex(image)
+        images.resolve('app:1').should.be.eql('sha256:abc')
+        images.with_repository('app').should.be.eql([image])
+        images.with_label('team', 'ci').should.be.eql([image])
+        images.with_label('team', 'infra').should.be.eql([])
+
+class FakeClient(object):
+    """
+        An in memory docker daemon
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.image_store = {}
+        self.container_store = {}
+
+    def create_image(self, image_id, parent=None):
+        with self.lock:
+            self.image_store[image_id] = dict(Id=image_id, Parent=parent or '', RepoTags=None, Config={'Labels': None}, Size=1)
+
+    def create_container(self, container_id, image_id):
+        with self.lock:
+            if image_id not in self.image_store:
+                raise docker.errors.NotFound(image_id)
+            self.container_store[container_id] = dict(Id=container_id, Name=container_id, Image=image_id)
+
+    def inspect_image(self, image_id):
+        with self.lock:
+            try:
+                return dict(self.image_store[image_id])
+            except KeyError:
+                raise docker.errors.NotFound(image_id)
+
+    def inspect_container(self, container_id):
+        with self.lock:
+            try:
+                return dict(self.container_store[container_id])
+            except KeyError:
+                raise docker.errors.NotFound(container_id)
+
+    def remove_image(self, image_id, force=False):
+        with self.lock:
+            if image_id not in self.image_store:
+                raise docker.errors.NotFound(image_id)
+            if any(c['Image'] == image_id for c in self.container_store.values()) \
+                    or any(i['Parent'] == image_id for i in self.image_store.values()):
+                raise docker.errors.APIError('conflict: %s is in use' % image_id)
+            del self.image_store[image_id]
+
+    def remove_container(self, container_id):
+        with self.lock:
+            del self.container_store[container_id]
+
+    def images(self, all=False):
+        with self.lock:
+            return list(self.image_store.values())
+
+    def containers(self, all=False):
+        with self.lock:
+            return list(self.container_store.values())
+
+class NoTimer(object):
+    def __init__(self, *args, **kwds):
+        pass
+    def start(self):
+        pass
+    def cancel(self):
+        pass
+
+class TestInventoryConcurrency(unittest.TestCase):
+    Workers = 8
+    Iterations = 30
+
+    def setUp(self):
+        for obj in (caduc.image.Image, caduc.image.Image.Retries, caduc.image.Image.Deferred):
+            patch = mock.patch.object(obj, 'Timer', NoTimer)
+            patch.start()
+            self.addCleanup(patch.stop)
+        caduc.images.Image = caduc.image.Image
+        self.client = FakeClient()
+        for base in ('base-0', 'base-1'):
+            self.client.create_image(base)
+        self.images = caduc.images.Images({}, lambda: self.client)
+        self.containers = caduc.containers.Containers({}, lambda: self.client, self.images)
+        self.done = threading.Event()
+        self.errors = []
+
+    def churn(self, n):
+        rnd = random.Random(n)
+        for i in six.moves.range(self.Iterations):
+            image_id = 'image-%d-%d' % (n, i)
+            self.client.create_image(image_id, rnd.choice(['base-0', 'base-1']))
+            try:
+                self.images.add(image_id)
+            except KeyError:
+                # already removed by a timer
+                pass
+            container_ids = []
+            for j in six.moves.range(3):
+                container_id = 'container-%d-%d-%d' % (n, i, j)
+                try:
+                    self.client.create_container(container_id, rnd.choice([image_id, 'base-0', 'base-1']))
+                except docker.errors.NotFound:
+                    continue
+                self.containers.add(container_id)
+                container_ids.append(container_id)
+            self.images.update_timers()
+            # keep some containers and images around
+            for container_id in container_ids[i % 2:]:
+                self.client.remove_container(container_id)
+                self.containers.forget(container_id)
+            if i % 2:
+                try:
+                    self.client.remove_image(image_id)
+                except docker.errors.DockerException:
+                    continue
+                self.images.forget(image_id)
+
+    def remove(self, n):
+        # expired removals of the timer threads, racing the creation of images sharing their parent
+        rnd = random.Random(n + 100)
+        while not self.done.is_set():
+            with self.images.lock:
+                images = [image for image in self.images.values() if image.id.startswith('image-')]
+            if not images:
+                continue
+            image = rnd.choice(images)
+            if not image.in_use():
+                image.rm(prune=False)
+            if image.id not in self.client.image_store:
+                # the deletion event
+                self.images.forget(image.id)
+
+    def lookup(self, n):
+        # races instanciations with the churning threads
+        rnd = random.Random(-n)
+        while not self.done.is_set():
+            images = self.client.images()
+            try:
+                self.images[rnd.choice(images)['Id']]
+            except KeyError:
+                pass
+
+    def run_thread(self, target, n):
+        try:
+            target(n)
+        except Exception as e:
+            self.errors.append(e)
+
+    def test_stress(self):
+        churners = [threading.Thread(target=self.run_thread, args=(self.churn, n)) for n in six.moves.range(self.Workers)]
+        others = [threading.Thread(target=self.run_thread, args=(target, n))
+                  for target in (self.lookup, self.remove) for n in six.moves.range(4)]
+        for thread in churners + others:
+            thread.start()
+        for thread in churners:
+            thread.join()
+        self.done.set()
+        for thread in others:
+            thread.join()
+        self.errors.should.be.eql([])
+
+        # the inventory matches the daemon
+        set(self.images.keys()).should.be.eql(set(self.client.image_store))
+        set(self.containers.keys()).should.be.eql(set(self.client.container_store))
+        for image_id, image in self.images.items():
+            image.id.should.be.eql(image_id)
+            children = set(i['Id'] for i in self.client.images() if i['Parent'] == image_id)
+            image.children.should.be.eql(children)
+            containers = set(c['Id'] for c in self.client.containers() if c['Image'] == image_id)
+            set(container.id for container in image).should.be.eql(containers)
+            for container in image:
+                self.containers[container.id].should.be(container)
+            # only unused images are planned for removal
+            (image.event is None).should.be.eql(image.in_use())
@@ -0,0 +1,87 @@
+import sure
+import unittest
+
+from caduc.index import ImageIndex
+from caduc.index import full_id
+from caduc.index import normalize
+from caduc.index import repository
+
+def details(tags=None, digests=None, labels=None):
+    return {
+        'RepoTags': tags,
+        'RepoDigests': digests,
+        'Config': {'Labels': labels},
+    }
+
+class TestImageIndex(unittest.TestCase):
+
+    def getIndex(self):
+        index = ImageIndex()
+        index.add('sha256:abc123', details(['app:1', 'app:latest'], ['app@sha256:d1'], {'team': 'ci', 'tier': 'web'}))
+        index.add('sha256:abd456', details(['my.registry:5000/base/os:7'], labels={'team': 'infra'}))
+        index.add('sha256:ff0000', details(['<none>:<none>'], ['<none>@<none>']))
+        return index
+
+    def test_normalize(self):
+        normalize('app').should.be.eql('app:latest')
+        normalize('app:1').should.be.eql('app:1')
+        normalize('my.registry:5000/app').should.be.eql('my.registry:5000/app:latest')
+        normalize('app@sha256:d1').should.be.eql('app@sha256:d1')
+
+    def test_full_id(self):
+        full_id('sha256:' + 'ab' * 32).should.be.eql('sha256:' + 'ab' * 32)
+        full_id('ab' * 32).should.be.eql('sha256:' + 'ab' * 32)
+        full_id('abab').should.be.none
+        full_id('app:latest').should.be.none
+        full_id('sha256:' + 'AB' * 32).should.be.none
+
+    def test_repository(self):
+        repository('app:1').should.be.eql('app')
+        repository('my.registry:5000/base/os:7').should.be.eql('my.registry:5000/base/os')
+        repository('my.registry:5000/base/os').should.be.eql('my.registry:5000/base/os')
+        repository('app@sha256:d1').should.be.eql('app')
+
+    def test_resolve_names(self):
+        index = self.getIndex()
+        index.resolve('app:1').should.be.eql('sha256:abc123')
+        index.resolve('app').should.be.eql('sha256:abc123')
+        index.resolve('app@sha256:d1').should.be.eql('sha256:abc123')
+        index.resolve('my.registry:5000/base/os:7').should.be.eql('sha256:abd456')
+        index.resolve('app:2').should.be(None)
+        index.resolve('<none>:<none>').should.be(None)
+
+    def test_resolve_id_prefixes(self):
+        index = self.getIndex()
+        index.resolve('abc').should.be.eql('sha256:abc123')
+        index.resolve('sha256:abd').should.be.eql('sha256:abd456')
+        index.resolve('ff0000').should.be.eql('sha256:ff0000')
+        # ambiguous
+        index.resolve('ab').should.be(None)
+        index.resolve('abe').should.be(None)
+        index.resolve('zzz').should.be(None)
+
+    def test_repositories_and_labels(self):
+        index = self.getIndex()
+        index.by_repository('app').should.be.eql(set(['sha256:abc123']))
+        index.by_repository('my.registry:5000/base/os').should.be.eql(set(['sha256:abd456']))
+        index.by_label('team').should.be.eql(set(['sha256:abc123', 'sha256:abd456']))
+        index.by_label('team', 'ci').should.be.eql(set(['sha256:abc123']))
+        index.by_label('team', 'none').should.be.eql(set())
+
+    def test_updates(self):
+        index = self.getIndex()
+        # app:1 moves to another image
+        index.add('sha256:123456', details(['app:1']))
+        index.add('sha256:abc123', details(['app:latest']))
+        index.resolve('app:1').should.be.eql('sha256:123456')
+        index.resolve('app').should.be.eql('sha256:abc123')
+        index.by_repository('app').should.be.eql(set(['sha256:abc123', 'sha256:123456']))
+        index.by_label('team').should.be.eql(set(['sha256:abd456']))
+
+        index.remove('sha256:abc123')
+        index.resolve('app').should.be(None)
+        index.resolve('abc').should.be(None)
+        index.by_repository('app').should.be.eql(set(['sha256:123456']))
+        ('sha256:abc123' in index).should.be.false
+        len(index).should.be.eql(3)
+        index.remove('sha256:abc123')
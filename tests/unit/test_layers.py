@@ -0,0 +1,89 @@
+import hashlib
+import sure
+import unittest
+
+from caduc.layers import LayerIndex
+from caduc.layers import chain_ids
+
+def details(size, *layers):
+    return {'Size': size, 'RootFS': {'Type': 'layers', 'Layers': list(layers)}}
+
+class TestLayerIndex(unittest.TestCase):
+
+    def test_chain_ids(self):
+        list(chain_ids([])).should.be.eql([])
+        list(chain_ids(['sha256:a'])).should.be.eql(['sha256:a'])
+        expected = 'sha256:' + hashlib.sha256(b'sha256:a sha256:b').hexdigest()
+        list(chain_ids(['sha256:a', 'sha256:b'])).should.be.eql(['sha256:a', expected])
+
+    def test_unique_size_of_a_single_image(self):
+        index = LayerIndex()
+        index.add('img', details(100, 'l1', 'l2'))
+        index.unique_size('img').should.be.eql(100)
+        index.unique_size('unknown').should.be.eql(0)
+
+    def test_unique_size_excludes_parent_layers(self):
+        index = LayerIndex()
+        index.add('base', details(100, 'l1'))
+        index.add('app', details(150, 'l1', 'l2'))
+        index.add('tool', details(130, 'l1', 'l3'))
+        index.unique_size('base').should.be.eql(0)
+        index.unique_size('app').should.be.eql(50)
+        index.unique_size('tool').should.be.eql(30)
+
+    def test_same_layers_in_different_positions_are_not_shared(self):
+        index = LayerIndex()
+        index.add('a', details(100, 'l1', 'l2'))
+        index.add('b', details(100, 'l2', 'l1'))
+        index.unique_size('a').should.be.eql(100)
+        index.unique_size('b').should.be.eql(100)
+
+    def test_updates_invalidate_cached_sizes(self):
+        index = LayerIndex()
+        index.add('app', details(150, 'l1', 'l2'))
+        index.unique_size('app').should.be.eql(150)
+        # an image using the same base is pulled
+        index.add('tool', details(130, 'l1', 'l3'))
+        index.unique_size('app').should.be.eql(20)
+        # the base image itself is pulled, refining the estimate
+        index.add('base', details(100, 'l1'))
+        index.unique_size('app').should.be.eql(50)
+        index.unique_size('tool').should.be.eql(30)
+        index.remove('base')
+        index.unique_size('app').should.be.eql(20)
+        index.remove('tool')
+        index.unique_size('app').should.be.eql(150)
+        index.remove('app')
+        len(index).should.be.eql(0)
+        index.remove('app')
+
+    def test_child_addition_invalidates_parent(self):
+        index = LayerIndex()
+        index.add('base', details(100, 'l1'))
+        index.unique_size('base').should.be.eql(100)
+        index.add('app', details(150, 'l1', 'l2'))
+        index.unique_size('base').should.be.eql(0)
+        index.add('app2', details(160, 'l1', 'l2', 'l3'))
+        index.unique_size('app').should.be.eql(0)
+        index.unique_size('app2').should.be.eql(10)
+        index.remove('app2')
+        index.unique_size('app').should.be.eql(50)
+
+    def test_images_without_layers(self):
+        index = LayerIndex()
+        index.add('empty', {'Size': 10})
+        index.unique_size('empty').should.be.eql(10)
+        index.reclaimable_size(['empty']).should.be.eql(10)
+
+    def test_reclaimable_size_of_image_sets(self):
+        index = LayerIndex()
+        index.add('base', details(100, 'l1'))
+        index.add('app', details(150, 'l1', 'l2'))
+        index.add('tool', details(130, 'l1', 'l3'))
+        index.add('other', details(10, 'l4'))
+        index.reclaimable_size([]).should.be.eql(0)
+        index.reclaimable_size(['app']).should.be.eql(50)
+        index.reclaimable_size(['app', 'tool']).should.be.eql(80)
+        index.reclaimable_size(['app', 'base']).should.be.eql(50)
+        index.reclaimable_size(['app', 'tool', 'base']).should.be.eql(180)
+        index.reclaimable_size(['app', 'tool', 'base', 'other', 'unknown']).should.be.eql(190)
@@ -0,0 +1,30 @@
+import os
+import subprocess
+import sure
+import sys
+import unittest
+
+import caduc.lazy
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+
+class TestLazyModule(unittest.TestCase):
+
+    def test_module_is_imported_on_first_access(self):
+        module = caduc.lazy.LazyModule('json')
+        module._module.should.be.none
+        module.dumps([1]).should.be.eql('[1]')
+        module._module.should.be(sys.modules['json'])
+
+    def test_submodules_are_imported(self):
+        caduc.lazy.LazyModule('xml').dom.should.be(__import__('xml.dom').dom)
+
+    def test_missing_attribute(self):
+        module = caduc.lazy.LazyModule('json')
+        getattr.when.called_with(module, 'missing').should.throw(ImportError)
+
+    def test_cmd_import_has_no_side_effect(self):
+        code = "import signal, sys, caduc.cmd; " \
+               "assert signal.getsignal(signal.SIGINT) is signal.default_int_handler; " \
+               "assert not set(['docker', 'requests', 'yaml']) & set(sys.modules), sorted(sys.modules)"
+        subprocess.check_call([sys.executable, '-c', code], cwd=ROOT)
@@ -0,0 +1,35 @@
+import caduc.lease
+import unittest
+import sure
+
+class TestLeases(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.
+
+    def clock(self):
+        return self.now
+
+    def test_remaining(self):
+        leases = caduc.lease.Leases(clock=self.clock)
+        leases.remaining('key').should.be.eql(0)
+        leases.grant('key', 60).should.be.eql(1060)
+        self.now += 20
+        leases.remaining('key').should.be.eql(40)
+        ('key' in leases).should.be.true
+        self.now += 40
+        ('key' in leases).should.be.false
+        len(leases).should.be.eql(0)
+
+    def test_grant_never_shortens_a_lease(self):
+        leases = caduc.lease.Leases(clock=self.clock)
+        leases.grant('key', 60)
+        leases.grant('key', 10).should.be.eql(1060)
+        leases.grant('key', 100).should.be.eql(1100)
+
+    def test_release(self):
+        leases = caduc.lease.Leases(clock=self.clock)
+        leases.grant('key', 60)
+        leases.release('key')
+        leases.release('other')
+        ('key' in leases).should.be.false
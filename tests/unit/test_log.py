@@ -0,0 +1,38 @@
+import logging
+import sure
+import unittest
+
+from .. import mock
+
+from caduc import log
+from caduc.image import Image
+
+class TestLog(unittest.TestCase):
+
+    def test_get_logger_is_named_after_subsystem(self):
+        log.getLogger(Image).name.should.be.eql('caduc.image.Image')
+        log.getLogger(log.SamplingFilter({})).name.should.be.eql('caduc.log.SamplingFilter')
+
+    def record(self, name, level=logging.DEBUG):
+        return logging.LogRecord(name, level, __file__, 1, 'message %s', (mock.Mock(), ), None)
+
+    def test_sampling_filter(self):
+        sampler = log.SamplingFilter({'caduc.watcher': 3, 'caduc.watcher.Watcher': '2', 'caduc.image': 1})
+        [sampler.filter(self.record('caduc.watcher.Watcher')) for _ in range(4)].should.be.eql([True, False, True, False])
+        [sampler.filter(self.record('caduc.watcher.Other')) for _ in range(4)].should.be.eql([True, False, False, True])
+        [sampler.filter(self.record('caduc.image.Image')) for _ in range(2)].should.be.eql([True, True])
+        [sampler.filter(self.record('caduc.watchers')) for _ in range(2)].should.be.eql([True, True])
+        [sampler.filter(self.record('caduc.watcher', logging.INFO)) for _ in range(2)].should.be.eql([True, True])
+
+    def test_configure(self):
+        logger = logging.Logger('test')
+        handler = logging.NullHandler()
+        logger.addHandler(handler)
+        log.configure({}, logger).should.be(None)
+        handler.filters.should.be.empty
+
+        config = mock.Mock()
+        config.get = mock.Mock(return_value={'caduc.watcher': 10})
+        sampler = log.configure(config, logger)
+        config.get.assert_called_once_with('logging.sampling')
+        handler.filters.should.be.eql([sampler])
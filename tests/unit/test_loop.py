@@ -0,0 +1,73 @@
+import caduc.loop
+import threading
+import unittest
+import sure
+
+from .. import mock
+
+class TestLoop(unittest.TestCase):
+
+    def run_loop(self, loop):
+        thread = threading.Thread(target=loop.run)
+        thread.start()
+        return thread
+
+    def test_inline(self):
+        callback = mock.Mock()
+        caduc.loop.Inline().submit(lambda a, b: a + b, (1, 2), callback)
+        callback.assert_called_once_with(3)
+
+    def test_commands_run_in_order_on_owner_thread(self):
+        loop = caduc.loop.Loop(workers=1)
+        calls = []
+        for i in range(5):
+            loop.call(lambda i: calls.append((i, threading.current_thread())), i)
+        loop.stop()
+        thread = self.run_loop(loop)
+        thread.join(5)
+        [i for i, _ in calls].should.be.eql(list(range(5)))
+        set(t for _, t in calls).should.be.eql(set([thread]))
+
+    def test_blocking_calls_run_in_workers(self):
+        loop = caduc.loop.Loop(workers=2)
+        done = threading.Event()
+        threads = {}
+        def blocking(value):
+            threads['blocking'] = threading.current_thread()
+            return value * 2
+        def callback(result):
+            threads['callback'] = threading.current_thread()
+            threads['result'] = result
+            done.set()
+        thread = self.run_loop(loop)
+        loop.submit(blocking, (21,), callback)
+        done.wait(5).should.be.true
+        loop.stop()
+        thread.join(5)
+        threads['result'].should.be.eql(42)
+        threads['callback'].should.be(thread)
+        threads['blocking'].should_not.be(thread)
+        loop.threads.should.be.eql([])
+
+    def test_failures_do_not_stop_the_loop(self):
+        loop = caduc.loop.Loop(workers=1)
+        callback = mock.Mock()
+        def fail():
+            raise ValueError()
+        loop.call(fail)
+        loop.submit(fail, (), callback)
+        loop.call(callback, 'after')
+        loop.stop()
+        self.run_loop(loop).join(5)
+        callback.assert_called_once_with('after')
+
+    def test_timer_posts_to_loop(self):
+        loop = caduc.loop.Loop(workers=1)
+        callback = mock.Mock()
+        timer = loop.timer(0, callback, ('arg',))
+        timer.start()
+        timer.join(5)
+        callback.assert_not_called()
+        loop.stop()
+        self.run_loop(loop).join(5)
+        callback.assert_called_once_with('arg')
@@ -0,0 +1,92 @@
+import os
+import shutil
+import signal
+import six
+import sure
+import tempfile
+import threading
+import time
+import unittest
+
+from .. import mock
+
+from caduc.profiling import Instrumented
+from caduc.profiling import Profiler
+from caduc.profiling import Sampler
+from caduc.profiling import Stats
+
+class TestStats(unittest.TestCase):
+
+    def test_counters_and_timings(self):
+        stats = Stats()
+        stats.incr('counter')
+        stats.incr('counter', 2)
+        stats.record('timing', 0.1)
+        stats.record('timing', 0.3)
+        stats.counters['counter'].should.be.eql(3)
+        stats.timings['timing'][0].should.be.eql(2)
+        stats.timings['timing'][1].should.be.eql(0.4, epsilon=1e-9)
+        stats.timings['timing'][2].should.be.eql(0.3)
+        out = six.StringIO()
+        stats.dump(out)
+        out.getvalue().should.contain('timing\t2\t400.0\t200.000\t300.0')
+        out.getvalue().should.contain('counter\t3')
+
+class TestInstrumented(unittest.TestCase):
+
+    def test_api_calls_are_timed(self):
+        stats = Stats()
+        client = mock.Mock()
+        client.inspect_image = mock.Mock(return_value='inspect')
+        client.remove_image = mock.Mock(side_effect=ValueError)
+        client.base_url = 'http://docker'
+        instrumented = Instrumented(stats, lambda: client)
+        instrumented().inspect_image('some.id').should.be.eql('inspect')
+        instrumented().remove_image.when.called_with('some.id').should.throw(ValueError)
+        instrumented().base_url.should.be.eql('http://docker')
+        client.inspect_image.assert_called_once_with('some.id')
+        stats.timings['api.inspect_image'][0].should.be.eql(1)
+        stats.timings['api.remove_image'][0].should.be.eql(1)
+
+class TestSampler(unittest.TestCase):
+
+    def test_sample_records_other_threads(self):
+        event = threading.Event()
+        def waiting_for_the_sampler():
+            event.wait()
+        thread = threading.Thread(target=waiting_for_the_sampler)
+        thread.start()
+        try:
+            sampler = Sampler(interval=0.001)
+            sampler.sample(0.05)
+        finally:
+            event.set()
+            thread.join()
+        out = six.StringIO()
+        sampler.write(out)
+        out.getvalue().should.contain('waiting_for_the_sampler')
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_dump_writes_stats_and_stacks(self):
+        stats = Stats()
+        stats.incr('timer.scheduled')
+        profiler = Profiler(stats, self.tmpdir, duration=0.01)
+        prefix = profiler.dump()
+        open(prefix + '.stats').read().should.contain('timer.scheduled\t1')
+        os.path.exists(prefix + '.stacks').should.be.true
+
+    def test_install_registers_signal_handler(self):
+        profiler = Profiler(Stats(), self.tmpdir)
+        orig = signal.signal(signal.SIGUSR2, signal.SIG_DFL)
+        try:
+            profiler.install(signal.SIGUSR2)
+            signal.getsignal(signal.SIGUSR2).should.be.eql(profiler.on_signal)
+        finally:
+            signal.signal(signal.SIGUSR2, orig)
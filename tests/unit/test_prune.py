@@ -0,0 +1,132 @@
+import caduc.lease
+import caduc.loop
+import caduc.prune
+import threading
+import unittest
+import sure
+
+from .. import mock
+
+class Images(dict):
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.forget = mock.Mock()
+
+class TestPruner(unittest.TestCase):
+
+    def setUp(self):
+        self.images = Images()
+        self.client = mock.Mock()
+        self.client.prune_images = mock.Mock(return_value={'ImagesDeleted': [], 'SpaceReclaimed': 0})
+        self.pruner = caduc.prune.Pruner()
+        self.pruner.Timer = mock.Mock()
+        self.pruner.configure(self.getConfig({'removals.prune': {'min_batch': 2}}))
+        self.leases = caduc.lease.Leases()
+
+    def mockImage(self, id, created='2018-01-01T00:00:00.123Z', tags=None, labels=None, used=False):
+        image = mock.Mock()
+        image.id = id
+        image.details = dict(Id=id, RepoTags=tags, Created=created, Size=10, Config={'Labels': labels})
+        image.children = set()
+        image.in_use = mock.Mock(return_value=used)
+        image.images = self.images
+        image.client = self.client
+        image.Executor = caduc.loop.Inline()
+        image.RmSemaphore = threading.Semaphore()
+        image.Leases = self.leases
+        self.images[id] = image
+        return image
+
+    def getConfig(self, values):
+        config = mock.Mock()
+        config.get = mock.Mock(side_effect=lambda key: values.get(key, None))
+        return config
+
+    def test_configure(self):
+        pruner = caduc.prune.Pruner()
+        pruner.configure(self.getConfig({}))
+        pruner.enabled.should.be.false
+        pruner.configure(self.getConfig({'removals.prune': True}))
+        pruner.enabled.should.be.true
+        pruner.min_batch.should.be.eql(10)
+        pruner.configure(self.getConfig({'removals.prune': {'delay': '1', 'label': 'ci'}}))
+        pruner.delay.should.be.eql(1.)
+        pruner.label.should.be.eql('ci')
+
+    def test_accepts_dangling_images(self):
+        self.pruner.accepts(self.mockImage('a')).should.be.true
+        self.pruner.accepts(self.mockImage('b', tags=['<none>:<none>'])).should.be.true
+        self.pruner.accepts(self.mockImage('c', tags=['app:1'])).should.be.false
+        self.pruner.accepts(self.mockImage('d', used=True)).should.be.false
+        self.pruner.label = 'ci=true'
+        self.pruner.accepts(self.mockImage('e', labels={'ci': 'true'})).should.be.true
+        self.pruner.accepts(self.mockImage('f', labels={'ci': 'false'})).should.be.false
+        self.pruner.enabled = False
+        self.pruner.accepts(self.mockImage('g')).should.be.false
+
+    def test_leased_images_are_not_pruned(self):
+        a = self.mockImage('a')
+        b = self.mockImage('b')
+        c = self.mockImage('c')
+        self.leases.grant('a', 60)
+        self.pruner.accepts(a).should.be.false
+        self.pruner.add(b)
+        self.pruner.add(c)
+        self.leases.grant('c', 60)
+        self.pruner.flush()
+        self.client.prune_images.assert_not_called()
+        b.rm.assert_called_once_with(prune=False)
+        c.rm.assert_called_once_with(prune=False)
+
+    def test_batch_is_pruned(self):
+        a = self.mockImage('a', created='2018-01-01T00:00:00Z')
+        b = self.mockImage('b', created='2018-01-01T00:00:10Z')
+        # tagged, used or newer images do not prevent pruning
+        self.mockImage('tagged', tags=['app:1'])
+        self.mockImage('used', used=True)
+        self.mockImage('newer', created='2018-01-02T00:00:00Z')
+        self.client.prune_images.return_value = {'ImagesDeleted': [{'Untagged': 'x'}, {'Deleted': 'a'}], 'SpaceReclaimed': 10}
+        self.pruner.add(a)
+        self.pruner.add(b)
+        self.pruner.Timer.call_count.should.be.eql(1)
+        self.pruner.flush()
+        self.client.prune_images.assert_called_once_with(filters={'dangling': True, 'until': '1514764811'})
+        a.audit_rm.assert_called_once_with([], False)
+        self.images.forget.assert_called_once_with('a')
+        a.rm.assert_not_called()
+        b.rm.assert_called_once_with(prune=False)
+        len(self.pruner).should.be.eql(0)
+
+    def test_not_pruned_when_other_images_would_be_removed(self):
+        a = self.mockImage('a', created='2018-01-01T00:00:10Z')
+        b = self.mockImage('b', created='2018-01-01T00:00:10Z')
+        self.mockImage('older', created='2018-01-01T00:00:00Z')
+        self.pruner.add(a)
+        self.pruner.add(b)
+        self.pruner.flush()
+        self.client.prune_images.assert_not_called()
+        a.rm.assert_called_once_with(prune=False)
+        b.rm.assert_called_once_with(prune=False)
+
+    def test_small_batches_are_removed_one_by_one(self):
+        a = self.mockImage('a')
+        self.pruner.add(a)
+        self.pruner.discard(self.mockImage('b'))
+        self.pruner.flush()
+        self.client.prune_images.assert_not_called()
+        a.rm.assert_called_once_with(prune=False)
+
+    def test_prune_failure_falls_back(self):
+        a = self.mockImage('a')
+        b = self.mockImage('b')
+        self.client.prune_images.side_effect = AttributeError('prune_images')
+        self.pruner.add(a)
+        self.pruner.add(b)
+        self.pruner.flush()
+        a.rm.assert_called_once_with(prune=False)
+        b.rm.assert_called_once_with(prune=False)
+
+    def test_created_timestamp(self):
+        caduc.prune.created_timestamp('1970-01-01T00:01:00.123456789Z').should.be.eql(60)
+        caduc.prune.created_timestamp(None).should.be(None)
+        caduc.prune.created_timestamp('garbage').should.be(None)
@@ -0,0 +1,72 @@
+import sure
+import unittest
+
+from .. import mock
+
+from caduc.ratelimit import RateLimiter
+from caduc.ratelimit import TokenBucket
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.
+        self.sleeps = []
+    def __call__(self):
+        return self.now
+    def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_burst_is_not_delayed(self):
+        clock = FakeClock()
+        bucket = TokenBucket(2, burst=3, clock=clock, sleep=clock.sleep)
+        for _ in range(3):
+            bucket.consume().should.be.eql(0)
+        clock.sleeps.should.be.empty
+
+    def test_consumers_over_budget_are_spread(self):
+        clock = FakeClock()
+        bucket = TokenBucket(2, clock=clock, sleep=clock.sleep)
+        bucket.consume().should.be.eql(0)
+        bucket.consume().should.be.eql(0)
+        bucket.consume().should.be.eql(0.5)
+        bucket.consume().should.be.eql(0.5)
+        clock.now.should.be.eql(1.)
+
+    def test_refill_is_capped_by_burst(self):
+        clock = FakeClock()
+        bucket = TokenBucket(1, burst=2, clock=clock, sleep=clock.sleep)
+        clock.now = 100
+        bucket.consume(2).should.be.eql(0)
+        bucket.consume().should.be.eql(1)
+
+    def test_big_consumers_pay_their_debt(self):
+        clock = FakeClock()
+        bucket = TokenBucket(100, clock=clock, sleep=clock.sleep)
+        bucket.consume(300).should.be.eql(2)
+        bucket.consume(50).should.be.eql(0.5)
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_disabled_limiter_never_waits(self):
+        limiter = RateLimiter()
+        bool(limiter).should.be.false
+        limiter.acquire(10**12).should.be.eql(0)
+
+    def test_limits_removals_and_bytes(self):
+        clock = FakeClock()
+        limiter = RateLimiter(1, 100, clock=clock, sleep=clock.sleep)
+        bool(limiter).should.be.true
+        limiter.acquire(50).should.be.eql(0)
+        # one removal per second, the bytes budget refilled meanwhile
+        limiter.acquire(50).should.be.eql(1)
+        # 300 bytes at 100 bytes/s
+        limiter.acquire(300).should.be.eql(1 + 2)
+
+    def test_from_config(self):
+        config = mock.Mock()
+        config.get = mock.Mock(side_effect=lambda key: {'removals.rate': '0.5'}.get(key))
+        limiter = RateLimiter.from_config(config)
+        len(limiter.buckets).should.be.eql(1)
+        limiter.buckets[0][0].rate.should.be.eql(0.5)
@@ -0,0 +1,82 @@
+import os
+import shutil
+import signal
+import sure
+import tempfile
+import unittest
+
+from .. import mock
+
+from caduc.config import Config
+from caduc.reload import ConfigReloader
+
+class TestConfigReloader(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'config.yml')
+        self.write('images:\n    a/*:\n        grace_time: 1h\n')
+        self.config = Config(['removals.rate=1'], self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, content, mtime=None):
+        with open(self.path, 'w') as f:
+            f.write(content)
+        if mtime is not None:
+            os.utime(self.path, (mtime, mtime))
+
+    def test_reload_updates_config_in_place(self):
+        listener = mock.Mock()
+        reloader = ConfigReloader(self.config, [listener])
+        self.write('images:\n    b/*:\n        grace_time: 2h\n')
+        reloader.reload().should.be.true
+        self.config.get('images').should.be.eql({'b/*': {'grace_time': '2h'}})
+        self.config.get('removals.rate').should.be.eql('1')
+        listener.assert_called_once_with()
+
+    def test_reload_swaps_the_config_at_once(self):
+        images = self.config.get('images')
+        seen = []
+        def update(other):
+            # the new tree is complete before the current one changes
+            seen.append(self.config.get('images.a/*.grace_time'))
+            return Config.update(self.config, other)
+        self.write('images:\n    a/*:\n        grace_time: 2h\n')
+        with mock.patch.object(self.config, 'update', side_effect=update):
+            ConfigReloader(self.config).reload().should.be.true
+        seen.should.be.eql([])
+        self.config.get('images.a/*.grace_time').should.be.eql('2h')
+        # readers walking the previous tree are not affected
+        images.should.be.eql({'a/*': {'grace_time': '1h'}})
+
+    def test_reload_keeps_config_on_error(self):
+        listener = mock.Mock()
+        reloader = ConfigReloader(self.config, [listener])
+        self.write('images: [\n')
+        reloader.reload().should.be.false
+        self.config.get('images').should.be.eql({'a/*': {'grace_time': '1h'}})
+        listener.assert_not_called()
+        self.write('images:\n    a/*:\n        window: 25:00-06:00\n')
+        reloader.reload().should.be.false
+        self.config.get('images').should.be.eql({'a/*': {'grace_time': '1h'}})
+
+    def test_check_reloads_modified_file(self):
+        self.write('images:\n    a/*:\n        grace_time: 1h\n', 1000)
+        reloader = ConfigReloader(self.config)
+        reloader.reload = mock.Mock(return_value=True)
+        reloader.check().should.be.false
+        self.write('images:\n    a/*:\n        grace_time: 2h\n', 2000)
+        reloader.check().should.be.true
+        reloader.check().should.be.false
+        reloader.reload.assert_called_once_with()
+
+    def test_install_registers_signal_handler(self):
+        reloader = ConfigReloader(self.config)
+        orig = signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+        try:
+            reloader.install(signal.SIGUSR1)
+            signal.getsignal(signal.SIGUSR1).should.be.eql(reloader.on_signal)
+        finally:
+            signal.signal(signal.SIGUSR1, orig)
@@ -0,0 +1,61 @@
+import six
+import sure
+import unittest
+
+from .. import mock
+
+from caduc.layers import LayerIndex
+from caduc.report import removal_delays
+from caduc.report import report
+
+class Images(dict):
+    def __init__(self):
+        super(Images, self).__init__()
+        self.layers = LayerIndex()
+
+class TestReport(unittest.TestCase):
+
+    def mockImage(self, id, grace=10, size=0, parent=None, children=(), containers=False, tags=None, layers=()):
+        image = mock.Mock()
+        image.id = id
+        image.parentId = parent
+        image.children = set(children)
+        image.__bool__ = mock.Mock(return_value=containers)
+        image.__nonzero__ = image.__bool__
+        image.get_grace_time = mock.Mock(return_value=(grace, str(grace)))
+        image.details = {'Id': id, 'Size': size, 'RepoTags': tags, 'RootFS': {'Layers': list(layers)}}
+        return image
+
+    def getImages(self):
+        images = Images()
+        for image in [
+                self.mockImage('base', grace=100, size=100, children=['app', 'tool'], layers=['l1']),
+                self.mockImage('app', grace=10, size=150, parent='base', tags=['app:latest'], layers=['l1', 'l2']),
+                self.mockImage('tool', grace=20, size=120, parent='base', children=['running'], layers=['l1', 'l3']),
+                self.mockImage('running', size=130, parent='tool', containers=True, layers=['l1', 'l3', 'l4']),
+                self.mockImage('forever', grace=-1, size=10, layers=['l5']),
+            ]:
+            images[image.id] = image
+            images.layers.add(image.id, image.details)
+        return images
+
+    def test_removal_delays_cascade_through_parents(self):
+        delays = removal_delays(self.getImages())
+        delays['app'].should.be.eql(10)
+        delays['running'].should.be.eql(float('inf'))
+        delays['tool'].should.be.eql(float('inf'))
+        delays['base'].should.be.eql(float('inf'))
+        delays['forever'].should.be.eql(float('inf'))
+
+        images = self.getImages()
+        images['running'].__bool__.return_value = False
+        delays = removal_delays(images)
+        delays['running'].should.be.eql(10)
+        delays['tool'].should.be.eql(30)
+        delays['base'].should.be.eql(130)
+
+    def test_report(self):
+        out = six.StringIO()
+        report(self.getImages(), 10, out).should.be.eql(['app'])
+        out.getvalue().should.contain('app\t10s\t150\t50\tapp:latest')
+        out.getvalue().should.contain('1 images eligible for removal within 10s, 50 bytes reclaimable')
@@ -0,0 +1,78 @@
+import docker.errors
+import sure
+import unittest
+
+from .. import mock
+
+from caduc.retry import RetryQueue
+
+def api_error(status_code):
+    response = mock.Mock()
+    response.status_code = status_code
+    return docker.errors.APIError('error', response=response)
+
+class TestRetryQueue(unittest.TestCase):
+
+    def getQueue(self, **kwds):
+        queue = RetryQueue(**kwds)
+        self.timer = mock.Mock()
+        queue.Timer = mock.Mock(return_value=self.timer)
+        return queue
+
+    def test_classify(self):
+        queue = self.getQueue()
+        queue.classify.when.called_with(docker.errors.NotFound('not found')).should.return_value(RetryQueue.NotFound)
+        queue.classify.when.called_with(api_error(404)).should.return_value(RetryQueue.NotFound)
+        queue.classify.when.called_with(api_error(409)).should.return_value(RetryQueue.Conflict)
+        queue.classify.when.called_with(api_error(500)).should.return_value(RetryQueue.Transient)
+        queue.classify.when.called_with(Exception()).should.return_value(RetryQueue.Transient)
+
+    def test_not_found_is_never_retried(self):
+        queue = self.getQueue()
+        queue.retry.when.called_with('key', mock.Mock(), api_error(404)).should.return_value(None)
+        queue.Timer.assert_not_called()
+
+    def test_transient_errors_backoff_exponentially(self):
+        queue = self.getQueue(base_delay=1, max_delay=10, max_attempts=6, jitter=0)
+        callback = mock.Mock()
+        delays = [queue.retry('key', callback, api_error(500)) for _ in range(6)]
+        delays.should.be.eql([1, 2, 4, 8, 10, 10])
+        queue.Timer.assert_called_with(10, queue.fire, ('key', callback))
+        self.timer.start.call_count.should.be.eql(6)
+        ('key' in queue).should.be.true
+
+    def test_jitter(self):
+        queue = self.getQueue(base_delay=10, jitter=0.5)
+        for _ in range(10):
+            queue.reset('key')
+            queue.retry('key', mock.Mock(), api_error(500)).should.be.within(5, 15)
+
+    def test_gives_up_after_max_attempts(self):
+        queue = self.getQueue(conflict_base_delay=60, conflict_max_attempts=2, jitter=0)
+        queue.retry('key', mock.Mock(), api_error(409)).should.be.eql(60)
+        queue.retry('key', mock.Mock(), api_error(409)).should.be.eql(120)
+        queue.retry('key', mock.Mock(), api_error(409)).should.be(None)
+        # attempts are reset once given up
+        queue.retry('key', mock.Mock(), api_error(409)).should.be.eql(60)
+
+    def test_fire_calls_callback(self):
+        queue = self.getQueue()
+        callback = mock.Mock()
+        queue.retry('key', callback, api_error(500))
+        queue.fire('key', callback)
+        callback.assert_called_once_with()
+        ('key' in queue).should.be.false
+
+    def test_cancel_keeps_attempts(self):
+        queue = self.getQueue(base_delay=1, jitter=0)
+        queue.retry('key', mock.Mock(), api_error(500))
+        queue.cancel('key')
+        self.timer.cancel.assert_called_once_with()
+        len(queue).should.be.eql(0)
+        queue.retry('key', mock.Mock(), api_error(500)).should.be.eql(2)
+
+    def test_reset_forgets_attempts(self):
+        queue = self.getQueue(base_delay=1, jitter=0)
+        queue.retry('key', mock.Mock(), api_error(500))
+        queue.reset('key')
+        queue.retry('key', mock.Mock(), api_error(500)).should.be.eql(1)
@@ -0,0 +1,125 @@
+import docker.errors
+import os
+import requests.exceptions
+import shutil
+import sure
+import tempfile
+import unittest
+
+from .. import mock
+
+from caduc.config import Config
+from caduc.containers import Containers
+from caduc.image import Image
+from caduc.images import Images
+from caduc.sweep import Sweep
+
+class TestSweep(unittest.TestCase):
+
+    def setUp(self):
+        # 2018-01-10T00:00:00Z
+        self.now = 1515542400.
+        self.details = {}
+        self.removed = []
+        self.createImage('sha256:base', created='2018-01-01T00:00:00Z', size=100)
+        self.createImage('sha256:app', parent='sha256:base', tags=['app:1'], created='2018-01-02T00:00:00Z', size=150)
+        self.createImage('sha256:recent', tags=['app:2'], created='2018-01-09T12:00:00Z', size=10)
+        self.createImage('sha256:used', tags=['db:1'], created='2018-01-01T00:00:00Z', size=20)
+        self.createImage('sha256:forever', tags=['tjamet/tool:1'], created='2018-01-01T00:00:00Z', size=30)
+        self.client = mock.Mock()
+        self.client.images.side_effect = lambda all=False: list(self.details.values())
+        self.client.inspect_image.side_effect = self.inspect_image
+        self.client.remove_image.side_effect = self.remove_image
+        self.client.containers.return_value = [{'Id': 'c1', 'Name': '/db', 'Image': 'sha256:used'}]
+        self.client.inspect_container.return_value = {'Id': 'c1', 'Name': '/db', 'Image': 'sha256:used'}
+        for name in ('Executor', 'Timer', 'Audit'):
+            patch = mock.patch.object(Image, name, getattr(Image, name))
+            patch.start()
+            self.addCleanup(patch.stop)
+        for obj in (Image.Retries, Image.Deferred):
+            patch = mock.patch.object(obj, 'Timer', obj.Timer)
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.sweep = Sweep(2, clock=lambda: self.now).install(Image)
+        config = Config(['images.tjamet/*.grace_time=-1'], os.devnull)
+        self.images = Images(config, lambda: self.client, default_timeout='2d')
+        self.containers = Containers(config, lambda: self.client, self.images)
+
+    def createImage(self, image_id, parent='', tags=None, created=None, size=0):
+        self.details[image_id] = {
+            'Id': image_id, 'Parent': parent, 'RepoTags': tags, 'Created': created, 'Size': size,
+            'Config': {'Labels': None}, 'RootFS': {'Layers': [image_id]},
+        }
+
+    def inspect_image(self, image_id):
+        try:
+            return dict(self.details[image_id])
+        except KeyError:
+            raise docker.errors.NotFound(image_id)
+
+    def remove_image(self, name, **kwds):
+        if name in self.details:
+            self.removed.append(name)
+            del self.details[name]
+
+    def test_evaluate(self):
+        overdue, used = self.sweep.evaluate(self.images)
+        sorted(image.id for image in overdue).should.be.eql(['sha256:app', 'sha256:base'])
+        used.should.be.eql(1)
+
+    def test_children_are_removed_first(self):
+        summary = self.sweep.run(self.images)
+        self.removed.should.be.eql(['sha256:app', 'sha256:base'])
+        summary['removed'].should.be.eql(['sha256:app', 'sha256:base'])
+        summary['reclaimed'].should.be.eql(250)
+        summary['failed'].should.be.eql([])
+        summary['kept'].should.be.eql(2)
+        summary['used'].should.be.eql(1)
+        self.images.keys().should_not.contain('sha256:base')
+
+    def test_parent_of_a_recent_child_is_kept(self):
+        self.createImage('sha256:child', parent='sha256:base', created='2018-01-09T00:00:00Z')
+        images = Images(self.images.config, lambda: self.client, default_timeout='2d')
+        Containers(self.images.config, lambda: self.client, images)
+        summary = self.sweep.run(images)
+        self.removed.should.be.eql(['sha256:app'])
+        summary['kept'].should.be.eql(4)
+
+    def test_images_seen_in_use_by_a_previous_sweep_are_kept(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.sweep.state_path = os.path.join(directory, 'sweep.json')
+        self.sweep.run(self.images)['used'].should.be.eql(1)
+        # the container is removed a minute before the next sweep
+        self.now += 120
+        self.client.containers.return_value = []
+        sweep = Sweep(2, clock=lambda: self.now, state_path=self.sweep.state_path).install(Image)
+        images = Images(self.images.config, lambda: self.client, default_timeout='2d')
+        Containers(self.images.config, lambda: self.client, images)
+        summary = sweep.run(images)
+        summary['removed'].should_not.contain('sha256:used')
+        summary['kept'].should.be.eql(3)
+        self.removed.should.be.eql(['sha256:app', 'sha256:base'])
+        # the grace time elapsed since it was last seen in use
+        self.now += 2 * 24 * 3600
+        sweep.run(images)['removed'].should.contain('sha256:used')
+
+    def test_unreadable_state_is_ignored(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.sweep.state_path = os.path.join(directory, 'sweep.json')
+        with open(self.sweep.state_path, 'w') as f:
+            f.write('{')
+        self.sweep.load_state().should.be.eql({})
+        self.sweep.run(self.images)['removed'].should.be.eql(['sha256:app', 'sha256:base'])
+        self.sweep.load_state().should.be.eql({'sha256:used': self.now})
+
+    def test_failures_are_reported(self):
+        def remove_image(name, **kwds):
+            raise requests.exceptions.ConnectionError('daemon is gone')
+        self.client.remove_image.side_effect = remove_image
+        summary = self.sweep.run(self.images)
+        summary['removed'].should.be.eql([])
+        summary['failed'].should.be.eql(['sha256:app'])
+        # the parent is not removed before its child
+        summary['kept'].should.be.eql(3)
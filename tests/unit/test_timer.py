@@ -1,5 +1,6 @@
 import caduc.timer
 import signal
+import sure
 import threading
 import time
 import unittest
@@ -85,8 +86,72 @@ class TestTimer(unittest.TestCase):
             caduc.timer.Timer.CancelAll = cancel
             caduc.timer.orig = orig
     def test_abort_is_registered_as_sigint_handler(self):
-        orig = signal.signal(signal.SIGINT, mock.Mock())
+        previous = signal.getsignal(signal.SIGINT)
+        orig = caduc.timer.orig
+        try:
+            caduc.timer.install_abort()
+            caduc.timer.orig.should.be(previous)
+            signal.getsignal(signal.SIGINT).should.be(caduc.timer.abort)
+        finally:
+            signal.signal(signal.SIGINT, previous)
+            caduc.timer.orig = orig
+
+    def test_operations_are_counted_when_enabled(self):
+        stats = mock.Mock()
+        orig = caduc.timer.Timer.Stats
         try:
-            orig.should.be(caduc.timer.abort)
+            caduc.timer.Timer.Stats = stats
+            timer = caduc.timer.Timer(1, lambda: None)
+            stats.incr.assert_called_once_with('timer.scheduled')
+            stats.incr.reset_mock()
+            timer.cancel()
+            stats.incr.assert_called_once_with('timer.cancelled')
+            stats.incr.reset_mock()
+            timer.cancel()
+            stats.incr.assert_not_called()
         finally:
-            signal.signal(signal.SIGINT, orig)
+            caduc.timer.Timer.Stats = orig
+
+class TestSlackTimers(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.
+        self.timer = mock.Mock()
+        self.timers = caduc.timer.SlackTimers(60, self.timer, clock=lambda: self.now)
+
+    def test_timers_in_same_window_fire_together(self):
+        calls = []
+        self.timers(30, calls.append, ('b',)).start()
+        self.timers(25, calls.append, ('a',)).start()
+        self.timers(100, calls.append, ('c',)).start()
+        # deadlines are rounded up to the end of their window
+        self.timer.mock_calls[:2].should.be.eql([
+            mock.call(80., self.timers.fire, (1080,)),
+            mock.call().start(),
+        ])
+        self.timer.call_count.should.be.eql(2)
+        self.timers.fire(1080)
+        calls.should.be.eql(['a', 'b'])
+        self.timers.fire(1080)
+        calls.should.be.eql(['a', 'b'])
+
+    def test_cancel(self):
+        callback = mock.Mock()
+        first = self.timers(10, callback)
+        second = self.timers(20, callback)
+        first.start()
+        second.start()
+        first.cancel()
+        self.timer.return_value.cancel.assert_not_called()
+        second.cancel()
+        self.timer.return_value.cancel.assert_called_once_with()
+        second.cancel()
+        self.timers.fire(1020)
+        callback.assert_not_called()
+
+    def test_failing_callback_does_not_stop_the_batch(self):
+        callback = mock.Mock()
+        self.timers(10, mock.Mock(side_effect=ValueError())).start()
+        self.timers(20, callback).start()
+        self.timers.fire(1020)
+        callback.assert_called_once_with()
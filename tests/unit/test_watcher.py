@@ -1,3 +1,4 @@
+import caduc.cache
 import caduc.watcher
 import docker.errors
 import sure
@@ -5,10 +6,29 @@ import unittest
 
 from .. import mock
 
+class Images(dict):
+    """
+        The subset of SyncDict used by the watcher
+    """
+    def __init__(self):
+        self.missing = caduc.cache.TTLCache(10)
+        self.names = {}
+
+    def add(self, item, inspect=None):
+        self.missing.discard(item)
+        return self[item]
+
+    def resolve(self, name):
+        return self.names.get(name, None)
+
+    def forget(self, item):
+        self.missing.add(item)
+        return self.pop(item, None)
+
 class TestWatcher(unittest.TestCase):
     def setUp(self):
         self.client = mock.Mock()
-        self.images = {}
+        self.images = Images()
         self.containers = mock.Mock()
         self.watcher = caduc.watcher.Watcher(lambda: self.client, self.images, self.containers)
         self.dockerErrorsNotFound = docker.errors.NotFound
@@ -29,13 +49,35 @@ class TestWatcher(unittest.TestCase):
 
     def test_tag(self):
         image = self.mock_image(attribute='refresh')
+        self.images.missing.add('event.id')
         self.watcher.tag(self.create_event())
-        image.refresh.assert_called_once_with()
+        image.refresh.assert_called_once_with(None)
+        ('event.id' in self.images.missing).should.be.false
+
+    def test_tag_uses_event_attributes(self):
+        stats = mock.Mock()
+        watcher = caduc.watcher.Watcher(lambda: self.client, self.images, self.containers, stats)
+        image = self.mock_image()
+        image.id = 'event.id'
+        previous = self.mock_image(name='previous.id')
+        self.images.names['app:1'] = 'previous.id'
+        watcher.tag(self.create_event(Actor={'Attributes': {'name': 'app:1'}}))
+        image.add_tag.assert_called_once_with('app:1')
+        image.refresh.assert_not_called()
+        previous.remove_tag.assert_called_once_with('app:1')
+        stats.incr.assert_called_once_with('avoided.inspect_image')
+
+    def test_tag_new_image_is_not_refreshed(self):
+        image = mock.Mock()
+        self.images.add = mock.Mock(return_value=image)
+        self.watcher.tag(self.create_event(id='new.id'))
+        self.images.add.assert_called_once_with('new.id', None)
+        image.refresh.assert_not_called()
 
     def test_untag(self):
         image = self.mock_image(attribute='refresh')
         self.watcher.untag(self.create_event())
-        image.refresh.assert_called_once_with()
+        image.refresh.assert_called_once_with(None)
         # Check that untag succeeds with unkwnown image
         self.watcher.untag(self.create_event(id='non-existing-event'))
 
@@ -47,20 +89,41 @@ class TestWatcher(unittest.TestCase):
         image = self.mock_image(name='image.id')
         self.watcher.delete(self.create_event(id='image.id'))
         self.images.should_not.contain('image.id')
+        ('image.id' in self.images.missing).should.be.true
 
         self.watcher.delete(self.create_event())
 
     def test_create(self):
         self.containers.add = mock.Mock()
         self.watcher.create(self.create_event(id='container.id', Type='container'))
-        self.containers.add.assert_called_once_with('container.id')
+        self.containers.add.assert_called_once_with('container.id', None)
+
+    def test_create_uses_event_attributes(self):
+        stats = mock.Mock()
+        watcher = caduc.watcher.Watcher(lambda: self.client, self.images, self.containers, stats)
+        image_id = 'sha256:' + 'a' * 64
+        watcher.create(self.create_event(id='container.id', Type='container',
+            Actor={'Attributes': {'image': image_id, 'name': 'web'}}))
+        self.containers.add.assert_called_once_with('container.id', dict(Id='container.id', Name='/web', Image=image_id))
+        stats.incr.assert_called_once_with('avoided.inspect_container')
+        self.containers.add.reset_mock()
+        watcher.create(self.create_event(id='container.id', Type='container', **{'from': 'a' * 64}))
+        self.containers.add.assert_called_once_with('container.id', dict(Id='container.id', Name=None, Image=image_id))
+
+        # names may have been pulled onto another image since they were indexed, the container is inspected
+        self.images.names['app:1'] = 'image.id'
+        for image in ('app:1', 'aaaa', 'other:1'):
+            self.containers.add.reset_mock()
+            watcher.create(self.create_event(id='container.id', Type='container', Actor={'Attributes': {'image': image}}))
+            self.containers.add.assert_called_once_with('container.id', None)
+        stats.incr.call_count.should.be.eql(2)
 
     def test_destroy(self):
-        self.containers.pop = mock.Mock()
+        self.containers.forget = mock.Mock()
         self.watcher.destroy(self.create_event(id='container.id', Type='container'))
-        self.containers.pop.assert_called_once_with('container.id')
+        self.containers.forget.assert_called_once_with('container.id')
 
-        self.containers.pop.side_effect = KeyError
+        self.containers.forget.return_value = None
         self.watcher.destroy(self.create_event(id='container.id', Type='container'))
 
     def test_watch(self):
@@ -96,3 +159,90 @@ class TestWatcher(unittest.TestCase):
                 mock.call({'id': 'id2', 'Action': 'unknown'}),
             ]
         )
+
+    def test_filters(self):
+        self.watcher.filters().should.be.eql({
+            'type': ['container', 'image'],
+            'event': ['commit', 'create', 'delete', 'destroy', 'tag', 'untag'],
+        })
+        class Watcher(caduc.watcher.Watcher):
+            Actions = {'image': ['delete', 'pull'], 'network': ['connect']}
+        Watcher.filters().should.be.eql({'type': ['image'], 'event': ['delete']})
+
+    def test_watch_reads_buffered_events(self):
+        self.client.events = mock.Mock()
+        watcher = caduc.watcher.Watcher(lambda: self.client, self.images, self.containers,
+            events=[self.create_event(id='id1', Action='commit')])
+        watcher.handle = mock.Mock()
+        watcher.watch()
+        self.client.events.assert_not_called()
+        watcher.handle.assert_called_once_with({'id': 'id1', 'Action': 'commit'})
+
+    def test_watch_subscribes_to_handled_events(self):
+        self.client.events = mock.Mock(return_value=[])
+        self.watcher.watch()
+        self.client.events.assert_called_once_with(decode=True, filters=self.watcher.filters())
+
+    def test_watch_dispatches_events(self):
+        dispatch = mock.Mock()
+        self.client.events = mock.Mock(return_value = [self.create_event(id='id1', Action='commit')])
+        self.watcher.watch(dispatch)
+        dispatch.assert_called_once_with(self.watcher.handle, {'id': 'id1', 'Action': 'commit'})
+
+    def test_watch_inspects_ahead_and_handles_in_order(self):
+        submitted = []
+        handled = []
+        self.watcher.handle = mock.Mock(side_effect=lambda event, inspect: handled.append((event['id'], inspect)))
+        self.client.events = mock.Mock(return_value=[self.create_event(id=id, Action='commit') for id in ('id1', 'id2', 'id3')])
+        self.watcher.watch(submit=lambda func, args, callback: submitted.append((func, args, callback)))
+        [(func, args[0]['id']) for func, args, _ in submitted].should.be.eql([
+            (self.watcher.inspect, 'id1'), (self.watcher.inspect, 'id2'), (self.watcher.inspect, 'id3')])
+        # inspections complete out of order
+        submitted[1][2]('details2')
+        handled.should.be.empty
+        submitted[0][2](None)
+        handled.should.be.eql([('id1', None), ('id2', 'details2')])
+        submitted[2][2]('details3')
+        handled.should.be.eql([('id1', None), ('id2', 'details2'), ('id3', 'details3')])
+
+    def test_inspect(self):
+        self.mock_image(name='known.id')
+        self.client.inspect_image = mock.Mock(return_value={'Id': 'new.id'})
+        self.watcher.inspect(self.create_event(id='new.id', Action='tag')).should.be.eql({'Id': 'new.id'})
+        self.watcher.inspect(self.create_event(id='known.id', Action='tag', Actor={'Attributes': {'name': 'app:1'}})).should.be.none
+        self.watcher.inspect(self.create_event(id='new.id', Action='untag')).should.be.none
+        self.client.inspect_image.side_effect = docker.errors.NotFound('gone')
+        self.watcher.inspect(self.create_event(id='known.id', Action='untag')).should.be(self.watcher.Gone)
+        self.client.inspect_image.side_effect = Exception('daemon is gone')
+        self.watcher.inspect(self.create_event(id='known.id', Action='untag')).should.be.none
+        self.client.inspect_container = mock.Mock(return_value={'Id': 'container.id'})
+        self.watcher.inspect(self.create_event(id='container.id', Action='create', Type='container')).should.be.eql({'Id': 'container.id'})
+        self.watcher.inspect(self.create_event(id='id1', Action='destroy', Type='container')).should.be.none
+        self.client.inspect_container.call_count.should.be.eql(1)
+
+    def test_handlers_use_inspections_made_ahead(self):
+        image = self.mock_image(name='known.id')
+        self.watcher.untag(self.create_event(id='known.id'), {'Id': 'known.id'})
+        image.refresh.assert_called_once_with({'Id': 'known.id'})
+        self.watcher.untag(self.create_event(id='known.id'), self.watcher.Gone)
+        self.images.should_not.contain('known.id')
+        self.images.add = mock.Mock()
+        self.watcher.tag(self.create_event(id='new.id'), {'Id': 'new.id'})
+        self.images.add.assert_called_once_with('new.id', {'Id': 'new.id'})
+        self.watcher.tag(self.create_event(id='new.id'), self.watcher.Gone)
+        self.images.add.call_count.should.be.eql(1)
+        self.watcher.create(self.create_event(id='container.id', Type='container'), {'Id': 'container.id'})
+        self.containers.add.assert_called_once_with('container.id', {'Id': 'container.id'})
+        self.watcher.create(self.create_event(id='container.id', Type='container'), self.watcher.Gone)
+        self.containers.add.call_count.should.be.eql(1)
+
+    def test_handle_records_timings_when_enabled(self):
+        stats = mock.Mock()
+        watcher = caduc.watcher.Watcher(lambda: self.client, self.images, self.containers, stats)
+        watcher.destroy = mock.Mock()
+        watcher.handle(self.create_event(id='id1', Action='destroy'))
+        watcher.handle(self.create_event(id='id2', Action='unknown'))
+        stats.record.call_args_list.should.be.eql([
+            mock.call('handle.destroy', mock.ANY),
+            mock.call('handle.unknown', mock.ANY),
+        ])
@@ -0,0 +1,135 @@
+import datetime
+import sure
+import unittest
+
+from .. import mock
+
+from caduc.window import DeferredRemovals
+from caduc.window import Window
+from caduc.window import disk_usage
+
+def at(hour, minute=0):
+    return datetime.datetime(2017, 1, 1, hour, minute, 30)
+
+class TestWindow(unittest.TestCase):
+
+    def test_contains(self):
+        window = Window('01:00-05:00')
+        (at(1) in window).should.be.true
+        (at(4, 59) in window).should.be.true
+        (at(5) in window).should.be.false
+        (at(0, 59) in window).should.be.false
+
+    def test_contains_across_midnight(self):
+        window = Window('22:00-02:00')
+        (at(23) in window).should.be.true
+        (at(1) in window).should.be.true
+        (at(12) in window).should.be.false
+
+    def test_delay(self):
+        window = Window('01:00-05:00')
+        window.delay(at(2)).should.be.eql(0)
+        window.delay(at(0)).should.be.eql(3600 - 30)
+        window.delay(at(6)).should.be.eql(19 * 3600 - 30)
+
+    def test_invalid_spec(self):
+        Window.when.called_with('01:00').should.throw(ValueError)
+        Window.when.called_with('1h-2h').should.throw(ValueError)
+        Window.when.called_with('25:00-06:00').should.throw(ValueError)
+        Window.when.called_with('01:60-02:00').should.throw(ValueError)
+
+    def test_parse_is_cached(self):
+        Window.parse('01:00-05:00').should.be(Window.parse('01:00-05:00'))
+
+    def test_disk_usage(self):
+        disk_usage('.').should.be.within(0, 100)
+
+class TestDeferredRemovals(unittest.TestCase):
+
+    def getDeferred(self, now=0):
+        self.now = now
+        deferred = DeferredRemovals(clock=lambda: self.now)
+        self.timer = mock.Mock()
+        deferred.Timer = mock.Mock(return_value=self.timer)
+        return deferred
+
+    def mockImage(self, id, size):
+        image = mock.Mock()
+        image.id = id
+        image.reclaimable_size = mock.Mock(return_value=size)
+        return image
+
+    def test_defer_plans_drain_at_earliest_window(self):
+        deferred = self.getDeferred()
+        deferred.defer(self.mockImage('a', 1), 100)
+        deferred.Timer.assert_has_calls([mock.call(100, deferred.drain), mock.call(60, deferred.check)], any_order=True)
+        deferred.Timer.reset_mock()
+
+        deferred.defer(self.mockImage('b', 1), 200)
+        deferred.Timer.assert_not_called()
+
+        deferred.defer(self.mockImage('c', 1), 50)
+        deferred.Timer.assert_called_once_with(50, deferred.drain)
+        self.timer.cancel.assert_called_once_with()
+        len(deferred).should.be.eql(3)
+
+    def test_drain_removes_biggest_images_first(self):
+        deferred = self.getDeferred()
+        removed = []
+        images = [self.mockImage(id, size) for id, size in [('a', 10), ('b', 30), ('c', 20)]]
+        for image in images:
+            image.rm = mock.Mock(side_effect=lambda image=image: removed.append(image.id))
+            deferred.defer(image, 10)
+        deferred.drain()
+        removed.should.be.eql(['b', 'c', 'a'])
+        len(deferred).should.be.eql(0)
+
+    def test_drain_goes_on_after_failures(self):
+        deferred = self.getDeferred()
+        failing = self.mockImage('a', 10)
+        failing.rm = mock.Mock(side_effect=Exception)
+        image = self.mockImage('b', 1)
+        deferred.defer(failing, 10)
+        deferred.defer(image, 10)
+        deferred.drain()
+        image.rm.assert_called_once_with()
+
+    def test_disk_above_watermark_removes_images_held(self):
+        deferred = self.getDeferred()
+        image = self.mockImage('a', 10)
+        image.above_watermark = mock.Mock(return_value=False)
+        deferred.defer(image, 3600)
+        deferred.Timer.reset_mock()
+        deferred.check()
+        deferred.Timer.assert_called_once_with(60, deferred.check)
+        image.rm.assert_not_called()
+        self.timer.cancel.reset_mock()
+
+        image.above_watermark.return_value = True
+        deferred.check()
+        image.rm.assert_called_once_with()
+        len(deferred).should.be.eql(0)
+        # both the window opening and the next check are cancelled
+        self.timer.cancel.call_count.should.be.eql(2)
+        deferred.timer.should.be.none
+        deferred.checker.should.be.none
+
+    def test_check_stops_once_nothing_is_held(self):
+        deferred = self.getDeferred()
+        image = self.mockImage('a', 10)
+        image.above_watermark = mock.Mock(return_value=False)
+        deferred.defer(image, 3600)
+        deferred.discard(image)
+        deferred.Timer.reset_mock()
+        deferred.check()
+        deferred.Timer.assert_not_called()
+        deferred.checker.should.be.none
+
+    def test_discard(self):
+        deferred = self.getDeferred()
+        image = self.mockImage('a', 10)
+        deferred.defer(image, 10)
+        (image in deferred).should.be.true
+        deferred.discard(image)
+        (image in deferred).should.be.false
+        deferred.discard(image)